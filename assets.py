@@ -0,0 +1,186 @@
+"""
+Process-wide cache of loaded images, fonts and pre-rendered widget surfaces.
+
+Everything is created once and then shared, so widgets blit cached surfaces
+instead of loading, scaling or rendering them again. Surfaces handed out by
+this module are shared between sprites and must never be drawn on.
+"""
+
+import collections
+import threading
+
+import pygame
+import settings
+
+# --- Caches ---
+_images = {}  # (path, (w, h)) -> scaled Surface (or None if it failed to load)
+_decoded = {}  # path -> full-size Surface as decoded from the file (or the pygame.error)
+_decoders = {}  # path -> thread decoding the file in the background
+_fonts = {}  # (name, size) -> Font
+_text = collections.OrderedDict()  # (text, font size, color) -> rendered Surface, least recently used first
+TEXT_CACHE_SIZE = 256  # Labels are few; anything beyond this is dynamic text
+_cell_surfaces = {}  # (state, is_highlighted, size) -> Surface
+_button_surfaces = {}  # (cell_id, state, (w, h)) -> Surface
+
+
+def preload_image(path):
+    """
+    Starts decoding an image file in a background thread (pygame releases the
+    GIL while decoding), so startup doesn't wait for large images.
+    """
+    if path not in _decoded and path not in _decoders:
+        _decoders[path] = threading.Thread(target=_decode, args=(path,), name="image-decoder", daemon=True)
+        _decoders[path].start()
+
+
+def _decode(path):
+    try:
+        _decoded[path] = pygame.image.load(path)
+    except (pygame.error, FileNotFoundError) as e:
+        _decoded[path] = e
+
+
+def get_image(path, size):
+    """Loads and scales an image once per (path, size). Returns None if it can't be loaded."""
+    key = (path, tuple(size))
+    if key not in _images:
+        preload_image(path)
+        decoder = _decoders.pop(path, None)
+        if decoder:
+            decoder.join()  # Only waits if the image is needed before it has been decoded
+        original = _decoded[path]
+        if isinstance(original, Exception):
+            print(f"Warning: Could not load image '{path}': {original}")
+            _images[key] = None
+        else:
+            # Scale first: converting the small image is much cheaper than the original
+            _images[key] = pygame.transform.scale(original, key[1]).convert_alpha()
+    return _images[key]
+
+
+def get_font(size, path=None):
+    """
+    Returns a shared font object for (path, size). Fonts are loaded from a
+    file (settings.FONT_PATH by default, None = pygame's built-in font)
+    rather than looked up with SysFont, which scans the system fonts.
+    """
+    key = (settings.FONT_PATH if path is None else path, size)
+    if key not in _fonts:
+        _fonts[key] = pygame.font.Font(*key)
+    return _fonts[key]
+
+
+def render_text(text, size, color):
+    """
+    Returns a cached, pre-rendered text surface. Meant for fixed labels;
+    the cache keeps the TEXT_CACHE_SIZE most recently used strings.
+    """
+    key = (text, size, color)
+    if key in _text:
+        _text.move_to_end(key)
+    else:
+        _text[key] = get_font(size).render(text, True, color)
+        if len(_text) > TEXT_CACHE_SIZE:
+            _text.popitem(last=False)
+    return _text[key]
+
+
+def get_cell_surface(state, is_highlighted, size):
+    """Returns the pre-rendered surface for a cell in the given state."""
+    key = (state, is_highlighted, size)
+    if key not in _cell_surfaces:
+        _cell_surfaces[key] = _render_cell(state, is_highlighted, size)
+    return _cell_surfaces[key]
+
+
+def get_button_surface(cell_id, state, size):
+    """Returns the pre-rendered surface for a button in the given state."""
+    key = (cell_id, state, tuple(size))
+    if key not in _button_surfaces:
+        _button_surfaces[key] = _render_button(cell_id, state, key[2])
+    return _button_surfaces[key]
+
+
+def prerender_cells(size):
+    """
+    Renders the cell states that don't need the ship image for one cell size
+    in bulk. Ship cells are rendered on first use, once the image is decoded.
+    """
+    for state in ('empty', 'disabled', 'miss'):
+        for is_highlighted in (False, True):
+            get_cell_surface(state, is_highlighted, size)
+
+
+def evict_sizes(cell_size, button_size):
+    """
+    Drops every size-dependent surface that doesn't match the current sizes.
+    Called whenever the grid is resized.
+    """
+    button_size = tuple(button_size)
+    for key in [k for k in _cell_surfaces if k[2] != cell_size]:
+        del _cell_surfaces[key]
+    for key in [k for k in _button_surfaces if k[2] != button_size]:
+        del _button_surfaces[key]
+    for key in [k for k in _images if k[1] != (cell_size, cell_size)]:
+        del _images[key]
+
+
+def clear():
+    """
+    Empties every cache. Must be called before pygame.quit(): cached fonts
+    and surfaces are invalid once pygame shuts down.
+    """
+    for thread in _decoders.values():
+        thread.join()
+    for cache in (_images, _decoded, _decoders, _fonts, _text, _cell_surfaces, _button_surfaces):
+        cache.clear()
+
+
+def _render_cell(state, is_highlighted, size):
+    """Draws a cell surface (same look as the old per-frame Cell._draw_cell)."""
+    surface = pygame.Surface((size, size))
+
+    if state == 'empty':
+        surface.fill(settings.COLOR_CELL_ON if is_highlighted else settings.COLOR_CELL_OFF)
+
+    elif state == 'ship':
+        # Cell with a ship doesn't highlight and displays the ship image
+        surface.fill(settings.COLOR_SHIP_BG)
+        ship_image = get_image(settings.SHIP_IMAGE_PATH, (size, size))
+        if ship_image:
+            surface.blit(ship_image, (0, 0))
+
+    elif state == 'disabled':
+        surface.fill(settings.COLOR_CELL_DISABLED)
+
+    elif state == 'hit':
+        surface.fill(settings.COLOR_CELL_HIT)
+        ship_image = get_image(settings.SHIP_IMAGE_PATH, (size, size))
+        if ship_image:
+            surface.blit(ship_image, (0, 0))
+
+    elif state == 'miss':
+        surface.fill(settings.COLOR_CELL_MISS)
+
+    # Draw a border around the cell (always)
+    pygame.draw.rect(surface, settings.COLOR_WHITE, surface.get_rect(), 1)
+    return surface
+
+
+def _render_button(cell_id, state, size):
+    """Draws a button surface with its label."""
+    if state == 'enabled':
+        bg_color = settings.COLOR_BUTTON
+        text_color = settings.COLOR_BUTTON_TEXT
+    else:  # 'disabled'
+        bg_color = settings.COLOR_BUTTON_DISABLED
+        text_color = settings.COLOR_BUTTON_TEXT_DISABLED
+
+    surface = pygame.Surface(size)
+    surface.fill(bg_color)
+
+    text_surf = render_text(cell_id, settings.BUTTON_FONT_SIZE, text_color)
+    surface.blit(text_surf, text_surf.get_rect(center=surface.get_rect().center))
+
+    pygame.draw.rect(surface, settings.COLOR_WHITE, surface.get_rect(), 1)
+    return surface
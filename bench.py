@@ -0,0 +1,212 @@
+"""
+Headless benchmark for the game loop.
+
+Builds the Game against SDL's dummy video driver and runs a fixed number of
+frames with no FPS cap, timing each phase of the loop separately:
+
+    python bench.py --frames 2000 --grid 6x6 --grid 4x4 --set DIRTY_RECT_RENDERING=False --output bench.json
+
+Reports p50/p95/p99/max per phase (in ms). A second, untimed pass runs
+more frames under tracemalloc (which slows them down) and reports Python
+allocations per frame: the peak of traced memory above the frame's start
+(the peak is reset every frame, so temporaries that are freed before the
+frame ends still show up) and the net change (what the frame kept).
+Session recording, markers, triggers and the network are off, so a run
+writes no files.
+"""
+
+import argparse
+import ast
+import json
+import os
+import time
+import tracemalloc
+
+# Must be set before pygame initialises its display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+import assets
+import settings
+from game import Game
+
+PHASES = ('handle_events', 'update', 'update_row_col_highlighting', 'draw', 'flip', 'frame')
+
+
+def _percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _summarise(values_ns):
+    values = sorted(v / 1e6 for v in values_ns)
+    return {
+        'p50': _percentile(values, 50),
+        'p95': _percentile(values, 95),
+        'p99': _percentile(values, 99),
+        'max': values[-1],
+        'mean': sum(values) / len(values),
+    }
+
+
+def _run_frame(game):
+    game._handle_events()
+    game._update()
+    game._draw()
+    game._present()
+    game._on_frame_flipped(time.perf_counter_ns())
+
+
+def run_benchmark(frames=1000, warmup=60, rows=None, cols=None, overrides=None, alloc_frames=200):
+    """
+    Runs `frames` uncapped frames (after `warmup` frames) with the given grid
+    size and settings overrides, then `alloc_frames` frames under
+    tracemalloc. Returns a dict of results.
+    """
+    overrides = dict(overrides or {})
+    if rows is not None:
+        overrides['ROWS'] = rows
+    if cols is not None:
+        overrides['COLS'] = cols
+    # No outputs (they would start writer threads and files); --set can turn them back on
+    settings.apply(
+        TRIGGER_PORT=None, MARKER_ADDRESS=None, NETWORK_ROLE=None, RECORD_SESSIONS=False, RECORD_EEG=False,
+        FRAME_STATS_ENABLED=False, PHOTODIODE_CALIBRATION=False, VSYNC=False,
+    )
+    settings.apply(**overrides)
+
+    perf_counter_ns = time.perf_counter_ns
+    start_ns = perf_counter_ns()
+    game = Game()
+    startup_ms = (perf_counter_ns() - start_ns) / 1e6
+
+    timings = {phase: [0] * frames for phase in PHASES}
+    peak_bytes = [0] * alloc_frames
+    net_bytes = [0] * alloc_frames
+
+    # Time the highlighting step on its own (it runs inside _update)
+    highlight_ns = [0]
+    update_row_col_highlighting = game._update_row_col_highlighting
+
+    def timed_highlighting():
+        t = perf_counter_ns()
+        update_row_col_highlighting()
+        highlight_ns[0] = perf_counter_ns() - t
+
+    game._update_row_col_highlighting = timed_highlighting
+
+    try:
+        for i in range(-warmup, frames):
+            t0 = perf_counter_ns()
+            game._handle_events()
+            t1 = perf_counter_ns()
+            game._update()
+            t2 = perf_counter_ns()
+            game._draw()
+            t3 = perf_counter_ns()
+            game._present()
+            t4 = perf_counter_ns()
+            game._on_frame_flipped(t4)
+
+            if i < 0:
+                continue
+            timings['handle_events'][i] = t1 - t0
+            timings['update'][i] = t2 - t1
+            timings['update_row_col_highlighting'][i] = highlight_ns[0]
+            timings['draw'][i] = t3 - t2
+            timings['flip'][i] = t4 - t3
+            timings['frame'][i] = t4 - t0
+
+        # Allocations, separately: tracing would distort the timings above
+        tracemalloc.start()
+        try:
+            for i in range(alloc_frames):
+                tracemalloc.reset_peak()
+                start, _ = tracemalloc.get_traced_memory()
+                _run_frame(game)
+                current, peak = tracemalloc.get_traced_memory()
+                peak_bytes[i] = peak - start
+                net_bytes[i] = current - start
+        finally:
+            tracemalloc.stop()
+    finally:
+        # Like Game._shutdown, without the session reports and saved sequence
+        for output in (game.eeg_store, game.network, game.triggers, game.markers, game.recorder):
+            if output:
+                output.close()
+        assets.clear()
+        pygame.quit()
+
+    return {
+        'rows': settings.ROWS,
+        'cols': settings.COLS,
+        'frames': frames,
+        'settings': {k: v for k, v in overrides.items() if k not in ('ROWS', 'COLS')},
+        'startup_ms': startup_ms,
+        'phases_ms': {phase: _summarise(values) for phase, values in timings.items()},
+        'allocated_kb_per_frame': {
+            'frames': alloc_frames,
+            'peak_mean': sum(peak_bytes) / alloc_frames / 1024 if alloc_frames else 0.0,
+            'peak_max': max(peak_bytes, default=0) / 1024,
+            'net_mean': sum(net_bytes) / alloc_frames / 1024 if alloc_frames else 0.0,
+        },
+    }
+
+
+def _parse_grid(text):
+    rows, cols = text.lower().split('x')
+    return int(rows), int(cols)
+
+
+def _parse_override(text):
+    name, value = text.split('=', 1)
+    try:
+        value = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        pass  # Plain string
+    return name, value
+
+
+def _print_result(result):
+    print(f"\n{result['rows']}x{result['cols']} grid, {result['frames']} frames, "
+          f"startup {result['startup_ms']:.1f} ms {result['settings'] or ''}")
+    print(f"  {'phase':<30}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}  (ms)")
+    for phase, stats in result['phases_ms'].items():
+        print(f"  {phase:<30}{stats['p50']:8.3f}{stats['p95']:8.3f}{stats['p99']:8.3f}{stats['max']:8.3f}")
+    alloc = result['allocated_kb_per_frame']
+    if alloc['frames']:
+        print(f"  allocated per frame ({alloc['frames']} traced frames): peak mean {alloc['peak_mean']:.1f} KB, "
+              f"max {alloc['peak_max']:.1f} KB; kept {alloc['net_mean']:+.2f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmark of the game loop.")
+    parser.add_argument('--frames', type=int, default=1000, help="Frames to time per configuration")
+    parser.add_argument('--warmup', type=int, default=60, help="Untimed frames before timing starts")
+    parser.add_argument('--alloc-frames', type=int, default=200,
+                        help="Frames traced with tracemalloc after the timed frames (0 = skip)")
+    parser.add_argument('--grid', type=_parse_grid, action='append',
+                        help="Grid size as ROWSxCOLS (repeatable, default: settings)")
+    parser.add_argument('--set', type=_parse_override, action='append', default=[], metavar='NAME=VALUE',
+                        help="Override a setting, e.g. --set DIRTY_RECT_RENDERING=False (repeatable)")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    grids = args.grid or [(settings.ROWS, settings.COLS)]
+    results = []
+    for rows, cols in grids:
+        result = run_benchmark(args.frames, args.warmup, rows, cols, dict(args.set), args.alloc_frames)
+        _print_result(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
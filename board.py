@@ -0,0 +1,170 @@
+"""
+Array-backed board state.
+
+Occupancy and disabled cells are kept as NumPy boolean masks, so whole-board
+questions (free cells, where a ship of length k fits) are single vectorised
+operations. Nothing here depends on pygame: game logic, AI and offline
+analysis can use the Board directly, while Cell sprites are only views of it.
+"""
+
+import numpy as np
+
+from ship import Ship
+
+
+def window_sums(mask, length, axis):
+    """
+    Sum of `mask` over every run of `length` consecutive cells along `axis`.
+    The result is (length - 1) shorter along that axis.
+    """
+    mask = np.asarray(mask, dtype=np.int32)
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (1, 0)
+    totals = np.cumsum(np.pad(mask, pad), axis=axis)
+    if axis == 0:
+        return totals[length:] - totals[:-length]
+    return totals[:, length:] - totals[:, :-length]
+
+
+# Values in Board.shots
+NOT_SHOT = 0
+MISS = 1
+HIT = 2
+
+
+class Board:
+    """
+    One player's board.
+    `occupied` and `disabled` are (rows, cols) boolean masks; `ship_ids`
+    holds the index into `ships` of the ship on each cell (-1 if none) and
+    `shots` records the battle phase (NOT_SHOT, MISS or HIT per cell).
+    """
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+
+        self.occupied = np.zeros((rows, cols), dtype=bool)
+        self.disabled = np.zeros((rows, cols), dtype=bool)
+        self.ship_ids = np.full((rows, cols), -1, dtype=np.int16)
+        self.shots = np.zeros((rows, cols), dtype=np.int8)
+        self.ships = []
+
+    # --- Queries ---
+
+    def state(self, row, col):
+        """'hit', 'miss', 'ship', 'disabled' or 'empty' (the strings Cell sprites use)."""
+        shot = self.shots[row, col]
+        if shot == HIT:
+            return 'hit'
+        if shot == MISS:
+            return 'miss'
+        if self.occupied[row, col]:
+            return 'ship'
+        if self.disabled[row, col]:
+            return 'disabled'
+        return 'empty'
+
+    def free_mask(self):
+        """Cells a ship could still go on."""
+        return ~(self.occupied | self.disabled)
+
+    def legal_placements(self, length):
+        """
+        Every legal placement of a ship of `length`, in one vectorised pass.
+        Returns (horizontal, vertical) boolean masks: horizontal[r, c] is True
+        if a horizontal ship can start at (r, c); same for vertical.
+        """
+        free = self.free_mask()
+        if length > self.cols:
+            horizontal = np.zeros((self.rows, 0), dtype=bool)
+        else:
+            horizontal = window_sums(free, length, axis=1) == length
+        if length > self.rows:
+            vertical = np.zeros((0, self.cols), dtype=bool)
+        else:
+            vertical = window_sums(free, length, axis=0) == length
+        return horizontal, vertical
+
+    def placement_list(self, length):
+        """Legal placements as Ship objects (horizontal first)."""
+        horizontal, vertical = self.legal_placements(length)
+        ships = [Ship(int(r), int(c), length, 'horizontal') for r, c in zip(*np.nonzero(horizontal))]
+        if length > 1:  # A 1-cell ship is the same either way
+            ships += [Ship(int(r), int(c), length, 'vertical') for r, c in zip(*np.nonzero(vertical))]
+        return ships
+
+    def can_place(self, ship):
+        """True if the ship lies on the board and only covers free cells."""
+        if ship.row < 0 or ship.col < 0:
+            return False
+        last_row, last_col = ship.coordinates[-1]
+        if last_row >= self.rows or last_col >= self.cols:
+            return False
+        rows, cols = zip(*ship.coordinates)
+        return not (self.occupied[rows, cols].any() or self.disabled[rows, cols].any())
+
+    def ship_at(self, row, col):
+        """The ship on a cell, or None."""
+        ship_id = self.ship_ids[row, col]
+        return self.ships[ship_id] if ship_id >= 0 else None
+
+    def is_sunk(self, ship):
+        """True once every cell of the ship has been hit."""
+        rows, cols = zip(*ship.coordinates)
+        return bool((self.shots[rows, cols] == HIT).all())
+
+    def all_sunk(self):
+        """True if there are ships and every one of them has been sunk."""
+        return bool(self.ships) and not (self.occupied & (self.shots != HIT)).any()
+
+    # --- Changes ---
+
+    def place(self, ship):
+        """Places a ship. Returns False (and changes nothing) if it doesn't fit."""
+        if not self.can_place(ship):
+            return False
+        rows, cols = zip(*ship.coordinates)
+        self.occupied[rows, cols] = True
+        self.ship_ids[rows, cols] = len(self.ships)
+        self.ships.append(ship)
+        return True
+
+    def disable(self, row, col):
+        """Disables an empty cell. Returns False if it is occupied or already disabled."""
+        if self.occupied[row, col] or self.disabled[row, col]:
+            return False
+        self.disabled[row, col] = True
+        return True
+
+    def place_fleet_randomly(self, lengths, rng):
+        """
+        Places ships of the given lengths at random legal positions (longest
+        first). Returns False if the fleet doesn't fit.
+        """
+        for length in sorted(lengths, reverse=True):
+            options = self.placement_list(length)
+            if not options:
+                return False
+            self.place(options[rng.integers(len(options))])
+        return True
+
+    def record_shot(self, row, col, result):
+        """
+        Records the result of a shot at a board whose ships are unknown
+        (the other player's, in a network match).
+        """
+        self.shots[row, col] = MISS if result == 'miss' else HIT
+
+    def fire(self, row, col):
+        """
+        Fires at a cell. Returns 'miss', 'hit' or 'sunk', or None if the cell
+        was already shot.
+        """
+        if self.shots[row, col] != NOT_SHOT:
+            return None
+        if not self.occupied[row, col]:
+            self.shots[row, col] = MISS
+            return 'miss'
+        self.shots[row, col] = HIT
+        return 'sunk' if self.is_sunk(self.ship_at(row, col)) else 'hit'
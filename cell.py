@@ -1,85 +1,87 @@
-
 import pygame
 import settings
+import assets
+from ship import Ship
 
 
-class Cell(pygame.sprite.Sprite):
+class Cell(pygame.sprite.DirtySprite):
     """
     Represents a single cell on the game grid.
-    Each cell manages its own state (empty, ship, disabled) and
-    its own SSVEP visual flicker.
+    The cell's state (empty, ship, disabled, hit, miss) lives in the Board;
+    the cell is a thin view over it that also handles its own highlight.
+    The cell only swaps its image when its appearance changes and then
+    marks itself dirty for the dirty-rect renderer.
     """
 
-    def __init__(self, row, col, cell_id):
+    def __init__(self, row, col, cell_id, board):
         super().__init__()
 
         self.row = row
         self.col = col
         self.cell_id = cell_id  # NEW: Store the cell's ID (e.g., "A1")
-        self.state = 'empty'  # Can be 'empty', 'ship', or 'disabled'
+        self.board = board
+        self.hide_ships = False  # True when showing the opponent's board
 
         # --- Positioning ---
         self.size = settings.CELL_SIZE
         self.x_pos = settings.GRID_MARGIN + self.col * self.size
         self.y_pos = settings.GRID_MARGIN + settings.INFO_PANEL_HEIGHT + self.row * self.size
 
+        # --- Row/Column Highlighting ---
+        self.is_highlighted = False  # Controlled externally by Game class
+
         # --- Pygame Sprite setup ---
-        self.image = pygame.Surface((self.size, self.size))
+        # The image is a shared, pre-rendered surface from the asset cache
+        self._draw_cell()
         self.rect = self.image.get_rect(topleft=(self.x_pos, self.y_pos))
 
-        # --- Row/Column Highlighting ---
-        self.is_highlighted = False  # Controlled externally by Game class
+    @property
+    def state(self):
+        """'empty', 'ship', 'disabled', 'hit' or 'miss', read from the board."""
+        state = self.board.state(self.row, self.col)
+        if state == 'ship' and self.hide_ships:
+            return 'empty'
+        return state
 
-        # --- Ship Image ---
-        self.ship_image = None
-        try:
-            original_ship_image = pygame.image.load(settings.SHIP_IMAGE_PATH).convert_alpha()
-            self.ship_image = pygame.transform.scale(original_ship_image, (self.size, self.size))
-        except pygame.error as e:
-            print(f"Warning: Could not load ship image '{settings.SHIP_IMAGE_PATH}': {e}")
+    def show_board(self, board, hide_ships=False):
+        """Makes this cell a view of another board (e.g. the opponent's in battle)."""
+        self.board = board
+        self.hide_ships = hide_ships
+        self.refresh()
 
-    def update(self):
-        """
-        Update is called once per frame.
-        This handles the cell's visual state based on highlighting.
-        """
-        self._draw_cell()
-    
     def set_highlighted(self, is_highlighted):
         """
         Set whether this cell should be highlighted (called by Game class).
+        Only redraws if the highlight actually changed.
         """
+        if is_highlighted == self.is_highlighted:
+            return
         self.is_highlighted = is_highlighted
+        self._draw_cell()
 
-    def _draw_cell(self):
-        """Updates the cell's self.image Surface with the correct color/image."""
-
-        if self.state == 'empty':
-            # Apply highlighting if empty and highlighted
-            final_color = settings.COLOR_CELL_ON if self.is_highlighted else settings.COLOR_CELL_OFF
-            self.image.fill(final_color)
-
-        elif self.state == 'ship':
-            # Cell with a ship doesn't highlight and displays the ship image
-            self.image.fill(settings.COLOR_SHIP_BG)
-            if self.ship_image:
-                self.image.blit(self.ship_image, (0, 0))
+    def refresh(self):
+        """Redraws the cell after its state changed on the board."""
+        if self.state != 'empty':
+            self.is_highlighted = False  # Only empty cells highlight
+        self._draw_cell()
 
-        elif self.state == 'disabled':
-            # NEW: Draw the disabled state (dark red)
-            self.image.fill(settings.COLOR_CELL_DISABLED)
+    def _draw_cell(self):
+        """Points self.image at the cached surface for the current state."""
+        state = self.state
+        # Only empty cells show the highlight
+        is_highlighted = self.is_highlighted and state == 'empty'
+        self.image = assets.get_cell_surface(state, is_highlighted, self.size)
 
-        # Draw a border around the cell (always)
-        pygame.draw.rect(self.image, settings.COLOR_WHITE, self.image.get_rect(), 1)
+        # Tell the dirty-rect renderer this cell needs to be re-blitted
+        self.dirty = 1
 
     def place_ship(self):
         """
-        Sets the cell's state to 'ship'.
+        Places a 1x1 ship on this cell.
         Returns False if already occupied or disabled.
         """
-        if self.state == 'empty':
-            self.state = 'ship'
-            self.is_highlighted = False  # Stop highlighting
+        if self.board.place(Ship(self.row, self.col)):
+            self.refresh()
             return True
         return False
 
@@ -88,8 +90,7 @@ class Cell(pygame.sprite.Sprite):
         NEW: Sets the cell's state to 'disabled'.
         This is called when the corresponding button is clicked.
         """
-        if self.state == 'empty':  # Can only disable empty cells
-            self.state = 'disabled'
-            self.is_lit = False  # Stop flashing
+        if self.board.disable(self.row, self.col):  # Can only disable empty cells
+            self.refresh()
             return True
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,97 @@
+"""
+Input pipeline: every input source drives the game through named commands.
+
+- InputDispatcher maps pygame event types (and keys) to commands through a
+  dispatch table, and blocks every event type nothing is bound to, so
+  pygame.event.get() only ever returns events the game acts on.
+- CommandQueue is where other threads (decoder, serial, network) post
+  commands; the game drains it in bounded batches once per frame.
+
+Commands are (name, args) pairs; the game maps each name to one handler
+(see Game._execute), so a key press, a decoded selection and a remote
+command all take the same path.
+"""
+
+import collections
+import time
+
+import pygame
+
+import settings
+
+# A command waiting in a CommandQueue
+Command = collections.namedtuple('Command', ['name', 'args', 'posted_ns'])
+
+
+class CommandQueue:
+    """
+    Thread-safe command queue. post() only appends to a deque (atomic in
+    CPython, no lock), so it can be called from any thread.
+    """
+
+    def __init__(self, batch_limit=None):
+        self.batch_limit = settings.COMMAND_BATCH_LIMIT if batch_limit is None else batch_limit
+        self._queue = collections.deque()
+        self.posted = 0
+        self.max_latency_ns = 0  # Longest time a command waited to be drained
+
+    def post(self, name, *args):
+        """Queues a command. Never blocks."""
+        self._queue.append(Command(name, args, time.perf_counter_ns()))
+        self.posted += 1
+
+    def pending(self):
+        return len(self._queue)
+
+    def drain(self):
+        """Takes up to batch_limit commands, oldest first; the rest wait for the next frame."""
+        queue = self._queue
+        batch = []
+        while queue and len(batch) < self.batch_limit:
+            batch.append(queue.popleft())
+        if batch:
+            self.max_latency_ns = max(self.max_latency_ns, time.perf_counter_ns() - batch[0].posted_ns)
+        return batch
+
+
+class InputDispatcher:
+    """
+    Dispatch table from pygame events to commands.
+    bind_key() binds a KEYDOWN key to a command; bind_event() binds a whole
+    event type to a function that turns the event into a command (or None).
+    """
+
+    def __init__(self, execute):
+        self.execute = execute  # Called with (name, *args) for every command
+        self._keys = {}  # key -> (name, args)
+        self._events = {}  # event type -> function(event) -> (name, args) or None
+
+    def bind_key(self, key, name, *args):
+        self._keys[key] = (name, args)
+
+    def bind_event(self, event_type, translate):
+        self._events[event_type] = translate
+
+    def install(self):
+        """Lets only the bound event types into pygame's event queue."""
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(self.event_types())
+
+    def event_types(self):
+        types = set(self._events)
+        if self._keys:
+            types.add(pygame.KEYDOWN)
+        return sorted(types)
+
+    def dispatch(self, events):
+        """Executes the command bound to each event."""
+        keys = self._keys
+        handlers = self._events
+        for event in events:
+            if event.type == pygame.KEYDOWN and event.key in keys:
+                name, args = keys[event.key]
+                self.execute(name, *args)
+            elif event.type in handlers:
+                command = handlers[event.type](event)
+                if command:
+                    self.execute(command[0], *command[1])
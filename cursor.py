@@ -3,10 +3,10 @@ import pygame
 import settings
 
 
-class Cursor(pygame.sprite.Sprite):
+class Cursor(pygame.sprite.DirtySprite):
     """
     A visual indicator for the currently selected cell.
-    This is what the user controls (with keys now, with SSVEP later).
+    This is what the user controls (with keys, or the P300 decoder).
     """
 
     def __init__(self):
@@ -34,6 +34,7 @@ class Cursor(pygame.sprite.Sprite):
             settings.GRID_MARGIN + self.col * self.size,
             settings.GRID_MARGIN + settings.INFO_PANEL_HEIGHT + self.row * self.size
         )
+        self.dirty = 1
 
     def move(self, dr, dc):
         """
@@ -46,4 +47,10 @@ class Cursor(pygame.sprite.Sprite):
 
     def get_selected_pos(self):
         """Returns the (row, col) of the currently selected cell."""
-        return (self.row, self.col)
\ No newline at end of file
+        return (self.row, self.col)
+
+    def move_to(self, row, col):
+        """Moves the cursor straight to a given cell (used by the decoder)."""
+        self.row = row % settings.ROWS
+        self.col = col % settings.COLS
+        self._update_position()
@@ -0,0 +1,274 @@
+"""
+Online P300 decoding.
+
+EEG samples go into a preallocated ring buffer. Every row/column onset is
+registered with the sample index of its flip; once enough samples have
+arrived the epoch is scored straight from a view into the buffer (no copy)
+and added to the running score of every cell in the stimulus' mask (see
+paradigm.py). When every stimulus has been shown DECODER_REPETITIONS times,
+the cell with the best mean score is selected.
+
+SyntheticEEG produces noise plus a P300 after flashes that contain a
+target cell, so the whole path can be run offline.
+"""
+
+import collections
+import time
+
+import numpy as np
+
+import settings
+from paradigm import RowColumnParadigm
+
+
+class RingBuffer:
+    """
+    Fixed-size (samples x channels) float32 ring buffer.
+    Every sample is written twice (at i and i + capacity), so any window of
+    up to `capacity` samples is one contiguous slice - epochs are views.
+    """
+
+    def __init__(self, n_channels, capacity):
+        self.n_channels = n_channels
+        self.capacity = capacity
+        self._data = np.zeros((2 * capacity, n_channels), dtype=np.float32)
+        self.total = 0  # Samples written since the start
+
+    def write(self, samples):
+        """Appends a (n, channels) block of samples."""
+        n = len(samples)
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            self.total += n - self.capacity
+            n = self.capacity
+
+        start = self.total % self.capacity
+        first = min(n, self.capacity - start)
+        # Lower copy
+        self._data[start:start + first] = samples[:first]
+        self._data[:n - first] = samples[first:]
+        # Upper copy
+        self._data[self.capacity + start:self.capacity + start + first] = samples[:first]
+        self._data[self.capacity:self.capacity + n - first] = samples[first:]
+
+        self.total += n
+
+    def window(self, start_sample, length):
+        """Returns a (length, channels) view starting at an absolute sample index."""
+        if start_sample < self.total - self.capacity or start_sample + length > self.total:
+            raise IndexError("Requested window is not in the buffer.")
+        start = start_sample % self.capacity
+        return self._data[start:start + length]
+
+
+class P300Decoder:
+    """
+    Scores each stimulus epoch with a linear model (a fixed template, or one
+    trained with train.py) and accumulates the score onto every cell the
+    stimulus flashed. `masks` is the paradigm's (n_stimuli x rows*cols)
+    mask matrix; the default is rows then columns.
+    """
+
+    def __init__(self, rows, cols, srate=None, n_channels=None, epoch_ms=None, repetitions=None, masks=None):
+        self.rows = rows
+        self.cols = cols
+        self.srate = settings.EEG_SRATE if srate is None else srate
+        self.n_channels = settings.EEG_CHANNELS if n_channels is None else n_channels
+        self.epoch_len = round((settings.EPOCH_MS if epoch_ms is None else epoch_ms) * self.srate / 1000)
+        self.repetitions = settings.DECODER_REPETITIONS if repetitions is None else repetitions
+
+        # Keep a couple of seconds beyond one epoch so late processing never loses data
+        self.buffer = RingBuffer(self.n_channels, self.epoch_len + 2 * self.srate)
+
+        self.weights = self.default_weights()
+        self.bias = 0.0
+
+        self.masks = RowColumnParadigm(rows, cols).masks if masks is None else masks
+        # Possible selections and the stimuli worth waiting for (see prior.py); None = all
+        self.valid_cells = None
+        self.active_stimuli = None
+
+        # --- Score accumulators (per stimulus id, and per flattened cell) ---
+        self.stim_scores = np.zeros(len(self.masks))
+        self.stim_counts = np.zeros(len(self.masks), dtype=np.int64)
+        self.cell_scores = np.zeros(rows * cols)
+        self.cell_counts = np.zeros(rows * cols, dtype=np.int64)
+
+        self._pending = collections.deque()  # (stim_id, onset sample) waiting for data
+        self.epoch_times_ns = collections.deque(maxlen=1000)  # Processing time of recent epochs
+
+    def default_weights(self):
+        """
+        A simple template until a trained model is loaded: the mean amplitude
+        250-500 ms after onset, averaged over all channels.
+        """
+        weights = np.zeros((self.epoch_len, self.n_channels), dtype=np.float32)
+        start = round(0.25 * self.srate)
+        stop = min(self.epoch_len, round(0.5 * self.srate))
+        weights[start:stop] = 1.0 / ((stop - start) * self.n_channels)
+        return weights
+
+    def load_model(self, path):
+        """
+        Replaces the template weights with a model trained by train.py.
+        Returns the model's metadata (score distributions, cross-validated AUC...).
+        """
+        with np.load(path) as model:
+            weights = model['weights']
+            metadata = {name: model[name].item() for name in model.files if name != 'weights'}
+        if weights.shape != self.weights.shape or metadata['srate'] != self.srate:
+            raise ValueError(f"{path} was trained for {weights.shape[0]}-sample epochs x {weights.shape[1]} channels "
+                             f"at {metadata['srate']} Hz, but the decoder uses {self.epoch_len} x {self.n_channels} "
+                             f"at {self.srate} Hz.")
+        self.weights = weights.astype(np.float32)
+        self.bias = float(metadata['bias'])
+        return metadata
+
+    def push_samples(self, samples):
+        """Adds a (n, channels) block of EEG samples."""
+        self.buffer.write(samples)
+
+    def mark_onset(self, stim_id, sample_index):
+        """Registers a stimulus onset at an absolute sample index."""
+        self._pending.append((stim_id, sample_index))
+
+    def process(self):
+        """
+        Scores every pending epoch whose samples have all arrived.
+        Returns a list of (stim_id, score) for the epochs scored this call.
+        """
+        scored = []
+        buffer_total = self.buffer.total
+        while self._pending and self._pending[0][1] + self.epoch_len <= buffer_total:
+            t0 = time.perf_counter_ns()
+            stim_id, onset = self._pending.popleft()
+
+            epoch = self.buffer.window(onset, self.epoch_len)
+            score = float(np.vdot(self.weights, epoch)) + self.bias
+
+            self.stim_scores[stim_id] += score
+            self.stim_counts[stim_id] += 1
+            mask = self.masks[stim_id]
+            self.cell_scores[mask] += score
+            self.cell_counts[mask] += 1
+            scored.append((stim_id, score))
+
+            self.epoch_times_ns.append(time.perf_counter_ns() - t0)
+        return scored
+
+    def set_prior(self, valid_cells, active_stimuli):
+        """Restricts decisions to valid cells, and waits only for the active stimuli."""
+        self.valid_cells = valid_cells
+        self.active_stimuli = active_stimuli
+
+    def decide(self):
+        """
+        Returns the selected (row, col) once every (active) stimulus has been
+        shown `repetitions` times, else None. Accumulators reset after a decision.
+        """
+        counts = self.stim_counts if self.active_stimuli is None else self.stim_counts[self.active_stimuli]
+        if counts.min() < self.repetitions:
+            return None
+
+        mean_scores = self.cell_scores / np.maximum(self.cell_counts, 1)
+        if self.valid_cells is not None:
+            mean_scores[~self.valid_cells] = -np.inf
+        best = int(np.argmax(mean_scores))
+        self.reset()
+        return divmod(best, self.cols)
+
+    def reset(self):
+        """
+        Clears the score accumulators. Epochs still waiting for data belong to
+        the selection that just finished, so they are dropped too.
+        """
+        self.stim_scores[:] = 0
+        self.stim_counts[:] = 0
+        self.cell_scores[:] = 0
+        self.cell_counts[:] = 0
+        self._pending.clear()
+
+    def max_epoch_time_ms(self):
+        """Slowest recent per-epoch processing time in ms."""
+        return max(self.epoch_times_ns, default=0) / 1e6
+
+
+class SyntheticEEG:
+    """
+    Offline EEG source: Gaussian noise on every channel plus a P300-like
+    bump after every flash that contains the target cell. The flash reaches
+    the screen display_latency_ms after its flip, like on a real display.
+    Samples are produced on demand, so timing follows the caller's clock.
+    """
+
+    def __init__(self, rows, cols, srate=None, n_channels=None, target=None,
+                 amplitude_uv=None, noise_uv=None, latency_ms=None, seed=None, masks=None, display_latency_ms=None,
+                 prior=None):
+        self.rows = rows
+        self.cols = cols
+        self.masks = RowColumnParadigm(rows, cols).masks if masks is None else masks
+        self.srate = settings.EEG_SRATE if srate is None else srate
+        self.n_channels = settings.EEG_CHANNELS if n_channels is None else n_channels
+        self.amplitude_uv = settings.SYNTHETIC_P300_UV if amplitude_uv is None else amplitude_uv
+        self.noise_uv = settings.SYNTHETIC_NOISE_UV if noise_uv is None else noise_uv
+        latency_ms = settings.SYNTHETIC_P300_LATENCY_MS if latency_ms is None else latency_ms
+        display_latency_ms = settings.SYNTHETIC_DISPLAY_LATENCY_MS if display_latency_ms is None else display_latency_ms
+        self._display_delay = round(display_latency_ms * self.srate / 1000)  # Samples from flip to pixels
+
+        self._rng = np.random.default_rng(seed)
+        self.fixed_target = target  # (row, col) or None for a new random target per selection
+        self.target = target if target is not None else self._pick_target(prior)
+
+        # P300 template: Gaussian bump centred at the latency, ~100 ms wide
+        t = np.arange(round((latency_ms + 300) * self.srate / 1000)) / self.srate * 1000
+        self._template = (np.exp(-0.5 * ((t - latency_ms) / 50) ** 2) * self.amplitude_uv).astype(np.float32)
+
+        self.sample_count = 0  # Samples produced so far
+        self._responses = collections.deque()  # Onset sample of each pending P300
+
+    def _random_target(self):
+        return int(self._rng.integers(self.rows)), int(self._rng.integers(self.cols))
+
+    def next_selection(self, prior=None):
+        """
+        Called after each decision; picks a new random target unless one is
+        fixed. With a prior (flattened cell probabilities, see prior.py) the
+        participant picks possible cells, likely ones more often.
+        """
+        if self.fixed_target is not None:
+            return
+        self.target = self._pick_target(prior)
+
+    def _pick_target(self, prior):
+        if prior is None:
+            return self._random_target()
+        return divmod(int(self._rng.choice(len(prior), p=prior)), self.cols)
+
+    def contains_target(self, stim_id):
+        """True if the stimulus flashes the target cell."""
+        return bool(self.masks[stim_id, self.target[0] * self.cols + self.target[1]])
+
+    def on_stimulus(self, stim_id, sample_index):
+        """Schedules a P300 if this flash (flipped at sample_index) contains the target."""
+        if self.contains_target(stim_id):
+            self._responses.append(sample_index + self._display_delay)
+
+    def read(self, n):
+        """Produces the next n samples as a (n, channels) float32 array."""
+        start = self.sample_count
+        samples = self._rng.standard_normal((n, self.n_channels), dtype=np.float32)
+        samples *= self.noise_uv
+
+        template_len = len(self._template)
+        for onset in self._responses:
+            lo = max(start, onset)
+            hi = min(start + n, onset + template_len)
+            if lo < hi:
+                samples[lo - start:hi - start] += self._template[lo - onset:hi - onset, None]
+
+        # Forget responses that are completely in the past
+        while self._responses and self._responses[0] + template_len <= start + n:
+            self._responses.popleft()
+
+        self.sample_count += n
+        return samples
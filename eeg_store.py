@@ -0,0 +1,295 @@
+"""
+EEG recording store: raw samples plus a stimulus event table, side by side.
+
+A recording is three files sharing one name:
+- .json    header: sample rate, channels, grid size, cell IDs ("A1".."F6"),
+           paradigm and its stimulus masks (which cells each stimulus id flashes),
+           photodiode channel and source (calibration runs) and the display latency
+           added to the stimulus event samples (see photodiode.py)
+- .f32     float32 samples, (n_samples x channels), appended in fixed-size chunks
+- .events  EVENT_DTYPE records: sample index, event type (recorder.py
+           constants), stimulus id and cell (flattened r * cols + c, -1 = unknown)
+
+EEGStoreWriter appends from the game loop without blocking (a background
+thread does the writes, like the session recorder). EEGStore opens a
+recording with numpy.memmap, so nothing is loaded until it is used, and
+epochs() cuts every target / non-target epoch in one indexing operation on
+a strided window view of the samples:
+
+    python eeg_store.py sessions/eeg_20250101_120000.json
+"""
+
+import argparse
+import collections
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import settings
+from recorder import STIM_ONSET, SELECTION
+
+FORMAT_VERSION = 1
+
+# One row of the event table
+EVENT_DTYPE = np.dtype([('sample', '<i8'), ('type', 'u1'), ('pad', 'u1'), ('stim', '<i2'), ('cell', '<i2')])
+
+
+def _data_paths(path):
+    """Header path -> (samples path, events path)."""
+    base = os.path.splitext(path)[0]
+    return base + '.f32', base + '.events'
+
+
+class EEGStoreWriter:
+    """
+    Appends samples and events to a recording. Samples are collected into
+    chunks of `chunk_samples`; full chunks and events are written by a
+    background thread, so append() and add_event() never wait on disk.
+    """
+
+    def __init__(self, path, srate, n_channels, rows, cols, cell_ids, masks, paradigm='rowcol', chunk_samples=None,
+                 photodiode_channel=None, display_latency_ms=0.0, photodiode_source=None):
+        self.path = path
+        self.samples_path, self.events_path = _data_paths(path)
+        self.n_channels = n_channels
+        self.chunk_samples = settings.EEG_STORE_CHUNK_SAMPLES if chunk_samples is None else chunk_samples
+        self.header = {
+            'version': FORMAT_VERSION,
+            'srate': srate,
+            'n_channels': n_channels,
+            'rows': rows,
+            'cols': cols,
+            'cell_ids': list(cell_ids),
+            'paradigm': paradigm,
+            'masks': np.asarray(masks, dtype=np.uint8).tolist(),
+            'photodiode_channel': photodiode_channel,
+            'photodiode_source': photodiode_source,
+            'display_latency_ms': display_latency_ms,
+            'chunk_samples': self.chunk_samples,
+            'n_samples': 0,
+            'n_events': 0,
+        }
+        self._write_header()
+
+        self._chunk = np.empty((self.chunk_samples, n_channels), dtype=np.float32)
+        self._fill = 0
+        self.n_samples = 0
+        self.n_events = 0
+
+        self._samples_file = open(self.samples_path, 'wb')
+        self._events_file = open(self.events_path, 'wb')
+        self._queue = collections.deque()  # (file, bytes)
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._writer_loop, name="eeg-store", daemon=True)
+        self._thread.start()
+
+    def append(self, samples):
+        """Adds a (n, channels) block of samples."""
+        samples = np.asarray(samples, dtype=np.float32)
+        self.n_samples += len(samples)
+        while len(samples):
+            n = min(len(samples), self.chunk_samples - self._fill)
+            self._chunk[self._fill:self._fill + n] = samples[:n]
+            self._fill += n
+            samples = samples[n:]
+            if self._fill == self.chunk_samples:
+                self._queue_write(self._samples_file, self._chunk.tobytes())
+                self._fill = 0
+
+    def add_event(self, sample, event_type, stim=-1, cell=-1):
+        """Adds one event at an absolute sample index."""
+        record = np.array([(sample, event_type, 0, stim, cell)], dtype=EVENT_DTYPE)
+        self._queue_write(self._events_file, record.tobytes())
+        self.n_events += 1
+
+    def close(self):
+        """Writes the last partial chunk and the final header."""
+        if self._fill:
+            self._queue_write(self._samples_file, self._chunk[:self._fill].tobytes())
+            self._fill = 0
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+        self._samples_file.close()
+        self._events_file.close()
+
+        self.header['n_samples'] = self.n_samples
+        self.header['n_events'] = self.n_events
+        self._write_header()
+
+    def _queue_write(self, file, data):
+        self._queue.append((file, data))
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def _write_header(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.header, f)
+
+    def _writer_loop(self):
+        queue = self._queue
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+
+            written = set()
+            while queue:
+                file, data = queue.popleft()
+                file.write(data)
+                written.add(file)
+            for file in written:
+                file.flush()
+
+            if self._stopping and not queue:
+                break
+
+
+class EEGStore:
+    """
+    Read-only view of a recording. `samples` and `events` are memmaps, so
+    recordings far larger than RAM can be opened; pages are only read when
+    an epoch touches them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path) as f:
+            self.header = json.load(f)
+        if self.header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported EEG store version {self.header.get('version')}.")
+
+        self.srate = self.header['srate']
+        self.n_channels = self.header['n_channels']
+        self.rows = self.header['rows']
+        self.cols = self.header['cols']
+        self.cell_ids = self.header['cell_ids']
+        self.masks = np.array(self.header['masks'], dtype=bool)
+
+        samples_path, events_path = _data_paths(path)
+        # The file sizes are the truth (the header is only final after close())
+        n_samples = os.path.getsize(samples_path) // (4 * self.n_channels)
+        n_events = os.path.getsize(events_path) // EVENT_DTYPE.itemsize
+        self.samples = self._memmap(samples_path, np.float32, (n_samples, self.n_channels))
+        self.events = self._memmap(events_path, EVENT_DTYPE, (n_events,))
+
+    @staticmethod
+    def _memmap(path, dtype, shape):
+        if shape[0] == 0:
+            return np.empty(shape, dtype=dtype)  # memmap can't map an empty file
+        return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+
+    def cell_index(self, cell_id):
+        """ "C4" -> flattened cell index."""
+        return self.cell_ids.index(cell_id)
+
+    def stimulus_events(self):
+        """
+        (onset samples, stimulus ids, is_target) for every stimulus onset.
+        is_target is False when the attended cell is unknown.
+        """
+        onsets = self.events[self.events['type'] == STIM_ONSET]
+        cells = onsets['cell'].astype(np.int64)
+        known = cells >= 0
+        is_target = np.zeros(len(onsets), dtype=bool)
+        is_target[known] = self.masks[onsets['stim'][known], cells[known]]
+        return onsets['sample'].astype(np.int64), onsets['stim'].astype(np.int64), is_target
+
+    def selections(self):
+        """(sample, cell ID) of every decoder selection."""
+        selected = self.events[self.events['type'] == SELECTION]
+        return [(int(s), self.cell_ids[c]) for s, c in zip(selected['sample'], selected['cell'])]
+
+    def windows(self, epoch_len):
+        """
+        Every possible epoch as a (n_samples - epoch_len + 1, epoch_len, channels)
+        strided view of the samples (no copy).
+        """
+        return sliding_window_view(self.samples, epoch_len, axis=0).transpose(0, 2, 1)
+
+    def epochs(self, epoch_ms=None, which='all', start=None, stop=None):
+        """
+        Cuts the epochs after every stimulus onset in one operation.
+        which: 'all', 'target' or 'nontarget'. start/stop select a range of
+        onsets (e.g. for batches). Epochs that run past the end of the
+        recording are left out.
+        Returns (epochs (n, epoch_len, channels) float32, stimulus ids, is_target).
+        """
+        epoch_len = round((settings.EPOCH_MS if epoch_ms is None else epoch_ms) * self.srate / 1000)
+        onsets, stims, is_target = (a[start:stop] for a in self.stimulus_events())
+
+        keep = onsets + epoch_len <= len(self.samples)
+        if which == 'target':
+            keep &= is_target
+        elif which == 'nontarget':
+            keep &= ~is_target
+        elif which != 'all':
+            raise ValueError(f"which must be 'all', 'target' or 'nontarget', not {which!r}.")
+
+        return self.windows(epoch_len)[onsets[keep]], stims[keep], is_target[keep]
+
+    def iter_epochs(self, batch_size=1000, epoch_ms=None, which='all'):
+        """epochs() in batches of up to batch_size onsets, for recordings whose epochs don't fit in RAM."""
+        n_onsets = int(np.count_nonzero(self.events['type'] == STIM_ONSET))
+        for start in range(0, n_onsets, batch_size):
+            yield self.epochs(epoch_ms, which, start, start + batch_size)
+
+    def class_averages(self, epoch_ms=None, batch_size=1000):
+        """Target and non-target average epochs, accumulated batch by batch."""
+        sums = {}
+        counts = {True: 0, False: 0}
+        for epochs, _, is_target in self.iter_epochs(batch_size, epoch_ms):
+            for label in (True, False):
+                selected = epochs[is_target == label]
+                if len(selected):
+                    sums[label] = sums.get(label, 0) + selected.sum(axis=0, dtype=np.float64)
+                    counts[label] += len(selected)
+        return tuple(sums[label] / counts[label] if counts[label] else None for label in (True, False))
+
+
+def create_eeg_store_writer(path, paradigm, srate=None, n_channels=None, photodiode=None, display_latency_ms=0.0):
+    """
+    Writer for the current grid and paradigm, with cell IDs from settings.
+    photodiode (its source, e.g. 'synthetic') adds one channel after the EEG channels.
+    """
+    cell_ids = [f"{settings.COL_LABELS[c]}{settings.ROW_LABELS[r]}"
+                for r in range(settings.ROWS) for c in range(settings.COLS)]
+    n_channels = settings.EEG_CHANNELS if n_channels is None else n_channels
+    return EEGStoreWriter(
+        path,
+        settings.EEG_SRATE if srate is None else srate,
+        n_channels + (photodiode is not None),
+        settings.ROWS, settings.COLS, cell_ids, paradigm.masks, paradigm.name,
+        photodiode_channel=n_channels if photodiode is not None else None,
+        display_latency_ms=display_latency_ms,
+        photodiode_source=photodiode,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise EEG recordings and time offline epoching.")
+    parser.add_argument('recordings', nargs='+', help="EEG store headers (.json)")
+    parser.add_argument('--epoch-ms', type=int, default=settings.EPOCH_MS)
+    args = parser.parse_args()
+
+    for recording in args.recordings:
+        store = EEGStore(recording)
+        duration_s = len(store.samples) / store.srate
+        print(f"{recording}: {len(store.samples)} samples x {store.n_channels} channels ({duration_s:.0f} s), "
+              f"{len(store.events)} events, {store.header['paradigm']} paradigm")
+
+        t0 = time.perf_counter()
+        epochs, stims, is_target = store.epochs(args.epoch_ms)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        print(f"  {len(epochs)} epochs ({int(is_target.sum())} target) cut in {elapsed_ms:.1f} ms")
+
+        target, nontarget = store.class_averages(args.epoch_ms)
+        if target is not None and nontarget is not None:
+            difference = (target - nontarget).mean(axis=1)
+            peak = int(np.argmax(difference))
+            print(f"  Target - non-target peak: {difference[peak]:.2f} uV at {peak * 1000 / store.srate:.0f} ms")
+        print(f"  Selections: {', '.join(cell for _, cell in store.selections()) or 'none'}")
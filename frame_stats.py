@@ -0,0 +1,133 @@
+"""
+Always-on frame timing instrumentation.
+
+Every frame's flip time and phase durations go into fixed-size array-backed
+ring buffers (no allocation per frame). A frame is flagged as dropped when
+the time since the previous flip is longer than the refresh interval (times
+FRAME_DROP_FACTOR), and remembers which stimulus was on screen. Everything
+can be dumped to CSV or a compact .npz file at exit.
+
+StartupTimer breaks down the time from Game() until the first frame.
+"""
+
+import time
+from array import array
+
+import numpy as np
+
+import settings
+
+# Per-frame columns kept in the ring buffer (all int64)
+COLUMNS = ('frame', 'flip_ns', 'interval_ns', 'events_ns', 'update_ns', 'draw_ns', 'present_ns', 'stim', 'dropped')
+
+
+class FrameStats:
+    """
+    Fixed-size ring buffer of per-frame timings.
+    `stim` is the stimulus id on screen during the frame (-1 if none).
+    """
+
+    def __init__(self, capacity=None, refresh_rate_hz=None, drop_factor=None):
+        self.capacity = settings.FRAME_STATS_CAPACITY if capacity is None else capacity
+        refresh_rate_hz = settings.REFRESH_RATE_HZ if refresh_rate_hz is None else refresh_rate_hz
+        drop_factor = settings.FRAME_DROP_FACTOR if drop_factor is None else drop_factor
+        self.frame_interval_ns = 1e9 / refresh_rate_hz
+        self.drop_threshold_ns = self.frame_interval_ns * drop_factor
+
+        self._columns = {name: array('q', bytes(8 * self.capacity)) for name in COLUMNS}
+        self.count = 0  # Frames recorded so far (may exceed capacity)
+        self.dropped = 0
+        self.dropped_during_stimulus = 0
+        self._last_flip_ns = None
+
+        # Live-stats text for the info panel, refreshed every LIVE_STATS_FRAMES frames
+        self._live_text = "Frame stats: collecting..."
+
+    def record(self, flip_ns, events_ns, update_ns, draw_ns, present_ns, stim):
+        """Records one frame. Cheap enough to call every frame."""
+        interval_ns = 0 if self._last_flip_ns is None else flip_ns - self._last_flip_ns
+        self._last_flip_ns = flip_ns
+
+        dropped = interval_ns > self.drop_threshold_ns
+        if dropped:
+            self.dropped += 1
+            if stim >= 0:
+                self.dropped_during_stimulus += 1
+
+        i = self.count % self.capacity
+        columns = self._columns
+        columns['frame'][i] = self.count
+        columns['flip_ns'][i] = flip_ns
+        columns['interval_ns'][i] = interval_ns
+        columns['events_ns'][i] = events_ns
+        columns['update_ns'][i] = update_ns
+        columns['draw_ns'][i] = draw_ns
+        columns['present_ns'][i] = present_ns
+        columns['stim'][i] = stim
+        columns['dropped'][i] = dropped
+        self.count += 1
+
+        if self.count % settings.LIVE_STATS_FRAMES == 0:
+            self._live_text = self._make_live_text()
+
+    def to_array(self):
+        """All recorded frames (oldest first) as a NumPy structured array."""
+        n = min(self.count, self.capacity)
+        start = self.count % self.capacity if self.count > self.capacity else 0
+        order = (np.arange(n) + start) % self.capacity
+
+        result = np.empty(n, dtype=[(name, np.int64) for name in COLUMNS])
+        for name in COLUMNS:
+            result[name] = np.frombuffer(self._columns[name], dtype=np.int64)[order]
+        return result
+
+    def live_text(self):
+        """Short summary for the info panel."""
+        return self._live_text
+
+    def _make_live_text(self):
+        """Builds the live summary from the last LIVE_STATS_FRAMES frames."""
+        n = min(settings.LIVE_STATS_FRAMES, self.count, self.capacity)
+        intervals = sorted(
+            self._columns['interval_ns'][(self.count - 1 - k) % self.capacity] for k in range(n)
+        )
+        mean_ms = sum(intervals) / n / 1e6
+        p99_ms = intervals[min(n - 1, round(0.99 * n))] / 1e6
+        fps = 1000 / mean_ms if mean_ms else 0.0
+        return (f"{fps:.1f} fps | p99 {p99_ms:.1f} ms | "
+                f"{self.dropped} dropped ({self.dropped_during_stimulus} in flash)")
+
+    def save(self, path):
+        """Writes the frames to `path` as CSV (.csv) or compact binary (.npz)."""
+        data = self.to_array()
+        if path.endswith('.npz'):
+            np.savez_compressed(path, frames=data, frame_interval_ns=self.frame_interval_ns)
+        else:
+            np.savetxt(path, data, fmt='%d', delimiter=',', header=','.join(COLUMNS), comments='')
+
+    def print_summary(self):
+        print(f"Frames: {self.count}, dropped {self.dropped} "
+              f"({self.dropped_during_stimulus} while a stimulus was on screen)")
+
+
+class StartupTimer:
+    """Time spent in each startup stage, reported once the first frame is on screen."""
+
+    def __init__(self):
+        self.start_ns = time.perf_counter_ns()
+        self._last_ns = self.start_ns
+        self.stages = []  # (name, duration in ns)
+
+    def mark(self, stage):
+        """Ends the current stage (everything since the previous mark)."""
+        now = time.perf_counter_ns()
+        self.stages.append((stage, now - self._last_ns))
+        self._last_ns = now
+
+    def total_ms(self):
+        return (self._last_ns - self.start_ns) / 1e6
+
+    def print_report(self):
+        print(f"Startup: first frame after {self.total_ms():.0f} ms")
+        for stage, duration_ns in self.stages:
+            print(f"  {stage:<20} {duration_ns / 1e6:7.1f} ms")
@@ -1,13 +1,34 @@
-import sys
-import random
+import collections
+import os
+import time
 
+import numpy as np
 import pygame
 
 import settings
+import assets
+import eeg_store
+import markers
+import network
+import photodiode
+import recorder
+import trigger
+from board import Board, NOT_SHOT
+from commands import CommandQueue, InputDispatcher
 from cell import Cell
 from cursor import Cursor
+from decoder import P300Decoder, SyntheticEEG
+from frame_stats import FrameStats, StartupTimer
+from stopping import DynamicStopping, SelectionStats
 from grid_button import GridButton
+from info_panel import InfoPanel
+from opponent import ProbabilityOpponent
+from paradigm import PARADIGM_NAMES, create_paradigm
+from prior import SelectionPrior
+from scheduler import StimulusScheduler
+from sequence import SequenceGenerator
 from ship import Ship
+from sync_patch import SyncPatch
 
 
 class Game:
@@ -17,11 +38,19 @@ class Game:
     """
 
     def __init__(self):
-        pygame.init()
-        self.screen = pygame.display.set_mode((settings.SCREEN_WIDTH, settings.SCREEN_HEIGHT))
+        self.startup = StartupTimer()
+
+        # Only the modules the game uses (pygame.init() would also open audio, joysticks...)
+        pygame.display.init()
+        pygame.font.init()
+        self.vsync = self._open_display()
         pygame.display.set_caption(settings.GAME_TITLE)
         self.clock = pygame.time.Clock()
         self.is_running = True
+        self.startup.mark("display")
+
+        # All files written for this session share this timestamp
+        self.session_name = time.strftime("%Y%m%d_%H%M%S")
 
         # --- Game Objects ---
         self.all_sprites = pygame.sprite.Group()
@@ -33,41 +62,252 @@ class Game:
         self.cells_by_id = {}
         self.buttons = {}
 
-        self.placed_ships = []
+        # --- Board State (NumPy masks; cells are views of it) ---
+        self.board = Board(settings.ROWS, settings.COLS)
+        self.placed_ships = self.board.ships
+
+        # Ship placed by the next Space/Enter (changed with 1-5 and R)
+        self.ship_length = settings.DEFAULT_SHIP_LENGTH
+        self.ship_orientation = 'horizontal'
+
+        # --- Game Phase ---
+        self.phase = 'placement'  # 'placement', then 'battle' (B key), then 'over' ('waiting' for a network opponent)
+        self.enemy_board = None
+        self.opponent = None
+        self.battle_message = ""
+        # Network match state (see network.py)
+        self.remote_placed = []  # Lengths of the ships the other player announced
+        self.remote_fleet = None  # Fleet lengths once the other player is ready
+        self.my_turn = False
+        # Resolved now (even if random) so it can be logged and replayed
+        self.ai_seed = settings.AI_SEED if settings.AI_SEED is not None else int(np.random.SeedSequence().entropy % 2 ** 32)
+
+        # --- Stimulus paradigm (which cells each stimulus flashes, see paradigm.py) ---
+        # The paradigm layout and the sequence share one seed, so both can be replayed
+        sequence_seed = settings.SEQUENCE_SEED if settings.SEQUENCE_SEED is not None else int(np.random.SeedSequence().entropy % 2 ** 32)
+        self.paradigm = create_paradigm(settings.ROWS, settings.COLS, seed=sequence_seed)
+        print(f"Paradigm: {self.paradigm.name}, {self.paradigm.n_stimuli} stimuli per block")
+
+        # --- Highlighting from a precomputed, seeded sequence of stimulus ids ---
+        self.sequence_generator = SequenceGenerator(settings.ROWS, settings.COLS, seed=sequence_seed,
+                                                    stim_types=self.paradigm.stim_types)
+        # Only the first few blocks now; the rest are generated as the session runs
+        self.sequence = self.sequence_generator.generate(settings.SEQUENCE_BLOCKS).tolist()
+        self.stim_index = -1  # Index into self.sequence of the current stimulus
+        # The last stimuli actually shown (newest last), as far back as the sequence constraints look
+        self.recent_stimuli = collections.deque(maxlen=self.sequence_generator.history_len)
+        # Every stimulus id shown, in onset order (the selection prior skips and reorders the sequence)
+        self.shown_stimuli = []
+        self.startup.mark("paradigm + sequence")
+
+        # Frame-locked stimulus timeline (the first stimulus is picked on frame 0)
+        self.scheduler = StimulusScheduler()
+
+        # --- Selection prior from the board state (see prior.py; None if disabled) ---
+        self.prior = SelectionPrior(self.paradigm.masks) if settings.SELECTION_PRIOR else None
+        self.target_heatmap = None  # Where the opponent's ships probably are (battle phase)
+
+        # --- Trigger Output (None if disabled in settings) ---
+        self.triggers = trigger.create_trigger_writer()
+        if self.triggers and self.paradigm.trigger_codes is None:
+            print(f"Warning: {self.paradigm.n_stimuli} stimuli don't fit in the trigger codes; "
+                  f"no stimulus onset triggers will be sent.")
+
+        # --- Marker Stream for recording software (None if disabled in settings) ---
+        self.markers = markers.create_marker_outlet()
 
-        # --- Row/Column Highlighting with Random Selection ---
-        self.available_rows = list(range(settings.ROWS))  # [0, 1, 2, 3, 4, 5]
-        self.available_cols = list(range(settings.COLS))  # [0, 1, 2, 3, 4, 5]
-        self.highlight_type = None  # 'row' or 'col'
-        self.highlighted_index = None  # Which row or column is currently highlighted
-        self.last_highlight_time = pygame.time.get_ticks()
-        self.is_inter_stim_period = False  # Track if we're in the gap between stimuli
-        
-        # Initialize first stimulus
-        self._select_next_highlight()
+        # --- Session Event Log (None if disabled in settings) ---
+        self.recorder = None
+        if settings.RECORD_SESSIONS:
+            os.makedirs(settings.SESSION_DIR, exist_ok=True)
+            self.recorder = recorder.SessionRecorder(self._session_path("session", "p3log"))
+        self._record(recorder.SESSION_START, settings.ROWS, settings.COLS,
+                     PARADIGM_NAMES.index(self.paradigm.name), int(self.prior is not None))
+        self._record(recorder.SEEDS, *recorder.split_seed(self.sequence_generator.seed),
+                     *recorder.split_seed(self.ai_seed))
+        self._record(recorder.DISPLAY, settings.REFRESH_RATE_HZ, int(self.vsync))
 
+        self.startup.mark("outputs")
+
+        # --- Frame Timing Instrumentation ---
+        self.frame_stats = FrameStats() if settings.FRAME_STATS_ENABLED else None
+        self.show_frame_stats = False  # Toggled with F3
+
+        # --- Display latency: flip -> pixels, added to stimulus event times (see photodiode.py) ---
+        self.calibrating = settings.PHOTODIODE_CALIBRATION and settings.DECODER_ENABLED
+        if settings.PHOTODIODE_CALIBRATION and not self.calibrating:
+            print("Warning: photodiode calibration records through the EEG stream; enable DECODER_ENABLED.")
+        # A calibration run measures the raw latency, so nothing is added to it
+        display_latency_ms = 0.0 if self.calibrating else photodiode.load_display_latency_ms()
+        self.display_latency_ms = display_latency_ms
+        self.display_latency_ns = round(display_latency_ms * 1e6)
+        self.display_latency_samples = round(display_latency_ms * settings.EEG_SRATE / 1000)
+        if display_latency_ms:
+            print(f"Stimulus event times include a display latency of {display_latency_ms:.2f} ms")
+
+        # --- P300 Decoder (fed by synthetic EEG until an amplifier is wired in) ---
+        self.decoder = None
+        self.eeg_store = None  # EEG + stimulus events on disk, for offline analysis
+        self.photodiode = None  # Photodiode channel of a calibration run
+        self.calibration = None
+        # Before the decoder: the synthetic participant's first target follows the prior too
+        self._update_prior()
+        if settings.DECODER_ENABLED:
+            self._create_decoder()
+        self.startup.mark("decoder")
+
+        # The ship image is large: decode it in the background while the first
+        # frames are shown, and render the plain cell looks in bulk
+        assets.preload_image(settings.SHIP_IMAGE_PATH)
+        assets.prerender_cells(settings.CELL_SIZE)
         self._create_grid()
         self._create_cursor()
+        self.sync_patch = SyncPatch() if self.calibrating else None
         self._create_buttons()
 
         # --- UI ---
-        self.font = pygame.font.SysFont(None, 36)
+        self.info_panel = InfoPanel()
+        self.startup.mark("widgets")
+
+        self._create_input()
+
+        # --- Network Match (None = play the computer) ---
+        self.network = network.create_peer(self.commands, settings.ROWS, settings.COLS)
+
+        if settings.DIRTY_RECT_RENDERING:
+            self._create_dirty_renderer()
+        self.startup.mark("renderer")
+
+        if self.triggers:
+            # The Arduino resets when its port opens; the first stimulus waits for it so no onset code is dropped
+            self.triggers.ready.wait()
+            self.startup.mark("trigger port")
+
+    def _open_display(self):
+        """
+        Opens the window, with a vsynced flip if VSYNC is on. The stimulus
+        timeline counts frames (scheduler.py), which assumes every flip
+        waits for one display refresh; REFRESH_RATE_HZ is replaced by the
+        display's own rate when pygame can report it.
+        Returns True if vsync is on.
+        """
+        size = (settings.SCREEN_WIDTH, settings.SCREEN_HEIGHT)
+        vsync = False
+        if settings.VSYNC:
+            try:
+                # pygame only syncs the flip of SCALED (or OpenGL) windows
+                self.screen = pygame.display.set_mode(size, pygame.SCALED, vsync=1)
+                vsync = True
+            except pygame.error as e:
+                print(f"Warning: no vsync ({e}); frames are paced by the clock, so stimulus durations "
+                      f"stretch whenever a frame runs long.")
+        if not vsync:
+            self.screen = pygame.display.set_mode(size)
+
+        # With vsync, frames come at the display's rate (reported by pygame-ce only; 0 if unknown)
+        rate = 0
+        if vsync and hasattr(pygame.display, 'get_current_refresh_rate'):
+            rate = pygame.display.get_current_refresh_rate()
+        if rate and rate != settings.REFRESH_RATE_HZ:
+            print(f"The display refreshes at {rate} Hz; counting stimulus frames at {rate} Hz "
+                  f"instead of {settings.REFRESH_RATE_HZ} Hz.")
+            settings.apply(REFRESH_RATE_HZ=rate)
+        return vsync
+
+    def _create_dirty_renderer(self):
+        """
+        Sets up the dirty-rect renderer.
+        Static content (background, grid labels) is drawn once onto a background
+        surface; cells, buttons, cursor and info panel live in a LayeredDirty
+        group that only redraws sprites which changed since the last frame.
+        """
+        self.background = pygame.Surface(self.screen.get_size()).convert()
+        self.background.fill(settings.COLOR_BLACK)
+        self._draw_grid_labels(self.background)
+
+        self.render_group = pygame.sprite.LayeredDirty()
+        self.render_group.add(*self.cells_by_pos.values(), layer=0)
+        self.render_group.add(*self.button_group.sprites(), layer=0)
+        self.render_group.add(self.cursor, layer=1)
+        self.render_group.add(self.info_panel, layer=2)
+        if self.sync_patch:
+            self.render_group.add(self.sync_patch, layer=3)
+        self.render_group.clear(self.screen, self.background)
+        self.dirty_rects = []
+
+        # Paint the whole screen once; after this only dirty rects are pushed
+        self.screen.blit(self.background, (0, 0))
+        pygame.display.flip()
+
+    def _create_decoder(self):
+        """Creates the online decoder and its EEG source."""
+        masks = self.paradigm.masks
+        self.decoder = P300Decoder(settings.ROWS, settings.COLS, masks=masks)
+        model = None
+        if settings.DECODER_MODEL_PATH:
+            t0 = time.perf_counter()
+            model = self.decoder.load_model(settings.DECODER_MODEL_PATH)
+            print(f"Loaded classifier {settings.DECODER_MODEL_PATH} (cross-validated AUC {model['cv_auc']:.3f}) "
+                  f"in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+        target = None
+        if settings.SYNTHETIC_TARGET_CELL:
+            cell_id = settings.SYNTHETIC_TARGET_CELL
+            target = (settings.ROW_LABELS.index(cell_id[1:]), settings.COL_LABELS.index(cell_id[0]))
+        self.eeg_source = SyntheticEEG(settings.ROWS, settings.COLS, target=target, seed=settings.SYNTHETIC_SEED,
+                                      masks=masks, prior=self.prior.weights if self.prior else None)
+
+        # EEG samples are pulled once per frame (fractional samples carried over)
+        self.eeg_samples_per_frame = settings.EEG_SRATE / settings.REFRESH_RATE_HZ
+        self.eeg_sample_debt = 0.0
+
+        # Optional dynamic stopping, plus throughput stats for either mode
+        self.stopping = None
+        if settings.DYNAMIC_STOPPING:
+            # A trained model knows its own score distributions
+            score_stats = {name: model[name] for name in ('target_mean', 'nontarget_mean', 'score_sd')} if model else {}
+            self.stopping = DynamicStopping(settings.ROWS, settings.COLS, masks=masks, **score_stats)
+        self.selection_stats = SelectionStats(settings.ROWS * settings.COLS)
+        self.selection_start_frame = 0
+        self._apply_prior()
+
+        if self.calibrating:
+            # Synthetic until a photodiode is wired into the amplifier
+            self.photodiode = photodiode.SyntheticPhotodiode(seed=settings.SYNTHETIC_SEED)
+            self.calibration = photodiode.LatencyCalibration()
+
+        if settings.RECORD_EEG:
+            os.makedirs(settings.SESSION_DIR, exist_ok=True)
+            self.eeg_store = eeg_store.create_eeg_store_writer(
+                self._session_path("eeg", "json"), self.paradigm,
+                photodiode=self.photodiode.source if self.photodiode else None,
+                display_latency_ms=self.display_latency_ms)
 
     def _create_grid(self):
         """Populates the grid with Cell objects."""
-        print("Creating 6x6 grid...")
+        print(f"Creating {settings.ROWS}x{settings.COLS} grid...")
+        # Drop cached surfaces left over from a different grid size
+        assets.evict_sizes(settings.CELL_SIZE, (settings.BUTTON_WIDTH, settings.BUTTON_HEIGHT))
+
         for r in range(settings.ROWS):
             for c in range(settings.COLS):
                 col_label = settings.COL_LABELS[c]
                 row_label = settings.ROW_LABELS[r]
                 cell_id = f"{col_label}{row_label}"
 
-                cell = Cell(row=r, col=c, cell_id=cell_id)
+                cell = Cell(row=r, col=c, cell_id=cell_id, board=self.board)
 
                 self.all_sprites.add(cell)
                 self.cells_by_pos[(r, c)] = cell
                 self.cells_by_id[cell_id] = cell
 
+        # Cells flashed by each stimulus id, straight from the paradigm's masks
+        self.stim_cells = [
+            tuple(self.cells_by_pos[pos] for pos in self.paradigm.cells(stim))
+            for stim in range(self.paradigm.n_stimuli)
+        ]
+        self.highlighted_cells = ()  # Cells currently highlighted
+
         print(f"Created {len(self.cells_by_pos)} cells.")
 
     def _create_cursor(self):
@@ -77,14 +317,20 @@ class Game:
 
     def _create_buttons(self):
         """Populates the button panel."""
-        print("Creating 36 buttons...")
+        print(f"Creating {len(self.cells_by_id)} buttons...")
         panel_start_x = (settings.SCREEN_WIDTH - (settings.BUTTON_COLS * (
                     settings.BUTTON_WIDTH + settings.BUTTON_MARGIN)) + settings.BUTTON_MARGIN) / 2
 
         panel_start_y = (settings.GRID_MARGIN + settings.INFO_PANEL_HEIGHT + (
                     settings.ROWS * settings.CELL_SIZE) + settings.BUTTON_PANEL_TOP_MARGIN)
 
-        cell_ids = sorted(self.cells_by_id.keys())
+        # Column by column (A1, A2, ... B1, ...), numbers in numeric order
+        cell_ids = [
+            f"{settings.COL_LABELS[c]}{settings.ROW_LABELS[r]}"
+            for c in range(settings.COLS) for r in range(settings.ROWS)
+        ]
+
+        self.button_list = []  # In layout order, for arithmetic hit-testing in _button_at
 
         for i, cell_id in enumerate(cell_ids):
             btn_row = i // settings.BUTTON_COLS
@@ -96,189 +342,768 @@ class Game:
             button = GridButton(cell_id, btn_x, btn_y)
             self.button_group.add(button)
             self.buttons[cell_id] = button
+            self.button_list.append(button)
+
+        # Top-left of the first button (screen pixels), the origin of the button layout
+        self.button_panel_origin = self.button_list[0].rect.topleft
 
     def run(self):
-        """Starts the main game loop."""
+        """Starts the main game loop. Returns once the game has been closed."""
+        perf_counter_ns = time.perf_counter_ns
         while self.is_running:
-            self.clock.tick(settings.FPS)
+            # With vsync the flip paces the loop; the clock is the fallback for drivers that ignore vsync
+            self.clock.tick(settings.REFRESH_RATE_HZ)
+            t0 = perf_counter_ns()
             self._handle_events()
+            t1 = perf_counter_ns()
             self._update()
+            t2 = perf_counter_ns()
             self._draw()
+            t3 = perf_counter_ns()
+            self._present()
+            t4 = perf_counter_ns()
+
+            if self.frame_stats:
+                self.frame_stats.record(t4, t1 - t0, t2 - t1, t3 - t2, t4 - t3, self._stimulus_on_screen())
+            self._on_frame_flipped(t4)
 
+            if self.scheduler.frame == 1:
+                self.startup.mark("first frame")
+                self.startup.print_report()
+
+        self._shutdown()
+
+    def _shutdown(self):
+        """Prints the session reports, saves the sequence and releases resources."""
+        self.scheduler.print_report()
+        if self.decoder:
+            self.selection_stats.print_summary()
+        if self.prior:
+            self.prior.print_report(len(self.selection_stats.durations_s) if self.decoder else 0)
+        self._save_sequence()
+        if self.frame_stats:
+            self.frame_stats.print_summary()
+            self._save_frame_stats()
+        if self.calibration:
+            self.calibration.finish(self._session_path("latency", "npz"),
+                                    self.triggers.sent if self.triggers else None, self.paradigm.trigger_codes,
+                                    source=self.photodiode.source)
+        if self.eeg_store:
+            self.eeg_store.close()
+            print(f"Saved {self.eeg_store.n_samples} EEG samples and {self.eeg_store.n_events} events "
+                  f"to {self.eeg_store.path}")
+        if self.network:
+            self.network.print_summary()
+            self.network.close()
+        if self.triggers:
+            self.triggers.close()
+        if self.markers:
+            self.markers.close()
+            print(f"Published {self.markers.count} markers to {self.markers.address} "
+                  f"({self.markers.packets} packets, {self.markers.dropped} dropped)")
+        if self.recorder:
+            self.recorder.close()
+            print(f"Saved {self.recorder.count} events to {self.recorder.path}")
+        assets.clear()
         pygame.quit()
-        sys.exit()
+
+    def _stimulus_on_screen(self):
+        """Stimulus id shown on the current frame, or -1 during the inter-stimulus gap."""
+        if self.scheduler.is_stimulus_on():
+            return self.sequence[self.stim_index]
+        return -1
+
+    def _on_frame_flipped(self, flip_time_ns):
+        """
+        Called right after each flip: sends the onset trigger, logs it and advances the scheduler.
+        Stimulus events are timed when the pixels change: the flip plus the display latency.
+        """
+        if self.recorder or self.markers:
+            if self.scheduler.is_onset_frame():
+                self._record(recorder.STIM_ONSET, self.sequence[self.stim_index],
+                             t_ns=flip_time_ns + self.display_latency_ns)
+            elif self.scheduler.is_offset_frame():
+                self._record(recorder.STIM_OFFSET, self.sequence[self.stim_index],
+                             t_ns=flip_time_ns + self.display_latency_ns)
+
+        if self.photodiode and (self.scheduler.is_onset_frame() or self.scheduler.is_offset_frame()):
+            # The sync patch changed in this flip
+            self.photodiode.on_flip(self.scheduler.is_onset_frame(), self.eeg_source.sample_count)
+
+        if self.scheduler.is_onset_frame():
+            self.shown_stimuli.append(self.sequence[self.stim_index])
+            if self.decoder:
+                # The flip happened at the current sample count
+                stim = self.sequence[self.stim_index]
+                flip_sample = self.eeg_source.sample_count
+                self.eeg_source.on_stimulus(stim, flip_sample)
+                onset_sample = flip_sample + self.display_latency_samples
+                self.decoder.mark_onset(stim, onset_sample)
+                if self.eeg_store:
+                    self.eeg_store.add_event(onset_sample, recorder.STIM_ONSET, stim, self._target_cell_index())
+                if self.calibration:
+                    self.calibration.add_flip(flip_time_ns, flip_sample)
+
+            if self.paradigm.trigger_codes:
+                self._send_trigger(self.paradigm.trigger_codes[self.sequence[self.stim_index]])
+
+        self.scheduler.frame_flipped(flip_time_ns)
+
+    def _record(self, event_type, a=0, b=0, c=0, d=0, t_ns=None):
+        """
+        Logs a session event for the current frame and publishes it on the
+        marker stream, for whichever of the two is enabled (never blocks).
+        """
+        if t_ns is None:
+            t_ns = time.perf_counter_ns()
+        if self.recorder:
+            self.recorder.record(event_type, self.scheduler.frame, a, b, c, d, t_ns)
+        if self.markers:
+            self.markers.push(event_type, self.scheduler.frame, a, b, c, d, t_ns)
+
+    def _send_trigger(self, code):
+        """Queues a trigger code if the trigger box is enabled (never blocks)."""
+        if self.triggers:
+            self.triggers.send(code)
+
+    def _target_cell_index(self):
+        """Flattened index of the cell the (synthetic) participant attends to."""
+        row, col = self.eeg_source.target
+        return row * settings.COLS + col
+
+    def _create_input(self):
+        """
+        Sets up the input pipeline (see commands.py): one handler per command,
+        the key and mouse bindings, and the queue background threads post to.
+        Every event type nothing is bound to is blocked.
+        """
+        self.command_handlers = {
+            'quit': self._quit,
+            'move': self._move_cursor,
+            'move_to': self._move_cursor_to,
+            'select': self._select_cell,
+            'click': self._click_cell_button,
+            'start_battle': self._start_battle_from_placement,
+            'ship_length': self._set_ship_length,
+            'rotate': self._rotate_ship,
+            'frame_stats': self._toggle_frame_stats,
+            # Sent by the other station in a network match
+            'remote_placed': self._on_remote_placed,
+            'remote_ready': self._on_remote_ready,
+            'remote_shot': self._on_remote_shot,
+            'remote_result': self._on_remote_result,
+            'remote_left': self._on_remote_left,
+        }
+        self.commands = CommandQueue()
+
+        self.input = InputDispatcher(self._execute)
+        self.input.bind_event(pygame.QUIT, lambda event: ('quit', ()))
+        self.input.bind_event(pygame.MOUSEBUTTONDOWN, self._mouse_command)
+
+        bind = self.input.bind_key
+        bind(pygame.K_ESCAPE, 'quit')
+        bind(pygame.K_F3, 'frame_stats')
+        bind(pygame.K_UP, 'move', -1, 0)
+        bind(pygame.K_DOWN, 'move', 1, 0)
+        bind(pygame.K_LEFT, 'move', 0, -1)
+        bind(pygame.K_RIGHT, 'move', 0, 1)
+        bind(pygame.K_SPACE, 'select')
+        bind(pygame.K_RETURN, 'select')
+        bind(pygame.K_b, 'start_battle')
+        # Ship length (1-5) and orientation (R) for the next placement
+        for length in range(1, 6):
+            bind(pygame.K_0 + length, 'ship_length', length)
+        bind(pygame.K_r, 'rotate')
+
+        self.input.install()
 
     def _handle_events(self):
-        """Processes all user input and events."""
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                self.is_running = False
-
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 1:
-                    self._handle_button_click(event.pos)
-
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    self.is_running = False
-
-                if event.key == pygame.K_UP:
-                    self.cursor.move(dr=-1, dc=0)
-                elif event.key == pygame.K_DOWN:
-                    self.cursor.move(dr=1, dc=0)
-                elif event.key == pygame.K_LEFT:
-                    self.cursor.move(dr=0, dc=-1)
-                elif event.key == pygame.K_RIGHT:
-                    self.cursor.move(dr=0, dc=1)
-
-                if event.key == pygame.K_SPACE or event.key == pygame.K_RETURN:
-                    self._place_ship()
-
-    def _handle_button_click(self, mouse_pos):
-        """Check if a button was clicked and disable the corresponding cell."""
-        for button in self.button_group:
-            if button.rect.collidepoint(mouse_pos):
-                cell_id_to_disable = button.handle_click()
-                # Handle Cell Callback
-
-                # if cell_id_to_disable:
-                #     cell = self.cells_by_id.get(cell_id_to_disable)
-                #     if cell:
-                #         cell.disable()
-                #         print(f"Button {cell_id_to_disable} clicked. Cell disabled.")
-                #     break
+        """Dispatches this frame's input events, then a batch of commands queued by other threads."""
+        self.input.dispatch(pygame.event.get())
+        for command in self.commands.drain():
+            self._execute(command.name, *command.args)
+
+    def _execute(self, name, *args):
+        """Runs one command, whichever input source it came from."""
+        handler = self.command_handlers.get(name)
+        if handler is None:
+            print(f"Warning: ignoring unknown command {name!r}")
+            return
+        handler(*args)
+
+    def _mouse_command(self, event):
+        """Left click on a button -> 'click' command for the button's cell."""
+        if event.button != 1:
+            return None
+        button = self._button_at(event.pos)
+        if button is None:
+            return None
+        cell = self.cells_by_id[button.cell_id]
+        return 'click', (cell.row, cell.col)
+
+    def _quit(self):
+        self.is_running = False
+
+    def _toggle_frame_stats(self):
+        self.show_frame_stats = not self.show_frame_stats
+
+    def _set_ship_length(self, length):
+        self.ship_length = length
+        self._ship_choice_changed()
+
+    def _rotate_ship(self):
+        self.ship_orientation = 'vertical' if self.ship_orientation == 'horizontal' else 'horizontal'
+        self._ship_choice_changed()
+
+    def _ship_choice_changed(self):
+        """The cells the next ship fits on changed (logged, so replays see the same prior)."""
+        self._record(recorder.SHIP_CHOICE, self.ship_length, int(self.ship_orientation == 'vertical'))
+        self._update_prior()
+
+    def _start_battle_from_placement(self):
+        if self.phase == 'placement':
+            self._start_battle()
+
+    def _click_cell_button(self, row, col):
+        """Clicks the button of a cell."""
+        self._click_button(self.buttons[self.cells_by_pos[(row, col)].cell_id])
+
+    def _click_button(self, button):
+        """Clicks a button (from the mouse or a replayed log)."""
+        cell_id_to_disable = button.handle_click()
+        if cell_id_to_disable:
+            self._send_trigger(settings.TRIGGER_BUTTON_CLICK)
+            cell = self.cells_by_id[cell_id_to_disable]
+            self._record(recorder.BUTTON_CLICK, cell.row, cell.col)
+            # Handle Cell Callback
+
+            # if cell_id_to_disable:
+            #     cell = self.cells_by_id.get(cell_id_to_disable)
+            #     if cell:
+            #         cell.disable()
+            #         print(f"Button {cell_id_to_disable} clicked. Cell disabled.")
+
+    def _button_at(self, pos):
+        """
+        Returns the button under a screen position, or None.
+        Buttons sit on a regular grid, so this is arithmetic instead of a scan.
+        """
+        x = pos[0] - self.button_panel_origin[0]
+        y = pos[1] - self.button_panel_origin[1]
+        if x < 0 or y < 0:
+            return None
+
+        pitch_x = settings.BUTTON_WIDTH + settings.BUTTON_MARGIN
+        pitch_y = settings.BUTTON_HEIGHT + settings.BUTTON_MARGIN
+        btn_col, offset_x = divmod(x, pitch_x)
+        btn_row, offset_y = divmod(y, pitch_y)
+        if btn_col >= settings.BUTTON_COLS or offset_x >= settings.BUTTON_WIDTH or offset_y >= settings.BUTTON_HEIGHT:
+            return None  # In the margin between buttons
+
+        index = int(btn_row) * settings.BUTTON_COLS + int(btn_col)
+        if index < len(self.button_list):
+            return self.button_list[index]
+        return None
+
+    def _move_cursor(self, dr, dc):
+        """Moves the cursor by a delta and logs the new position."""
+        self.cursor.move(dr, dc)
+        self._record(recorder.CURSOR_MOVE, *self.cursor.get_selected_pos())
+
+    def _move_cursor_to(self, row, col):
+        """Moves the cursor straight to a cell and logs it."""
+        self.cursor.move_to(row, col)
+        self._record(recorder.CURSOR_MOVE, *self.cursor.get_selected_pos())
+
+    def _apply_logged_event(self, event_type, a, b, c, d):
+        """Re-applies one participant action from a session log (see recorder.replay)."""
+        if event_type == recorder.CURSOR_MOVE:
+            self._move_cursor_to(a, b)
+        elif event_type == recorder.SHIP_PLACED:
+            self.cursor.move_to(a, b)
+            self.ship_length = c
+            self.ship_orientation = 'vertical' if d else 'horizontal'
+            self._place_ship()
+        elif event_type == recorder.BUTTON_CLICK:
+            self._click_cell_button(a, b)
+        elif event_type == recorder.BATTLE_START:
+            self._start_battle()
+        elif event_type == recorder.SHOT_FIRED:
+            self.cursor.move_to(a, b)
+            self._fire(opponent_turn=False)  # The opponent's answer is its own logged event
+        elif event_type == recorder.OPPONENT_SHOT:
+            self._opponent_turn(move=(a, b))
+        elif event_type == recorder.SHIP_CHOICE:
+            self.ship_length = a
+            self.ship_orientation = 'vertical' if b else 'horizontal'
+            self._update_prior()
+
+    def _select_cell(self):
+        """Acts on the cell under the cursor: places a ship, or fires in the battle phase."""
+        if self.phase == 'placement':
+            self._place_ship()
+        elif self.phase == 'battle':
+            self._fire()
 
     # --- MODIFIED METHOD ---
     def _place_ship(self):
-        """Attempts to place a ship at the cursor's current position."""
+        """Attempts to place a ship (of the current length/orientation) at the cursor's position."""
         selected_pos = self.cursor.get_selected_pos()
         target_cell = self.cells_by_pos[selected_pos]
+        new_ship = Ship(row=selected_pos[0], col=selected_pos[1],
+                        length=self.ship_length, orientation=self.ship_orientation)
 
-        if target_cell.state == 'disabled':
-            print(f"Cannot place ship: Cell {target_cell.cell_id} is disabled.")
-        elif target_cell.place_ship():
+        if self.board.place(new_ship):
             # Ship was placed successfully
-            new_ship = Ship(row=selected_pos[0], col=selected_pos[1])
-            self.placed_ships.append(new_ship)
+            for pos in new_ship.coordinates:
+                self.cells_by_pos[pos].refresh()
+            self._send_trigger(settings.TRIGGER_SHIP_PLACED)
+            self._record(recorder.SHIP_PLACED, new_ship.row, new_ship.col, new_ship.length,
+                         int(new_ship.orientation == 'vertical'))
             print(f"Placed ship at {target_cell.cell_id}. Total ships: {len(self.placed_ships)}")
+            if self.network:
+                self.network.send_placed(new_ship.length)
+            self._update_prior()
 
             # --- REMOVED ---  # The following 3 lines were removed to stop  # ship placement from disabling the button.  #  # button = self.buttons.get(target_cell.cell_id)  # if button:  #     button.handle_click()
 
-        else:
+        elif target_cell.state == 'disabled':
+            print(f"Cannot place ship: Cell {target_cell.cell_id} is disabled.")
+        elif target_cell.state == 'ship':
             # Cell was already occupied
             print(f"Cannot place ship: Cell {target_cell.cell_id} is already occupied.")
+        else:
+            print(f"Cannot place ship: a length {self.ship_length} {self.ship_orientation} ship "
+                  f"doesn't fit at {target_cell.cell_id}.")
+
+    def _start_battle(self):
+        """
+        Ends the placement phase. The computer places the same fleet at random
+        and the grid switches to showing the opponent's waters.
+        """
+        if not self.placed_ships:
+            print("Place at least one ship before starting the battle.")
+            return
+
+        fleet = [ship.length for ship in self.placed_ships]
+        if self.network:
+            self.network.send_ready(fleet)
+            self.phase = 'waiting'
+            self.battle_message = "Waiting for the other player to finish placing ships..."
+            self._begin_network_battle()
+            return
+
+        self.enemy_board = Board(settings.ROWS, settings.COLS)
+        if not self.enemy_board.place_fleet_randomly(fleet, np.random.default_rng(self.ai_seed)):
+            print("Cannot start battle: the opponent's fleet doesn't fit on the board.")
+            return
+        self.opponent = ProbabilityOpponent(settings.ROWS, settings.COLS, fleet, seed=self.ai_seed)
+        if self.prior:
+            # The same heatmap the computer uses, kept over the player's shots
+            self.target_heatmap = ProbabilityOpponent(settings.ROWS, settings.COLS, fleet)
+        self._record(recorder.BATTLE_START)
+
+        for cell in self.cells_by_pos.values():
+            cell.show_board(self.enemy_board, hide_ships=True)
+
+        self.phase = 'battle'
+        self.battle_message = "Battle! Fire with Arrows/Space"
+        pygame.display.set_caption(settings.BATTLE_TITLE)
+        print(f"Battle started with fleet {fleet}.")
+        self._update_prior()
+
+    def _fire(self, opponent_turn=True):
+        """
+        Fires at the opponent's cell under the cursor, then lets the opponent
+        shoot back (unless opponent_turn is False, when replaying a log).
+        """
+        selected_pos = self.cursor.get_selected_pos()
+        target_cell = self.cells_by_pos[selected_pos]
+
+        if self.network:
+            self._fire_remote(selected_pos)
+            return
+
+        result = self.enemy_board.fire(*selected_pos)
+        if result is None:
+            print(f"Cannot fire: Cell {target_cell.cell_id} was already shot.")
+            return
+
+        target_cell.refresh()
+        self._send_trigger(settings.TRIGGER_SHOT_FIRED)
+        self._record(recorder.SHOT_FIRED, *selected_pos, recorder.SHOT_RESULTS[result])
+        print(f"Fired at {target_cell.cell_id}: {result}")
+        if self.target_heatmap:
+            sunk_ship = self.enemy_board.ship_at(*selected_pos) if result == 'sunk' else None
+            self.target_heatmap.record_result(*selected_pos, result, sunk_ship)
+
+        if self.enemy_board.all_sunk():
+            self.phase = 'over'
+            self.battle_message = "You sank the whole fleet - you win!"
+            self._update_prior()
+            return
+
+        self.battle_message = f"You: {result}"
+        if opponent_turn:
+            self._opponent_turn()
+
+    def _opponent_turn(self, move=None):
+        """
+        The computer fires back: at `move` when replaying a log (its choice
+        depends on a wall-clock time budget), else wherever it chooses.
+        """
+        ai_move = self.opponent.choose_move() if move is None else move
+        ai_result = self.board.fire(*ai_move)
+        sunk_ship = self.board.ship_at(*ai_move) if ai_result == 'sunk' else None
+        self.opponent.record_result(*ai_move, ai_result, sunk_ship)
+        self._record(recorder.OPPONENT_SHOT, *ai_move, recorder.SHOT_RESULTS[ai_result])
+        ai_cell_id = self.cells_by_pos[ai_move].cell_id
+        if move is None:
+            print(f"Opponent fired at {ai_cell_id}: {ai_result} ({self.opponent.last_move_ms:.2f} ms)")
+        else:
+            print(f"Opponent fired at {ai_cell_id}: {ai_result} (from the log)")
+
+        if self.board.all_sunk():
+            self.phase = 'over'
+            self.battle_message = "The opponent sank your fleet - you lose!"
+        else:
+            self.battle_message = f"{self.battle_message} | Opponent at {ai_cell_id}: {ai_result}"
+        self._update_prior()
+
+    # --- Network match ---
+
+    def _begin_network_battle(self):
+        """Starts the battle once both players are ready. The host shoots first."""
+        if self.phase != 'waiting' or self.remote_fleet is None:
+            return
+        # Only the results of our shots will ever be known about this board
+        self.enemy_board = Board(settings.ROWS, settings.COLS)
+        self._record(recorder.BATTLE_START)
+        for cell in self.cells_by_pos.values():
+            cell.show_board(self.enemy_board, hide_ships=True)
+
+        if self.prior:
+            self.target_heatmap = ProbabilityOpponent(settings.ROWS, settings.COLS, self.remote_fleet)
+        self.phase = 'battle'
+        self.my_turn = self.network.role == 'host'
+        self.battle_message = "Battle! Your turn" if self.my_turn else "Battle! The other player shoots first"
+        pygame.display.set_caption(settings.BATTLE_TITLE)
+        print(f"Network battle started: our fleet {[s.length for s in self.placed_ships]}, "
+              f"theirs {list(self.remote_fleet)}.")
+        self._update_prior()
+
+    def _fire_remote(self, pos):
+        """Sends a shot to the other player; the result comes back as a remote_result command."""
+        cell_id = self.cells_by_pos[pos].cell_id
+        if not self.my_turn:
+            self.battle_message = "Not your turn - wait for the other player"
+            return
+        if self.enemy_board.state(*pos) != 'empty':
+            print(f"Cannot fire: Cell {cell_id} was already shot.")
+            return
+        self.my_turn = False
+        self.network.send_shot(*pos)
+        self._send_trigger(settings.TRIGGER_SHOT_FIRED)
+        self.battle_message = f"Fired at {cell_id}..."
+
+    def _on_remote_placed(self, length):
+        if not 1 <= length <= max(settings.ROWS, settings.COLS) or self.remote_fleet is not None:
+            self._drop_remote(f"The other player announced an impossible ship (length {length})")
+            return
+        self.remote_placed.append(length)
+        print(f"The other player placed a ship of length {length}.")
+
+    def _on_remote_ready(self, fleet):
+        """The other player finished placing; the fleet must be the ships it announced."""
+        if (self.remote_fleet is not None or not fleet or list(fleet) != self.remote_placed
+                or sum(fleet) > settings.ROWS * settings.COLS):
+            self._drop_remote(f"The other player is ready with a fleet it didn't place ({list(fleet)})")
+            return
+        self.remote_fleet = fleet
+        print(f"The other player is ready with fleet {list(fleet)}.")
+        self._begin_network_battle()
+
+    def _on_remote_shot(self, row, col):
+        """The other player fired at our board: resolve it and send back the result."""
+        if (row, col) not in self.cells_by_pos:
+            self._drop_remote(f"The other player fired outside the board ({row}, {col})")
+            return
+        if self.phase != 'battle' or self.my_turn:
+            # The other station would wait forever for a result that never comes
+            self._drop_remote(f"The other player fired out of turn at {self.cells_by_pos[(row, col)].cell_id}")
+            return
+        result = self.board.fire(row, col) or 'miss'  # A repeated shot can't hit anything new
+        game_over = self.board.all_sunk()
+        self.network.send_result(row, col, result, game_over)
+        self._record(recorder.OPPONENT_SHOT, row, col, recorder.SHOT_RESULTS[result])
+        cell_id = self.cells_by_pos[(row, col)].cell_id
+        print(f"The other player fired at {cell_id}: {result}")
+
+        self.my_turn = True
+        if game_over:
+            self.phase = 'over'
+            self.battle_message = "The other player sank your fleet - you lose!"
+        else:
+            self.battle_message = f"They fired at {cell_id}: {result} | Your turn"
+
+    def _on_remote_result(self, row, col, result, game_over):
+        """The other player resolved our shot."""
+        if (row, col) not in self.cells_by_pos or self.phase != 'battle' or self.my_turn:
+            self._drop_remote(f"The other player sent an unexpected result for ({row}, {col})")
+            return
+        cell = self.cells_by_pos[(row, col)]
+        self.enemy_board.record_shot(row, col, result)
+        cell.refresh()
+        self._record(recorder.SHOT_FIRED, row, col, recorder.SHOT_RESULTS[result])
+        print(f"Fired at {cell.cell_id}: {result}")
+        if self.target_heatmap:
+            # The sunk ship's cells aren't sent, so it still counts as a hit here
+            self.target_heatmap.record_result(row, col, 'miss' if result == 'miss' else 'hit')
+
+        if game_over:
+            self.phase = 'over'
+            self.battle_message = "You sank the whole fleet - you win!"
+        else:
+            self.battle_message = f"You: {result} at {cell.cell_id} | Their turn"
+        self._update_prior()
+
+    def _drop_remote(self, reason):
+        """Ends the match after a message the other station should never have sent."""
+        self.network.close()
+        self._on_remote_left(reason)
+
+    def _on_remote_left(self, reason="The other player left the match"):
+        print(f"The other player disconnected: {reason}")
+        if self.phase != 'over':
+            self.phase = 'over'
+            self.battle_message = reason
+            self._update_prior()
 
     def _update(self):
         """Updates all game objects in the all_sprites group."""
+        # Decoded selections act before this frame's stimulus is picked, like key presses
+        if self.decoder:
+            self._update_decoder()
         self._update_row_col_highlighting()
         self.all_sprites.update()
         self.cursor_group.update()
         self.button_group.update()
     
+    def _update_decoder(self):
+        """
+        Pulls this frame's EEG samples, scores finished epochs and acts on a
+        decision: the cursor jumps to the decoded cell and a ship is placed.
+        """
+        self.eeg_sample_debt += self.eeg_samples_per_frame
+        n_samples = int(self.eeg_sample_debt)
+        self.eeg_sample_debt -= n_samples
+        if n_samples:
+            samples = self.eeg_source.read(n_samples)
+            self.decoder.push_samples(samples)
+            if self.photodiode:
+                light = self.photodiode.read(n_samples)
+                self.calibration.add_samples(light)
+                samples = np.column_stack((samples, light))  # Recorded as the last channel
+            if self.eeg_store:
+                self.eeg_store.append(samples)
+
+        scored = self.decoder.process()
+
+        if self.stopping:
+            for stim, score in scored:
+                self.stopping.update(stim, score)
+            flashes = self.stopping.flashes
+            decision = self.stopping.decide()
+            if not decision:
+                return
+            selection, confidence = decision
+            self.decoder.reset()
+        else:
+            flashes = int(self.decoder.stim_counts.sum())
+            selection = self.decoder.decide()
+            if not selection:
+                return
+            confidence = 1.0
+
+        # Selection time is counted in display frames, the stimulus clock
+        duration_s = (self.scheduler.frame - self.selection_start_frame) / settings.REFRESH_RATE_HZ
+        self.selection_start_frame = self.scheduler.frame
+        self.selection_stats.add(duration_s, flashes, confidence,
+                                 correct=selection == self.eeg_source.target)
+        self._record(recorder.SELECTION, *selection, flashes, round(confidence * 1000))
+        if self.eeg_store:
+            self.eeg_store.add_event(self.eeg_source.sample_count, recorder.SELECTION,
+                                     cell=selection[0] * settings.COLS + selection[1])
+
+        self._execute('move_to', *selection)
+        self._execute('select')
+        self.eeg_source.next_selection(self.prior.weights if self.prior else None)
+
     def _update_row_col_highlighting(self):
         """
-        Cycles through rows and columns with random selection and no replacement.
-        - Randomly chooses row or column (50/50)
-        - Selects without replacement from available pool
-        - Refreshes pool when empty
+        Cycles through the paradigm's stimuli following the precomputed sequence.
+        - Every block shows each stimulus once (see sequence.py)
         - Includes inter-stimulus interval where nothing is highlighted
+        On/off is decided by the scheduler's frame counter, not by wall-clock time.
         """
-        current_time = pygame.time.get_ticks()
-        
-        if self.is_inter_stim_period:
-            # We're in the gap between stimuli - check if it's time to show next stimulus
-            if current_time - self.last_highlight_time >= settings.INTER_STIM_TIME_MS:
-                self.last_highlight_time = current_time
-                self.is_inter_stim_period = False
-                self._select_next_highlight()
-            
-            # Turn off all highlights during inter-stimulus period
-            for cell in self.cells_by_pos.values():
-                cell.set_highlighted(False)
+        if self.scheduler.is_onset_frame():
+            self._select_next_highlight()
+
+        if self.scheduler.is_stimulus_on():
+            cells = self.stim_cells[self.sequence[self.stim_index]]
         else:
-            # We're showing a stimulus - check if it's time to go to inter-stimulus period
-            if current_time - self.last_highlight_time >= settings.STIM_TIME_MS:
-                self.last_highlight_time = current_time
-                self.is_inter_stim_period = True
-            
-            # Update all cells to reflect the current highlighting
-            for (r, c), cell in self.cells_by_pos.items():
-                if self.highlight_type == 'row' and r == self.highlighted_index:
-                    cell.set_highlighted(True)
-                elif self.highlight_type == 'col' and c == self.highlighted_index:
-                    cell.set_highlighted(True)
-                else:
-                    cell.set_highlighted(False)
-    
+            cells = ()  # Nothing highlighted during the inter-stimulus period
+
+        # Only touch the cells entering or leaving the highlight
+        if cells is not self.highlighted_cells:
+            for cell in self.highlighted_cells:
+                cell.set_highlighted(False)
+            for cell in cells:
+                cell.set_highlighted(True)
+            self.highlighted_cells = cells
+
+        if self.sync_patch:
+            self.sync_patch.set_on(self.scheduler.is_stimulus_on())
+
     def _select_next_highlight(self):
         """
-        Randomly selects the next row or column to highlight.
-        Uses random selection without replacement.
+        Moves to the next stimulus in the precomputed sequence, skipping
+        stimuli that flash no possible selection (see prior.py).
+        One more block is generated (from the same seed) whenever fewer than
+        SEQUENCE_BLOCKS blocks are left, which keeps the cost per frame small.
         """
-        # Randomly choose between row and column (50/50 probability)
-        self.highlight_type = random.choice(['row', 'col'])
-        
-        # Select from the appropriate pool
-        if self.highlight_type == 'row':
-            # If no rows available, refresh the pool
-            if not self.available_rows:
-                self.available_rows = list(range(settings.ROWS))
-                print("Row pool refreshed")
-            
-            # Randomly select and remove a row from available pool
-            self.highlighted_index = random.choice(self.available_rows)
-            self.available_rows.remove(self.highlighted_index)
-            print(f"Selected ROW {self.highlighted_index + 1} (remaining rows: {len(self.available_rows)})")
-            
-        else:  # 'col'
-            # If no columns available, refresh the pool
-            if not self.available_cols:
-                self.available_cols = list(range(settings.COLS))
-                print("Column pool refreshed")
-            
-            # Randomly select and remove a column from available pool
-            self.highlighted_index = random.choice(self.available_cols)
-            self.available_cols.remove(self.highlighted_index)
-            col_label = settings.COL_LABELS[self.highlighted_index]
-            print(f"Selected COLUMN {col_label} (remaining cols: {len(self.available_cols)})")
+        skipped = -1
+        while True:
+            self.stim_index += 1
+            skipped += 1
+            if len(self.sequence) - self.stim_index < settings.SEQUENCE_BLOCKS * self.paradigm.n_stimuli:
+                self.sequence.extend(self.sequence_generator.generate(1).tolist())
+            if not self.prior or self.prior.active[self.sequence[self.stim_index]]:
+                break
+        if self.prior:
+            self._keep_sequence_constraints()
+            self.prior.count_flash(skipped)
+        self.recent_stimuli.append(self.sequence[self.stim_index])
 
-    def _draw_info_panel(self):
-        """Draws the top info panel."""
-        panel_rect = pygame.Rect(0, 0, settings.SCREEN_WIDTH, settings.INFO_PANEL_HEIGHT)
-        pygame.draw.rect(self.screen, settings.COLOR_GRID_BG, panel_rect)
+    def _keep_sequence_constraints(self):
+        """
+        Skipped stimuli can bring two flashes of a stimulus closer together
+        than the sequence constraints allow. If the next stimulus breaks them
+        after what was actually shown, it swaps places with the first active
+        stimulus within the next block that doesn't, so every stimulus is
+        still shown as often. If none does, it is shown anyway.
+        """
+        allows = self.sequence_generator.allows_next
+        sequence = self.sequence
+        current = self.stim_index
+        if allows(self.recent_stimuli, sequence[current]):
+            return
+        for i in range(current + 1, min(len(sequence), current + 1 + self.paradigm.n_stimuli)):
+            if self.prior.active[sequence[i]] and allows(self.recent_stimuli, sequence[i]):
+                sequence[current], sequence[i] = sequence[i], sequence[current]
+                return
+
+    def _update_prior(self):
+        """
+        Recomputes the selection prior after the board or the next ship
+        changed (never per frame), and hands it to the decoder.
+        """
+        if not self.prior:
+            return
+        rows, cols = settings.ROWS, settings.COLS
+        weights = np.zeros((rows, cols))
+        if self.phase == 'placement':
+            # Cells where the next ship can start
+            horizontal, vertical = self.board.legal_placements(self.ship_length)
+            fits = horizontal if self.ship_orientation == 'horizontal' else vertical
+            weights[:fits.shape[0], :fits.shape[1]] = fits
+        elif self.phase == 'battle':
+            # Unshot cells, weighted by how many placements of the remaining fleet cover them
+            open_cells = self.enemy_board.shots == NOT_SHOT
+            self.target_heatmap.refresh()
+            weights = np.where(open_cells, self.target_heatmap.heatmap, 0.0)
+            if not weights.any():
+                weights = open_cells.astype(np.float64)
+        # Otherwise nothing can be selected, and set_weights falls back to every cell
+        self.prior.set_weights(weights)
+        self._apply_prior()
+
+    def _apply_prior(self):
+        """Hands the current selection prior to the decoder and dynamic stopping."""
+        if self.prior and self.decoder:
+            self.decoder.set_prior(self.prior.valid, self.prior.active)
+            if self.stopping:
+                self.stopping.set_prior(self.prior.log_prior())
+
+    def _session_path(self, prefix, extension):
+        """Path of a file written for this session, e.g. sessions/sequence_20250101_120000.npz."""
+        return os.path.join(settings.SESSION_DIR, f"{prefix}_{self.session_name}.{extension}")
 
-        ship_count = len(self.placed_ships)
-        text = f"Ships Placed: {ship_count} | Use Arrows/Space or Click Buttons"
-        text_surface = self.font.render(text, True, settings.COLOR_WHITE)
+    def _save_sequence(self):
+        """Exports the stimuli actually shown (and the sequence seed) alongside the session."""
+        os.makedirs(settings.SESSION_DIR, exist_ok=True)
+        path = self._session_path("sequence", "npz")
+        self.sequence_generator.save(path, shown=self.shown_stimuli)
+        print(f"Saved stimulus sequence to {path}")
 
-        text_rect = text_surface.get_rect(center=(settings.SCREEN_WIDTH / 2, settings.INFO_PANEL_HEIGHT / 2))
-        self.screen.blit(text_surface, text_rect)
+    def _save_frame_stats(self):
+        """Dumps the per-frame timings alongside the session."""
+        os.makedirs(settings.SESSION_DIR, exist_ok=True)
+        path = self._session_path("frames", settings.FRAME_STATS_FORMAT)
+        self.frame_stats.save(path)
+        print(f"Saved frame timings to {path}")
 
-    def _draw_grid_labels(self):
-        """Draws the A-F and 1-6 labels on the grid margins."""
+    def _draw_info_panel(self):
+        """Updates the top info panel and draws it to the screen."""
+        if self.show_frame_stats and self.frame_stats:
+            text = self.frame_stats.live_text()
+        elif self.phase != 'placement':
+            text = self.battle_message
+            if self.network and self.network.rtt_ms() is not None:
+                text = f"{text} | RTT {self.network.rtt_ms():.1f} ms"
+        else:
+            ship_count = len(self.placed_ships)
+            if self.ship_length == 1:
+                text = f"Ships Placed: {ship_count} | Use Arrows/Space or Click Buttons"
+            else:
+                orientation = 'H' if self.ship_orientation == 'horizontal' else 'V'
+                text = f"Ships Placed: {ship_count} | Next Ship: {self.ship_length}{orientation} (1-5, R)"
+            if self.network:
+                text = f"{text} | Opponent: {len(self.remote_placed)}"
+        self.info_panel.set_text(text)
 
-        # 1. Draw Column Labels (A-F)
+        if not settings.DIRTY_RECT_RENDERING:
+            self.screen.blit(self.info_panel.image, self.info_panel.rect)
+
+    def _draw_grid_labels(self, surface):
+        """Draws the column letter and row number labels on the grid margins."""
+
+        # 1. Draw Column Labels (A, B, C, ...)
         for i, label in enumerate(settings.COL_LABELS):
-            text_surf = self.font.render(label, True, settings.COLOR_WHITE)
+            text_surf = assets.render_text(label, settings.UI_FONT_SIZE, settings.COLOR_WHITE)
             x_pos = settings.GRID_MARGIN + (i * settings.CELL_SIZE) + (settings.CELL_SIZE / 2)
             y_pos = settings.INFO_PANEL_HEIGHT + (settings.GRID_MARGIN / 2)
             text_rect = text_surf.get_rect(center=(x_pos, y_pos))
-            self.screen.blit(text_surf, text_rect)
+            surface.blit(text_surf, text_rect)
 
-        # 2. Draw Row Labels (1-6)
+        # 2. Draw Row Labels (1, 2, 3, ...)
         for i, label in enumerate(settings.ROW_LABELS):
-            text_surf = self.font.render(label, True, settings.COLOR_WHITE)
+            text_surf = assets.render_text(label, settings.UI_FONT_SIZE, settings.COLOR_WHITE)
             x_pos = settings.GRID_MARGIN / 2
             y_pos = (settings.INFO_PANEL_HEIGHT + settings.GRID_MARGIN + (i * settings.CELL_SIZE) + (
                         settings.CELL_SIZE / 2))
             text_rect = text_surf.get_rect(center=(x_pos, y_pos))
-            self.screen.blit(text_surf, text_rect)
+            surface.blit(text_surf, text_rect)
 
     def _draw(self):
         """Draws everything to the screen."""
+        if settings.DIRTY_RECT_RENDERING:
+            self._draw_dirty()
+            return
+
         self.screen.fill(settings.COLOR_BLACK)
 
-        self._draw_grid_labels()
+        self._draw_grid_labels(self.screen)
 
         # Draw all cells (flashing, ships, disabled)
         self.all_sprites.draw(self.screen)
@@ -292,4 +1117,19 @@ class Game:
         # Draw the UI
         self._draw_info_panel()
 
-        pygame.display.flip()
+        # The photodiode patch goes on top, in the corner of the info panel
+        if self.sync_patch:
+            self.screen.blit(self.sync_patch.image, self.sync_patch.rect)
+
+    def _draw_dirty(self):
+        """Redraws only the sprites that changed and remembers their rects."""
+        self._draw_info_panel()
+
+        self.dirty_rects = self.render_group.draw(self.screen)
+
+    def _present(self):
+        """Pushes the frame to the display (only the dirty rects, if enabled)."""
+        if settings.DIRTY_RECT_RENDERING:
+            pygame.display.update(self.dirty_rects)
+        else:
+            pygame.display.flip()
@@ -1,10 +1,9 @@
-
-
 import pygame
 import settings
+import assets
 
 
-class GridButton(pygame.sprite.Sprite):
+class GridButton(pygame.sprite.DirtySprite):
     """
     Represents a single clickable button that corresponds to a Cell.
     """
@@ -18,34 +17,14 @@ class GridButton(pygame.sprite.Sprite):
         self.width = settings.BUTTON_WIDTH
         self.height = settings.BUTTON_HEIGHT
 
-        # --- Pygame Sprite setup ---
-        self.image = pygame.Surface((self.width, self.height))
-        self.rect = self.image.get_rect(topleft=(x, y))
-
-        # --- Font and Text ---
-        self.font = pygame.font.SysFont(None, 30)
-
-        # Render the button's appearance
+        # Render the button's appearance (shared surface from the asset cache)
         self._update_image()
+        self.rect = self.image.get_rect(topleft=(x, y))
 
     def _update_image(self):
-        """Internal helper to redraw the button's appearance based on state."""
-        if self.state == 'enabled':
-            bg_color = settings.COLOR_BUTTON
-            text_color = settings.COLOR_BUTTON_TEXT
-        else:  # 'disabled'
-            bg_color = settings.COLOR_BUTTON_DISABLED
-            text_color = settings.COLOR_BUTTON_TEXT_DISABLED
-
-        self.image.fill(bg_color)
-
-        # Draw text
-        text_surf = self.font.render(self.cell_id, True, text_color)
-        text_rect = text_surf.get_rect(center=self.image.get_rect().center)
-        self.image.blit(text_surf, text_rect)
-
-        # Draw border
-        pygame.draw.rect(self.image, settings.COLOR_WHITE, self.image.get_rect(), 1)
+        """Internal helper to swap in the button's appearance based on state."""
+        self.image = assets.get_button_surface(self.cell_id, self.state, (self.width, self.height))
+        self.dirty = 1
 
     def handle_click(self):
         """
@@ -58,4 +37,4 @@ class GridButton(pygame.sprite.Sprite):
             self._update_image()  # Redraw with disabled appearance
             return self.cell_id
 
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,33 @@
+import pygame
+import settings
+import assets
+
+
+class InfoPanel(pygame.sprite.DirtySprite):
+    """
+    The info panel at the top of the screen.
+    Only re-renders (and marks itself dirty) when its text actually changes,
+    so the dirty-rect renderer can skip it on most frames.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.text = None
+
+        self.image = pygame.Surface((settings.SCREEN_WIDTH, settings.INFO_PANEL_HEIGHT))
+        self.rect = self.image.get_rect(topleft=(0, 0))
+
+    def set_text(self, text):
+        """Updates the panel text. Does nothing if the text is unchanged."""
+        if text == self.text:
+            return
+
+        self.text = text
+        self.image.fill(settings.COLOR_GRID_BG)
+
+        # Not cached: the text changes all the time (counters, frame stats, round-trip time)
+        text_surface = assets.get_font(settings.UI_FONT_SIZE).render(text, True, settings.COLOR_WHITE)
+        text_rect = text_surface.get_rect(center=self.image.get_rect().center)
+        self.image.blit(text_surface, text_rect)
+
+        self.dirty = 1
@@ -1,6 +1,28 @@
+import argparse
+import sys
+
+import settings
 from game import Game
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="P300 Battleship")
+    parser.add_argument('--rows', type=int, default=settings.ROWS, help="Number of grid rows")
+    parser.add_argument('--cols', type=int, default=settings.COLS, help="Number of grid columns")
+    parser.add_argument('--host', type=int, metavar='PORT', help="Host a two-player match on PORT")
+    parser.add_argument('--join', metavar='HOST:PORT', help="Join the match hosted at HOST:PORT")
+    parser.add_argument('--calibrate', action='store_true',
+                        help="Measure the display latency with a photodiode over the sync patch")
+    args = parser.parse_args()
+    settings.apply(ROWS=args.rows, COLS=args.cols)
+    if args.calibrate:
+        settings.apply(PHOTODIODE_CALIBRATION=True, DECODER_ENABLED=True)
+    if args.host is not None:
+        settings.apply(NETWORK_ROLE='host', NETWORK_ADDRESS='0.0.0.0', NETWORK_PORT=args.host)
+    elif args.join:
+        host, port = args.join.rsplit(':', 1)
+        settings.apply(NETWORK_ROLE='join', NETWORK_ADDRESS=host, NETWORK_PORT=int(port))
+
     battleship_game = Game()
 
     battleship_game.run()
+    sys.exit()
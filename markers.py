@@ -0,0 +1,383 @@
+"""
+Local marker stream for EEG recording software.
+
+Every session event (stimulus onsets/offsets, decoder selections, cursor
+moves, ship placements, shots...) is published as a datagram over UDP or a
+Unix-domain datagram socket, timestamped with time.perf_counter_ns() (the
+monotonic clock the frame flips are measured with). Records use the same
+layout and event types as the session log (see recorder.py).
+
+Like the trigger box, push() only appends to a deque; a sender thread
+batches whatever is queued into as few datagrams as possible, so the
+render loop never waits on the socket.
+
+Clock alignment: a receiver sends SYNC_REQUEST packets carrying its own
+clock; the outlet answers immediately with its clock, and the receiver
+takes the offset from the reply with the smallest round trip.
+
+Run this file directly to benchmark latency and throughput through a
+local receiver, or to print the markers of a running game:
+
+    python markers.py --count 10000
+    python markers.py --listen 127.0.0.1:5005
+"""
+
+import argparse
+import collections
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+import settings
+from recorder import RECORD, RECORD_DTYPE, EVENT_NAMES, SESSION_START, STIM_ONSET
+
+MAGIC = b'P3MK'
+VERSION = 1
+
+# Packet kinds
+DATA = 0  # followed by `count` records
+SYNC_REQUEST = 1  # receiver -> outlet, send_ns = receiver clock
+SYNC_REPLY = 2  # outlet -> receiver, send_ns = outlet clock, followed by the request's send_ns
+
+# magic, version, kind, record count, sender clock (perf_counter_ns)
+HEADER = struct.Struct('<4sBBHq')
+SYNC_ECHO = struct.Struct('<q')
+
+
+def parse_address(address):
+    """
+    "host:port" -> UDP, anything containing a "/" -> Unix datagram socket path.
+    Returns (socket family, socket address).
+    """
+    if '/' in address:
+        return socket.AF_UNIX, address
+    host, _, port = address.rpartition(':')
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+def _bind_socket(family, sockaddr):
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    if family == socket.AF_UNIX and os.path.exists(sockaddr):
+        os.unlink(sockaddr)
+    sock.bind(sockaddr)
+    return sock
+
+
+class MarkerOutlet:
+    """
+    Publishes markers to one receiver address from background threads.
+    push() is safe to call from the game loop: it only appends to a deque.
+    """
+
+    def __init__(self, address, max_batch=None):
+        self.address = address
+        self.max_batch = settings.MARKER_MAX_BATCH if max_batch is None else max_batch
+        self._family, self._target = parse_address(address)
+
+        # Bound so receivers can send clock sync requests back
+        if self._family == socket.AF_UNIX:
+            self._own_path = f"{self._target}.outlet"
+            self._sock = _bind_socket(self._family, self._own_path)
+        else:
+            self._own_path = None
+            self._sock = _bind_socket(self._family, (self._target[0], 0))
+
+        self._queue = collections.deque()  # Packed records
+        self._wakeup = threading.Event()
+        self._stopping = False
+
+        self.count = 0  # Markers pushed
+        self.packets = 0  # Datagrams sent
+        self.dropped = 0  # Markers lost because nobody was listening
+        self.sync_replies = 0
+
+        self._sender = threading.Thread(target=self._sender_loop, name="marker-sender", daemon=True)
+        self._sender.start()
+        self._sync = threading.Thread(target=self._sync_loop, name="marker-sync", daemon=True)
+        self._sync.start()
+
+    def push(self, event_type, frame, a=0, b=0, c=0, d=0, t_ns=None):
+        """Queues one marker. Never blocks."""
+        if t_ns is None:
+            t_ns = time.perf_counter_ns()
+        self._queue.append(RECORD.pack(t_ns, frame, event_type, a, b, c, d))
+        self.count += 1
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def pending(self):
+        """Number of markers queued but not yet sent."""
+        return len(self._queue)
+
+    def close(self, timeout=1.0):
+        """Sends whatever is still queued, then stops both threads."""
+        self._stopping = True
+        self._wakeup.set()
+        self._sender.join(timeout)
+        self._sock.close()
+        self._sync.join(timeout)
+        if self._own_path and os.path.exists(self._own_path):
+            os.unlink(self._own_path)
+
+    def _sender_loop(self):
+        """Sends queued markers in batches of up to max_batch per datagram."""
+        q = self._queue
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+
+            while q:
+                batch = []
+                while q and len(batch) < self.max_batch:
+                    batch.append(q.popleft())
+                packet = HEADER.pack(MAGIC, VERSION, DATA, len(batch), time.perf_counter_ns()) + b''.join(batch)
+                try:
+                    self._sock.sendto(packet, self._target)
+                    self.packets += 1
+                except OSError:
+                    # No receiver bound (Unix socket) or its buffer is full
+                    self.dropped += len(batch)
+
+            if self._stopping:
+                break
+
+    def _sync_loop(self):
+        """Answers clock sync requests as soon as they arrive."""
+        self._sock.settimeout(0.2)
+        while not self._stopping:
+            try:
+                data, sender = self._sock.recvfrom(64)
+            except socket.timeout:
+                continue
+            except OSError:
+                break  # Closed
+            if len(data) < HEADER.size:
+                continue
+            magic, _, kind, _, request_ns = HEADER.unpack_from(data)
+            if magic != MAGIC or kind != SYNC_REQUEST:
+                continue
+            reply = HEADER.pack(MAGIC, VERSION, SYNC_REPLY, 0, time.perf_counter_ns()) + SYNC_ECHO.pack(request_ns)
+            try:
+                self._sock.sendto(reply, sender)
+                self.sync_replies += 1
+            except OSError:
+                pass
+
+
+class MarkerReceiver:
+    """
+    Receives markers on a local address and stamps each packet with its
+    arrival time. sync() estimates the outlet's clock offset, so
+    latency_ns() is valid even if the two clocks differ.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self._family, sockaddr = parse_address(address)
+        self._sock = _bind_socket(self._family, sockaddr)
+        # Room for bursts while the receiving thread waits for the GIL
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        if self._family == socket.AF_INET:
+            # Port 0 picks a free port; publish the real one
+            host, port = self._sock.getsockname()
+            self.address = f"{host}:{port}"
+
+        self._records = []  # Record arrays, one per packet
+        self._receive_ns = []  # Arrival time of each record array
+        self._replies = queue.Queue()
+        self.outlet_address = None  # Learnt from the first packet
+        self.packets = 0
+        self.clock_offset_ns = 0  # outlet clock - receiver clock
+        self.sync_rtt_ns = None
+        self._stopping = False
+
+        self._thread = threading.Thread(target=self._receive_loop, name="marker-receiver", daemon=True)
+        self._thread.start()
+
+    @property
+    def count(self):
+        return sum(len(r) for r in self._records)
+
+    def _receive_loop(self):
+        self._sock.settimeout(0.2)
+        while not self._stopping:
+            try:
+                data, sender = self._sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            now = time.perf_counter_ns()
+            if len(data) < HEADER.size:
+                continue
+            magic, _, kind, count, sent_ns = HEADER.unpack_from(data)
+            if magic != MAGIC:
+                continue
+
+            if kind == DATA:
+                self.outlet_address = sender
+                self._records.append(np.frombuffer(data, dtype=RECORD_DTYPE, count=count, offset=HEADER.size))
+                self._receive_ns.append(now)
+                self.packets += 1
+            elif kind == SYNC_REPLY:
+                (request_ns,) = SYNC_ECHO.unpack_from(data, HEADER.size)
+                self._replies.put((request_ns, sent_ns, now))
+
+    def sync(self, rounds=8, timeout=0.5):
+        """
+        Clock offset handshake with the outlet (needs one marker to have
+        arrived first, so the outlet's address is known). Keeps the estimate
+        from the round trip with the smallest delay.
+        Returns (offset_ns, rtt_ns) or None if the outlet never answered.
+        """
+        if self.outlet_address is None:
+            return None
+        best = None
+        for _ in range(rounds):
+            self._sock.sendto(HEADER.pack(MAGIC, VERSION, SYNC_REQUEST, 0, time.perf_counter_ns()), self.outlet_address)
+            try:
+                request_ns, outlet_ns, reply_ns = self._replies.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            rtt = reply_ns - request_ns
+            if best is None or rtt < best[1]:
+                best = (outlet_ns - (request_ns + reply_ns) // 2, rtt)
+        if best:
+            self.clock_offset_ns, self.sync_rtt_ns = best
+        return best
+
+    def markers(self):
+        """Every marker received so far as a RECORD_DTYPE array."""
+        if not self._records:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.concatenate(self._records)
+
+    def latency_ns(self):
+        """Arrival time minus marker time (in receiver clock) for every marker."""
+        if not self._records:
+            return np.empty(0, dtype=np.int64)
+        receive_ns = np.repeat(self._receive_ns, [len(r) for r in self._records])
+        return receive_ns - (self.markers()['t_ns'] - self.clock_offset_ns)
+
+    def close(self):
+        self._stopping = True
+        self._thread.join()
+        self._sock.close()
+        if self._family == socket.AF_UNIX and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+def create_marker_outlet(address=None):
+    """
+    Creates the MarkerOutlet configured in settings.
+    Returns None if markers are disabled (MARKER_ADDRESS is None).
+    """
+    address = settings.MARKER_ADDRESS if address is None else address
+    if address is None:
+        return None
+    outlet = MarkerOutlet(address)
+    print(f"Publishing markers to {address}")
+    return outlet
+
+
+def benchmark(count=10000, interval_us=0, address=None, drain_s=2.0):
+    """
+    Sends `count` markers through a MarkerOutlet into a local MarkerReceiver
+    and reports push() cost, end-to-end latency and throughput.
+    address defaults to a free UDP port on localhost.
+    """
+    receiver = MarkerReceiver(address or '127.0.0.1:0')
+    outlet = MarkerOutlet(receiver.address)
+
+    # One marker so the receiver learns the outlet's address, then align clocks
+    outlet.push(SESSION_START, 0)
+    deadline = time.monotonic() + drain_s
+    while receiver.outlet_address is None and time.monotonic() < deadline:
+        time.sleep(0.001)
+    sync = receiver.sync()
+
+    push_cost_ns = []
+    start = time.perf_counter_ns()
+    for i in range(count):
+        t0 = time.perf_counter_ns()
+        outlet.push(STIM_ONSET, i, i & 0xFFFF)
+        push_cost_ns.append(time.perf_counter_ns() - t0)
+        if interval_us:
+            time.sleep(interval_us / 1e6)
+
+    deadline = time.monotonic() + drain_s
+    while receiver.count < count + 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Until the last marker arrived (not until the drain timeout)
+    elapsed_s = (max(receiver._receive_ns[-1:], default=start) - start) / 1e9 or float('inf')
+    outlet.close()
+    receiver.close()
+
+    # Skip the address-discovery marker
+    latency_us = np.sort(receiver.latency_ns()[1:]) / 1000
+    push_cost_us = np.sort(push_cost_ns) / 1000
+
+    results = {
+        'count': count,
+        'received': receiver.count - 1,
+        'dropped': count - (receiver.count - 1),
+        'packets': outlet.packets - 1,
+        'markers_per_packet': (receiver.count - 1) / max(1, outlet.packets - 1),
+        'throughput_per_s': (receiver.count - 1) / elapsed_s,
+        'clock_offset_us': sync[0] / 1000 if sync else float('nan'),
+        'sync_rtt_us': sync[1] / 1000 if sync else float('nan'),
+    }
+    for name, values in (('push_cost_us', push_cost_us), ('latency_us', latency_us)):
+        if len(values):
+            for p in (50, 95, 99):
+                results[f'{name}_p{p}'] = float(np.percentile(values, p))
+            results[f'{name}_max'] = float(values[-1])
+    return results
+
+
+def listen(address):
+    """Prints every marker arriving at `address` until Ctrl+C."""
+    receiver = MarkerReceiver(address)
+    print(f"Listening for markers on {receiver.address}")
+    shown = 0
+    synced = False
+    try:
+        while True:
+            time.sleep(0.05)
+            if not synced and receiver.outlet_address is not None:
+                sync = receiver.sync()
+                synced = True
+                if sync:
+                    print(f"Clock offset {sync[0] / 1000:.1f} us (round trip {sync[1] / 1000:.1f} us)")
+            markers = receiver.markers()
+            latency_us = receiver.latency_ns() / 1000
+            for m, lat in zip(markers[shown:], latency_us[shown:]):
+                name = EVENT_NAMES.get(int(m['type']), m['type'])
+                print(f"frame {m['frame']:7d}  {name:<14} {m['a']:5d} {m['b']:5d} {m['c']:5d} {m['d']:5d}  "
+                      f"latency {lat:8.1f} us")
+            shown = len(markers)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the marker stream, or print markers from a running game.")
+    parser.add_argument('--count', type=int, default=10000, help="Number of markers to send")
+    parser.add_argument('--interval-us', type=int, default=0, help="Pause between pushes (0 = as fast as possible)")
+    parser.add_argument('--address', help="Benchmark over this address (default: a free UDP port); "
+                                          "a path such as /tmp/markers.sock uses a Unix socket")
+    parser.add_argument('--listen', metavar='ADDRESS', help="Print markers arriving at ADDRESS instead of benchmarking")
+    args = parser.parse_args()
+
+    if args.listen:
+        listen(args.listen)
+    else:
+        for key, value in benchmark(args.count, args.interval_us, args.address).items():
+            print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
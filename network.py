@@ -0,0 +1,303 @@
+"""
+Two-station matches over the network.
+
+An asyncio event loop runs in a background thread, so the frame loop never
+waits on the network. Incoming messages are turned into commands on the
+game's CommandQueue (see commands.py); outgoing messages are handed to the
+loop with call_soon_threadsafe.
+
+Only state changes are sent, each as a tiny binary message:
+[type u8][payload length u8][payload]
+
+    HELLO   version, rows, cols       (both grids must match)
+    PLACED  ship length               (a ship was placed; its position stays secret)
+    READY   fleet lengths             (placement done)
+    SHOT    row, col                  (the player whose turn it is fires)
+    RESULT  row, col, result, over    (the defender resolves the shot; the turn passes to it)
+    PING / PONG  perf_counter_ns      (round-trip time, measured continuously)
+    BYE
+
+The host moves first. Try both peers on one machine:
+
+    python main.py --host 5006
+    python main.py --join 127.0.0.1:5006
+"""
+
+import asyncio
+import collections
+import socket
+import struct
+import threading
+import time
+
+import settings
+
+PROTOCOL_VERSION = 1
+
+# --- Message types ---
+HELLO = 1
+PLACED = 2
+READY = 3
+SHOT = 4
+RESULT = 5
+PING = 6
+PONG = 7
+BYE = 8
+
+FRAME_HEADER = struct.Struct('<BB')  # type, payload length
+PAYLOADS = {
+    HELLO: struct.Struct('<BBB'),
+    PLACED: struct.Struct('<B'),
+    SHOT: struct.Struct('<BB'),
+    RESULT: struct.Struct('<BBBB'),
+    PING: struct.Struct('<q'),
+    PONG: struct.Struct('<q'),
+    BYE: struct.Struct('<'),
+}
+# READY carries one byte per ship (variable length)
+
+RESULT_CODES = {'miss': 0, 'hit': 1, 'sunk': 2}
+RESULT_NAMES = {code: name for name, code in RESULT_CODES.items()}
+
+
+class ProtocolError(ValueError):
+    """A message the protocol doesn't allow (unknown type, bad payload)."""
+
+
+def encode(msg_type, *values):
+    """One message as bytes."""
+    if msg_type == READY:
+        payload = bytes(values)
+    else:
+        payload = PAYLOADS[msg_type].pack(*values)
+    return FRAME_HEADER.pack(msg_type, len(payload)) + payload
+
+
+def decode(msg_type, payload):
+    """Payload bytes -> tuple of values. Raises ProtocolError for a malformed message."""
+    if msg_type == READY:
+        return tuple(payload)
+    if msg_type not in PAYLOADS:
+        raise ProtocolError(f"unknown message type {msg_type}")
+    if len(payload) != PAYLOADS[msg_type].size:
+        raise ProtocolError(f"message type {msg_type} has {len(payload)} payload bytes, "
+                            f"expected {PAYLOADS[msg_type].size}")
+    values = PAYLOADS[msg_type].unpack(payload)
+    if msg_type == RESULT and values[2] not in RESULT_NAMES:
+        raise ProtocolError(f"unknown shot result {values[2]}")
+    return values
+
+
+class NetworkPeer:
+    """
+    One end of a match. role is 'host' (listens on `port`) or 'join'
+    (connects to host:port). Received game messages become commands on
+    `commands`: remote_placed, remote_ready, remote_shot, remote_result
+    and remote_left (with the reason).
+    """
+
+    def __init__(self, role, host, port, commands, rows, cols, ping_interval_s=None):
+        self.role = role
+        self.host = host
+        self.port = port
+        self.commands = commands
+        self.rows = rows
+        self.cols = cols
+        self.ping_interval_s = settings.NETWORK_PING_INTERVAL_S if ping_interval_s is None else ping_interval_s
+
+        self.connected = threading.Event()
+        self.rtts_ns = collections.deque(maxlen=1000)  # Recent round-trip times
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+        self._writer = None
+        self._unsent = []  # Messages sent before the connection was up, flushed after HELLO
+        self._loop = asyncio.new_event_loop()
+        self._stopped = None  # asyncio.Event, created inside the loop
+        self._thread = threading.Thread(target=self._run, name="network", daemon=True)
+        self._thread.start()
+
+    # --- Called from the game thread ---
+
+    def send(self, msg_type, *values):
+        """
+        Queues a message for the network thread. Never blocks. Messages sent
+        before the connection is up go out right after the handshake; once
+        the connection is gone they are dropped.
+        """
+        data = encode(msg_type, *values)
+        try:
+            self._loop.call_soon_threadsafe(self._write, data)
+        except RuntimeError:
+            pass  # The connection is gone and the loop has been closed
+
+    def send_placed(self, length):
+        self.send(PLACED, length)
+
+    def send_ready(self, fleet):
+        self.send(READY, *fleet)
+
+    def send_shot(self, row, col):
+        self.send(SHOT, row, col)
+
+    def send_result(self, row, col, result, game_over):
+        self.send(RESULT, row, col, RESULT_CODES[result], int(game_over))
+
+    def rtt_ms(self):
+        """Latest round-trip time in ms (None before the first PONG)."""
+        return self.rtts_ns[-1] / 1e6 if self.rtts_ns else None
+
+    def print_summary(self):
+        if not self.rtts_ns:
+            print("Network: no round trips measured.")
+            return
+        rtts = sorted(self.rtts_ns)
+        p95 = rtts[min(len(rtts) - 1, round(0.95 * len(rtts)))]
+        print(f"Network: {len(rtts)} round trips, min {rtts[0] / 1e6:.2f} ms, "
+              f"median {rtts[len(rtts) // 2] / 1e6:.2f} ms, p95 {p95 / 1e6:.2f} ms; "
+              f"{self.bytes_sent} bytes sent, {self.bytes_received} received")
+
+    def close(self, timeout=1.0):
+        """Says goodbye and stops the network thread."""
+        self.send(BYE)
+        try:
+            self._loop.call_soon_threadsafe(self._stop)
+        except RuntimeError:
+            pass  # Already finished
+        self._thread.join(timeout)
+
+    # --- Network thread ---
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._main())
+        finally:
+            self._loop.close()
+
+    def _stop(self):
+        if self._stopped is not None:
+            self._stopped.set()
+
+    def _write(self, data):
+        if self._writer is None:
+            self._unsent.append(data)  # Placement and ready state made while waiting for the other player
+        elif not self._writer.is_closing():
+            self._writer.write(data)
+            self.bytes_sent += len(data)
+
+    async def _main(self):
+        self._stopped = asyncio.Event()
+        try:
+            reader, writer = await self._connect()
+        except OSError as e:
+            print(f"Network: could not connect: {e}")
+            self.commands.post('remote_left', "Could not connect to the other player")
+            return
+        if reader is None:
+            return  # Closed before anyone connected
+
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Don't hold back tiny messages
+        self._writer = writer
+        self._write(encode(HELLO, PROTOCOL_VERSION, self.rows, self.cols))
+        for data in self._unsent:
+            self._write(data)
+        self._unsent.clear()
+        self.connected.set()
+        print(f"Network: connected to {writer.get_extra_info('peername')}")
+
+        tasks = [asyncio.create_task(self._receive(reader)), asyncio.create_task(self._ping()),
+                 asyncio.create_task(self._stopped.wait())]
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in tasks:
+            task.cancel()
+        try:
+            await writer.drain()  # Flush the BYE
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _connect(self):
+        """Host: waits for one peer. Join: retries until the host is up (NETWORK_CONNECT_TIMEOUT_S)."""
+        if self.role == 'host':
+            accepted = asyncio.get_running_loop().create_future()
+
+            def on_connect(reader, writer):
+                if not accepted.done():
+                    accepted.set_result((reader, writer))
+                else:
+                    writer.close()  # A match has exactly two players
+
+            server = await asyncio.start_server(on_connect, self.host, self.port)
+            print(f"Network: waiting for the other player on port {self.port}")
+            stop = asyncio.create_task(self._stopped.wait())
+            await asyncio.wait([accepted, stop], return_when=asyncio.FIRST_COMPLETED)
+            stop.cancel()
+            server.close()
+            return accepted.result() if accepted.done() else (None, None)
+
+        deadline = time.monotonic() + settings.NETWORK_CONNECT_TIMEOUT_S
+        while True:
+            try:
+                return await asyncio.open_connection(self.host, self.port)
+            except OSError:
+                if time.monotonic() > deadline or self._stopped.is_set():
+                    raise
+                await asyncio.sleep(0.2)
+
+    async def _receive(self, reader):
+        post = self.commands.post
+        reason = "The other player left the match"
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                msg_type, length = FRAME_HEADER.unpack(header)
+                values = decode(msg_type, await reader.readexactly(length))
+                self.bytes_received += FRAME_HEADER.size + length
+
+                if msg_type == PING:
+                    self._write(encode(PONG, *values))  # Answered here, not by the game loop
+                elif msg_type == PONG:
+                    self.rtts_ns.append(time.perf_counter_ns() - values[0])
+                elif msg_type == HELLO:
+                    version, rows, cols = values
+                    if version != PROTOCOL_VERSION or (rows, cols) != (self.rows, self.cols):
+                        print(f"Network: the other player runs protocol {version} on a {rows}x{cols} grid "
+                              f"(need {PROTOCOL_VERSION}, {self.rows}x{self.cols}).")
+                        reason = "The other player's game doesn't match this one"
+                        break
+                elif msg_type == PLACED:
+                    post('remote_placed', *values)
+                elif msg_type == READY:
+                    post('remote_ready', values)
+                elif msg_type == SHOT:
+                    post('remote_shot', *values)
+                elif msg_type == RESULT:
+                    row, col, result, game_over = values
+                    post('remote_result', row, col, RESULT_NAMES[result], bool(game_over))
+                elif msg_type == BYE:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ProtocolError as e:
+            print(f"Network: disconnecting, the other player sent a bad message: {e}")
+            reason = "The other player sent a bad message"
+        if not self._stopped.is_set():  # Not when we are the ones closing
+            post('remote_left', reason)
+
+    async def _ping(self):
+        while True:
+            self._write(encode(PING, time.perf_counter_ns()))
+            await asyncio.sleep(self.ping_interval_s)
+
+
+def create_peer(commands, rows, cols):
+    """
+    Creates the NetworkPeer configured in settings.
+    Returns None for a game against the computer (NETWORK_ROLE is None).
+    """
+    if settings.NETWORK_ROLE is None:
+        return None
+    return NetworkPeer(settings.NETWORK_ROLE, settings.NETWORK_ADDRESS, settings.NETWORK_PORT, commands, rows, cols)
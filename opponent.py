@@ -0,0 +1,163 @@
+"""
+Computer opponent for the battle phase.
+
+Keeps a hit-probability heatmap: for every remaining ship length, every
+placement that avoids known misses and sunk ships is counted, and
+placements through unsunk hits are weighted up (so it finishes off ships
+it has found). Counts are computed with vectorised window sums per grid
+line and cached per length. After a shot only the row and column through
+that cell (plus the lines of a sunk ship) change, so only those lines are
+recomputed, and choose_move() never spends more than its time budget on
+that before answering from the heatmap.
+"""
+
+import collections
+import time
+
+import numpy as np
+
+import settings
+from board import window_sums
+
+
+class ProbabilityOpponent:
+    """
+    Probability-density AI. Call choose_move() for its next shot and
+    record_result() with what happened.
+    """
+
+    def __init__(self, rows, cols, ship_lengths, budget_ms=None, hit_weight=None, seed=None):
+        self.rows = rows
+        self.cols = cols
+        self.budget_ns = (settings.AI_MOVE_BUDGET_MS if budget_ms is None else budget_ms) * 1_000_000
+        self.hit_weight = settings.AI_HIT_WEIGHT if hit_weight is None else hit_weight
+        self._rng = np.random.default_rng(seed)
+
+        # --- What the AI knows about the target board ---
+        self.shot = np.zeros((rows, cols), dtype=bool)
+        self.blocked = np.zeros((rows, cols), dtype=bool)  # Misses and sunk ships
+        self.hits = np.zeros((rows, cols), dtype=bool)  # Hits on ships not sunk yet
+        self.remaining = collections.Counter(ship_lengths)
+
+        # --- Cached densities per ship length (horizontal and vertical) ---
+        self._horizontal = {}
+        self._vertical = {}
+        self.heatmap = np.zeros((rows, cols))
+        for length, count in self.remaining.items():
+            self._horizontal[length] = self._line_density(self.blocked, self.hits, length)
+            self._vertical[length] = self._line_density(self.blocked.T, self.hits.T, length).T
+            self.heatmap += count * self._length_density(length)
+
+        # Lines whose densities are out of date
+        self._stale_rows = set()
+        self._stale_cols = set()
+
+        self.last_move_ms = 0.0
+
+    def _line_density(self, blocked, hits, length):
+        """
+        For each line (row of the inputs), how many placements of `length`
+        cover each cell, weighted by hit_weight ** (hits under the placement).
+        """
+        n_lines, line_len = blocked.shape
+        density = np.zeros((n_lines, line_len))
+        if length > line_len:
+            return density
+
+        open_windows = window_sums(blocked, length, axis=1) == 0
+        weights = np.where(open_windows, self.hit_weight ** window_sums(hits, length, axis=1), 0.0)
+
+        # Spread every placement's weight over the cells it covers
+        n_windows = line_len - length + 1
+        for offset in range(length):
+            density[:, offset:offset + n_windows] += weights
+        return density
+
+    def _length_density(self, length):
+        """Total density of one length (a 1-cell ship only counts once)."""
+        if length == 1:
+            return self._horizontal[length]
+        return self._horizontal[length] + self._vertical[length]
+
+    def _update_row(self, row):
+        for length, count in self.remaining.items():
+            new = self._line_density(self.blocked[row:row + 1], self.hits[row:row + 1], length)[0]
+            self.heatmap[row] += count * (new - self._horizontal[length][row])
+            self._horizontal[length][row] = new
+
+    def _update_col(self, col):
+        for length, count in self.remaining.items():
+            if length == 1:
+                continue  # Already counted horizontally
+            new = self._line_density(self.blocked[:, col:col + 1].T, self.hits[:, col:col + 1].T, length)[0]
+            self.heatmap[:, col] += count * (new - self._vertical[length][:, col])
+            self._vertical[length][:, col] = new
+
+    def record_result(self, row, col, result, sunk_ship=None):
+        """
+        Updates the AI's knowledge after a shot.
+        `result` is 'miss', 'hit' or 'sunk' (then `sunk_ship` is the Ship).
+        """
+        self.shot[row, col] = True
+        self._stale_rows.add(row)
+        self._stale_cols.add(col)
+
+        if result == 'miss':
+            self.blocked[row, col] = True
+        elif result == 'hit':
+            self.hits[row, col] = True
+        elif result == 'sunk':
+            for r, c in sunk_ship.coordinates:
+                self.hits[r, c] = False
+                self.blocked[r, c] = True
+                self._stale_rows.add(r)
+                self._stale_cols.add(c)
+
+            length = sunk_ship.length
+            self.heatmap -= self._length_density(length)
+            self.remaining[length] -= 1
+            if self.remaining[length] <= 0:
+                del self.remaining[length]
+
+    def refresh(self):
+        """Recomputes every stale line now, without a time budget."""
+        while self._stale_rows:
+            self._update_row(self._stale_rows.pop())
+        while self._stale_cols:
+            self._update_col(self._stale_cols.pop())
+
+    def choose_move(self):
+        """
+        Returns the (row, col) to fire at next (None if every cell has been
+        shot). Stale lines are refreshed until the time budget runs out;
+        whatever is left is done next turn.
+        """
+        if self.shot.all():
+            return None
+
+        start = time.perf_counter_ns()
+        # Leave room for picking the move itself
+        deadline = start + self.budget_ns * 0.8
+
+        # Only start a line update if the last one would still fit in the budget
+        now = start
+        line_ns = 0
+        while (self._stale_rows or self._stale_cols) and now + line_ns < deadline:
+            if self._stale_rows:
+                self._update_row(self._stale_rows.pop())
+            else:
+                self._update_col(self._stale_cols.pop())
+            line_ns = time.perf_counter_ns() - now
+            now += line_ns
+
+        scores = np.where(self.shot, -1.0, self.heatmap)
+        best = scores.max()
+        if best <= 0:
+            # No placement fits any more (or the heatmap is stale): any unshot cell
+            candidates = np.flatnonzero(~self.shot)
+        else:
+            candidates = np.flatnonzero(scores >= best * (1 - 1e-9))
+        move = divmod(int(candidates[self._rng.integers(len(candidates))]), self.cols)
+
+        self.last_move_ms = (time.perf_counter_ns() - start) / 1e6
+        return move
@@ -0,0 +1,201 @@
+"""
+Stimulus paradigms: which cells every stimulus flashes.
+
+A paradigm is a precomputed (n_stimuli x rows*cols) boolean mask matrix
+(cells flattened as r * cols + c). The game highlights cells straight from
+a stimulus' mask, the decoder accumulates each epoch's score onto the cells
+in its mask, and dynamic stopping uses the same masks for its posterior.
+
+- 'rowcol':       the classic row/column paradigm (rows first, then columns)
+- 'checkerboard': the cells of each checkerboard colour are shuffled into
+                  their own virtual matrix whose rows and columns flash, so
+                  neighbouring cells never flash together
+- 'random':       balanced random subsets; every cell is in the same number
+                  of stimuli and every cell has a unique flash pattern
+
+Every paradigm also gives each stimulus a type (0 = row-like, 1 = column-like,
+-1 = none) for the sequence constraints, and a trigger code if they fit
+into the 5-bit codes.
+"""
+
+import math
+
+import numpy as np
+
+import settings
+import trigger
+
+
+class Paradigm:
+    """
+    Base class. Subclasses fill in self.masks and self.stim_types in
+    _build(); the layout is drawn from `seed`, so the same seed always gives
+    the same stimuli.
+    """
+
+    name = None
+
+    def __init__(self, rows, cols, seed=None):
+        self.rows = rows
+        self.cols = cols
+        self.n_cells = rows * cols
+        self._rng = np.random.default_rng(seed)
+
+        self.masks, self.stim_types = self._build()
+        self.n_stimuli = len(self.masks)
+        self.trigger_codes = self._trigger_codes()
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _trigger_codes(self):
+        """
+        One code per stimulus, in the range below the event codes.
+        None if there are more stimuli than codes.
+        """
+        if self.n_stimuli > settings.TRIGGER_SHIP_PLACED - settings.TRIGGER_ROW_BASE:
+            return None
+        return [trigger.stimulus_code(s) for s in range(self.n_stimuli)]
+
+    def cells(self, stim_id):
+        """(row, col) of every cell the stimulus flashes."""
+        return [divmod(int(i), self.cols) for i in np.flatnonzero(self.masks[stim_id])]
+
+    def contains(self, stim_id, row, col):
+        """True if the stimulus flashes the cell."""
+        return bool(self.masks[stim_id, row * self.cols + col])
+
+    def _lines_of(self, layout):
+        """
+        Masks for the rows and columns of a 2-D layout of flattened cell
+        indices (-1 = empty slot). Returns (row masks, column masks).
+        """
+        def masks_for(lines):
+            masks = np.zeros((len(lines), self.n_cells), dtype=bool)
+            for m, line in zip(masks, lines):
+                m[line[line >= 0]] = True
+            return masks[masks.any(axis=1)]
+
+        return masks_for(layout), masks_for(layout.T)
+
+
+class RowColumnParadigm(Paradigm):
+    """Flashes whole rows and columns (stimulus ids as in sequence.py)."""
+
+    name = 'rowcol'
+
+    def _build(self):
+        layout = np.arange(self.n_cells).reshape(self.rows, self.cols)
+        row_masks, col_masks = self._lines_of(layout)
+        stim_types = np.array([0] * self.rows + [1] * self.cols, dtype=np.int8)
+        return np.vstack((row_masks, col_masks)), stim_types
+
+    def _trigger_codes(self):
+        """
+        The original row/column codes if the rows and columns each fit in
+        their range, else the generic per-stimulus codes (or None).
+        """
+        if (self.rows <= settings.TRIGGER_COL_BASE - settings.TRIGGER_ROW_BASE
+                and self.cols <= settings.TRIGGER_SHIP_PLACED - settings.TRIGGER_COL_BASE):
+            return [trigger.row_code(r) for r in range(self.rows)] + [trigger.col_code(c) for c in range(self.cols)]
+        print(f"Warning: a {self.rows}x{self.cols} grid doesn't fit the row/column trigger codes; "
+              f"using one code per stimulus instead.")
+        return super()._trigger_codes()
+
+
+class CheckerboardParadigm(Paradigm):
+    """
+    Checkerboard paradigm: the 'white' and 'black' cells are each shuffled
+    into a virtual matrix, and the virtual rows and columns flash. A cell's
+    flash partners are random non-neighbours, which avoids the adjacency
+    errors of whole rows/columns.
+    """
+
+    name = 'checkerboard'
+
+    def _build(self):
+        cell_rows, cell_cols = np.divmod(np.arange(self.n_cells), self.cols)
+        row_masks, col_masks = [], []
+        for colour in (0, 1):
+            cells = self._rng.permutation(np.flatnonzero((cell_rows + cell_cols) % 2 == colour))
+            if not len(cells):
+                continue
+            v_rows = max(1, math.isqrt(len(cells)))
+            v_cols = math.ceil(len(cells) / v_rows)
+            layout = np.full(v_rows * v_cols, -1)
+            layout[:len(cells)] = cells
+            rows, cols = self._lines_of(layout.reshape(v_rows, v_cols))
+            row_masks.append(rows)
+            col_masks.append(cols)
+
+        stim_types = np.array([0] * sum(map(len, row_masks)) + [1] * sum(map(len, col_masks)), dtype=np.int8)
+        return np.vstack(row_masks + col_masks), stim_types
+
+
+class RandomSubsetParadigm(Paradigm):
+    """
+    Random balanced subsets of `subset_size` cells. Each cell is flashed by
+    `flashes_per_cell` stimuli per block, and no two cells share the same
+    set of stimuli (otherwise they could not be told apart).
+    """
+
+    name = 'random'
+
+    def __init__(self, rows, cols, seed=None, subset_size=None, flashes_per_cell=None, max_attempts=1000):
+        self.subset_size = subset_size or settings.PARADIGM_SUBSET_SIZE or max(rows, cols)
+        self.flashes_per_cell = flashes_per_cell or settings.PARADIGM_FLASHES_PER_CELL
+        self.max_attempts = max_attempts
+        super().__init__(rows, cols, seed)
+
+    def _build(self):
+        n_stimuli = math.ceil(self.n_cells * self.flashes_per_cell / self.subset_size)
+        # Cells per subset, as equal as possible
+        capacity = np.array([len(s) for s in np.array_split(np.arange(self.n_cells * self.flashes_per_cell), n_stimuli)])
+        if math.comb(n_stimuli, self.flashes_per_cell) < self.n_cells:
+            raise ValueError(f"{n_stimuli} subsets with {self.flashes_per_cell} per cell can't give "
+                             f"{self.n_cells} cells unique flash patterns; use smaller subsets or more flashes per cell.")
+
+        for _ in range(self.max_attempts):
+            masks = self._draw_subsets(capacity)
+            if masks is not None:
+                return masks, np.full(n_stimuli, -1, dtype=np.int8)
+
+        raise ValueError(f"Could not draw {n_stimuli} balanced subsets of {self.subset_size} cells "
+                         f"that give every cell a unique flash pattern.")
+
+    def _draw_subsets(self, capacity):
+        """
+        Gives every cell `flashes_per_cell` subsets, drawn in proportion to the
+        room left in each subset so they all fill up. None if a draw got stuck.
+        """
+        remaining = capacity.astype(float)
+        masks = np.zeros((len(capacity), self.n_cells), dtype=bool)
+        patterns = set()
+        for cell in self._rng.permutation(self.n_cells):
+            if np.count_nonzero(remaining) < self.flashes_per_cell:
+                return None
+            for _ in range(100):
+                subsets = self._rng.choice(len(capacity), self.flashes_per_cell, replace=False,
+                                           p=remaining / remaining.sum())
+                pattern = frozenset(subsets.tolist())
+                if pattern not in patterns:
+                    break
+            else:
+                return None
+            patterns.add(pattern)
+            masks[subsets, cell] = True
+            remaining[subsets] -= 1
+        return masks
+
+
+# Index = paradigm id in session logs
+PARADIGMS = [RowColumnParadigm, CheckerboardParadigm, RandomSubsetParadigm]
+PARADIGM_NAMES = [p.name for p in PARADIGMS]
+
+
+def create_paradigm(rows, cols, seed=None, name=None):
+    """Creates the paradigm configured in settings (or the one named)."""
+    name = settings.PARADIGM if name is None else name
+    if name not in PARADIGM_NAMES:
+        raise ValueError(f"Unknown paradigm {name!r}; choose one of {', '.join(PARADIGM_NAMES)}.")
+    return PARADIGMS[PARADIGM_NAMES.index(name)](rows, cols, seed)
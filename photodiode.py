@@ -0,0 +1,311 @@
+"""
+Display latency calibration with a photodiode.
+
+Stimulus events are timed at the software flip, but the pixels change some
+time later (display pipeline, panel response), and that delay shifts every
+P300 epoch. In calibration mode (PHOTODIODE_CALIBRATION) the game draws a
+sync patch (sync_patch.py) that turns white in the same flip as every
+highlight, and the photodiode over it is recorded as one extra channel
+after the EEG. LatencyCalibration then finds the photodiode's rising edge
+after every onset flip:
+
+- flip -> photodiode is the display latency. Measured with a real
+  photodiode, its median is saved to LATENCY_CALIBRATION_FILE and added to
+  stimulus event times (session log, markers, EEG events, decoder epochs)
+  from the next session on. Synthetic measurements are never saved.
+- With the trigger box, the trigger write time of every onset is logged
+  next to the flip time, so the trigger -> photodiode latency (what an
+  amplifier's trigger channel sees) is reported as well.
+
+SyntheticPhotodiode stands in for the hardware, so the whole path can be
+tested offline:
+
+    python main.py --calibrate
+    python photodiode.py sessions/eeg_20250101_120000.json --save
+    python photodiode.py --synthetic 1000
+"""
+
+import argparse
+import collections
+import json
+import os
+from array import array
+
+import numpy as np
+
+import settings
+from eeg_store import EEGStore
+from recorder import STIM_ONSET
+
+# Synthetic photodiode output (arbitrary units) for a black and a white patch
+SYNTHETIC_DARK = 0.0
+SYNTHETIC_BRIGHT = 1000.0
+SYNTHETIC_NOISE = 20.0
+
+
+class SyntheticPhotodiode:
+    """
+    Photodiode over the sync patch, one sample per EEG sample. Every patch
+    change is seen SYNTHETIC_DISPLAY_LATENCY_MS (+ Gaussian jitter) after
+    its flip. Each sample holds the light level averaged over the sample
+    period centred on it, so edges fall between samples as with a real
+    amplifier's anti-aliasing filter.
+    """
+
+    source = 'synthetic'  # Stored with recordings; latencies from this source are never saved
+
+    def __init__(self, srate=None, latency_ms=None, jitter_ms=None, seed=None):
+        self.srate = settings.EEG_SRATE if srate is None else srate
+        self.latency_ms = settings.SYNTHETIC_DISPLAY_LATENCY_MS if latency_ms is None else latency_ms
+        self.jitter_ms = settings.SYNTHETIC_DISPLAY_JITTER_MS if jitter_ms is None else jitter_ms
+        self._rng = np.random.default_rng(seed)
+
+        self.sample_count = 0
+        self._level = SYNTHETIC_DARK
+        self._changes = collections.deque()  # (time in samples, new level), in time order
+
+    def on_flip(self, is_on, sample_index):
+        """The patch turned white (is_on) or black in a flip at this sample index."""
+        delay_ms = self.latency_ms + self.jitter_ms * self._rng.standard_normal()
+        level = SYNTHETIC_BRIGHT if is_on else SYNTHETIC_DARK
+        self._changes.append((sample_index + max(0.0, delay_ms) * self.srate / 1000, level))
+
+    def read(self, n):
+        """Produces the next n samples as a (n,) float32 array."""
+        start = self.sample_count
+        samples = np.full(n, self._level, dtype=np.float32)
+        # Sample k averages the light over [k - 0.5, k + 0.5)
+        while self._changes and self._changes[0][0] < start + n - 1:
+            t, level = self._changes.popleft()
+            k = max(int(np.floor(t + 0.5)), start)  # First sample the change reaches
+            lit_before = min(1.0, max(0.0, t - (k - 0.5)))  # Part of sample k before the change
+            samples[k - start] = self._level * lit_before + level * (1 - lit_before)
+            samples[k - start + 1:] = level
+            self._level = level
+
+        samples += self._rng.standard_normal(n, dtype=np.float32) * SYNTHETIC_NOISE
+        self.sample_count += n
+        return samples
+
+
+def rising_edges(signal, threshold=None):
+    """
+    Sample positions (fractional, linearly interpolated) where the signal
+    rises through the threshold. The default threshold is halfway between
+    the dark and bright levels (5th and 95th percentiles).
+    """
+    signal = np.asarray(signal, dtype=np.float64)
+    if threshold is None:
+        dark, bright = np.percentile(signal, [5, 95])
+        threshold = (dark + bright) / 2
+    above = signal > threshold
+    i = np.flatnonzero(~above[:-1] & above[1:])
+    return i + (threshold - signal[i]) / (signal[i + 1] - signal[i])
+
+
+def measure_latency(signal, srate, flip_samples, max_latency_ms=None):
+    """
+    Time from every flip (sample index) to the next rising photodiode edge,
+    in ms. NaN where no edge followed within max_latency_ms.
+    Returns (latencies, edge positions).
+    """
+    max_latency_ms = settings.PHOTODIODE_MAX_LATENCY_MS if max_latency_ms is None else max_latency_ms
+    flip_samples = np.asarray(flip_samples, dtype=np.float64)
+    edges = rising_edges(signal)
+
+    next_edge = np.searchsorted(edges, flip_samples)
+    found = next_edge < len(edges)
+    edge_at = np.full(len(flip_samples), np.nan)
+    edge_at[found] = edges[next_edge[found]]
+
+    latencies = (edge_at - flip_samples) * 1000 / srate
+    latencies[latencies > max_latency_ms] = np.nan
+    return latencies, edge_at
+
+
+def summarize(latencies_ms):
+    """Distribution of the measured latencies (NaN = missed) as a dict of ms values."""
+    latencies_ms = np.asarray(latencies_ms, dtype=np.float64)
+    measured = latencies_ms[~np.isnan(latencies_ms)]
+    summary = {'n': len(latencies_ms), 'missed': len(latencies_ms) - len(measured)}
+    if len(measured):
+        p5, median, p95 = np.percentile(measured, [5, 50, 95])
+        summary.update(median=median, mean=measured.mean(), sd=measured.std(), p5=p5, p95=p95,
+                       min=measured.min(), max=measured.max())
+    return summary
+
+
+def _format_summary(summary):
+    if 'median' not in summary:
+        return "no edges found"
+    return (f"median {summary['median']:.2f} ms, mean {summary['mean']:.2f} ms, sd {summary['sd']:.2f} ms, "
+            f"p5 {summary['p5']:.2f} ms, p95 {summary['p95']:.2f} ms, "
+            f"range {summary['min']:.2f}-{summary['max']:.2f} ms")
+
+
+def calibration_path():
+    return os.path.join(settings.SESSION_DIR, settings.LATENCY_CALIBRATION_FILE)
+
+
+def save_display_latency(summary, source, path=None):
+    """Stores a measured latency distribution; its median is applied from then on."""
+    path = calibration_path() if path is None else path
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'display_latency_ms': summary['median'], 'source': source, **summary}, f, indent=2)
+    return path
+
+
+def load_display_latency_ms():
+    """
+    Latency to add to stimulus event times: DISPLAY_LATENCY_MS if set, else
+    the last calibration, else 0.
+    """
+    if settings.DISPLAY_LATENCY_MS is not None:
+        return float(settings.DISPLAY_LATENCY_MS)
+    path = calibration_path()
+    if not os.path.exists(path):
+        return 0.0
+    with open(path) as f:
+        calibration = json.load(f)
+    print(f"Display latency {calibration['display_latency_ms']:.2f} ms from {path} "
+          f"(measured from {calibration.get('source', 'an unknown source')})")
+    return float(calibration['display_latency_ms'])
+
+
+class LatencyCalibration:
+    """
+    Collects the onset flips and the photodiode channel of a calibration
+    run. finish() measures the latency distribution, logs every flip next
+    to its trigger send time and saves the median for later sessions.
+    """
+
+    def __init__(self, srate=None):
+        self.srate = settings.EEG_SRATE if srate is None else srate
+        self.flip_ns = array('q')  # perf_counter_ns of every onset flip
+        self.flip_samples = array('q')  # Photodiode sample index of every onset flip
+        self._chunks = []  # Photodiode samples
+
+    def add_flip(self, flip_ns, sample_index):
+        self.flip_ns.append(flip_ns)
+        self.flip_samples.append(sample_index)
+
+    def add_samples(self, samples):
+        self._chunks.append(samples)
+
+    def finish(self, log_path, trigger_events=None, trigger_codes=None, source='synthetic'):
+        """
+        Measures flip -> photodiode latency, prints the report and writes the
+        per-flip log (.npz). trigger_events are TriggerWriter.sent; the ones
+        with stimulus codes are matched to the onsets in order. The median is
+        saved for later sessions unless the photodiode `source` is synthetic.
+        Returns the latency summary.
+        """
+        signal = np.concatenate(self._chunks) if self._chunks else np.zeros(0, dtype=np.float32)
+        flip_samples = np.frombuffer(self.flip_samples, dtype=np.int64)
+        flip_ns = np.frombuffer(self.flip_ns, dtype=np.int64)
+        # Only flips whose photodiode window has been recorded
+        complete = flip_samples + settings.PHOTODIODE_MAX_LATENCY_MS * self.srate / 1000 < len(signal)
+        flip_samples, flip_ns = flip_samples[complete], flip_ns[complete]
+
+        latencies, edges = measure_latency(signal, self.srate, flip_samples)
+        summary = summarize(latencies)
+        print(f"Display latency calibration: {summary['n']} onsets, {summary['missed']} without a photodiode edge")
+        print(f"  Flip -> photodiode: {_format_summary(summary)}")
+
+        # Trigger write time next to each flip (-1 without the trigger box)
+        enqueue_ns = np.full(len(flip_ns), -1, dtype=np.int64)
+        write_ns = np.full(len(flip_ns), -1, dtype=np.int64)
+        if trigger_events and trigger_codes:
+            codes = set(trigger_codes)
+            onset_triggers = [e for e in trigger_events if e.code in codes][:len(flip_ns)]
+            n = len(onset_triggers)
+            enqueue_ns[:n] = [e.enqueue_ns for e in onset_triggers]
+            write_ns[:n] = [e.write_ns for e in onset_triggers]
+            sent = write_ns >= 0
+            trigger_lag_ms = (write_ns[sent] - flip_ns[sent]) / 1e6
+            print(f"  Flip -> trigger write: {_format_summary(summarize(trigger_lag_ms))}")
+            print(f"  Trigger -> photodiode: {_format_summary(summarize(latencies[sent] - trigger_lag_ms))}")
+
+        np.savez(log_path, flip_ns=flip_ns, flip_sample=flip_samples, trigger_enqueue_ns=enqueue_ns,
+                 trigger_write_ns=write_ns, photodiode_edge=edges, latency_ms=latencies, srate=self.srate)
+        print(f"Saved the calibration log to {log_path}")
+
+        if source == SyntheticPhotodiode.source:
+            print("  Measured on the synthetic photodiode, so the display latency was not saved")
+        elif 'median' in summary:
+            path = save_display_latency(summary, f"{source} photodiode, {os.path.basename(log_path)}")
+            print(f"Saved display latency {summary['median']:.2f} ms to {path}; "
+                  f"stimulus event times are shifted by it from the next session on")
+        return summary
+
+
+def measure_recording(path):
+    """
+    Latency summary from a recording (eeg_store.py) that has a photodiode
+    channel; summary['source'] is the photodiode it was recorded from.
+    """
+    store = EEGStore(path)
+    channel = store.header.get('photodiode_channel')
+    if channel is None:
+        raise ValueError(f"{path} has no photodiode channel (record it with --calibrate).")
+    onsets = store.events['sample'][store.events['type'] == STIM_ONSET].astype(np.int64)
+    # Event samples include the latency applied during that session
+    flips = onsets - store.header.get('display_latency_ms', 0) * store.srate / 1000
+    latencies, _ = measure_latency(store.samples[:, channel], store.srate, flips)
+    summary = summarize(latencies)
+    summary['source'] = store.header.get('photodiode_source', 'unknown')
+    return summary
+
+
+def synthetic_check(count, srate=None, refresh_rate_hz=None):
+    """
+    Runs the synthetic photodiode through count stimulus cycles and compares
+    the measured latency to the simulated one.
+    """
+    srate = settings.EEG_SRATE if srate is None else srate
+    refresh_rate_hz = settings.REFRESH_RATE_HZ if refresh_rate_hz is None else refresh_rate_hz
+    on_frames = round(settings.STIM_TIME_MS * refresh_rate_hz / 1000)
+    period_frames = on_frames + round(settings.INTER_STIM_TIME_MS * refresh_rate_hz / 1000)
+    samples_per_frame = srate / refresh_rate_hz
+
+    sensor = SyntheticPhotodiode(srate, seed=0)
+    calibration = LatencyCalibration(srate)
+    debt = 0.0
+    for frame in range(count * period_frames):
+        debt += samples_per_frame
+        n = int(debt)
+        debt -= n
+        calibration.add_samples(sensor.read(n))
+        if frame % period_frames == 0:
+            sensor.on_flip(True, sensor.sample_count)
+            calibration.add_flip(0, sensor.sample_count)
+        elif frame % period_frames == on_frames:
+            sensor.on_flip(False, sensor.sample_count)
+    calibration.add_samples(sensor.read(srate))
+
+    signal = np.concatenate(calibration._chunks)
+    latencies, _ = measure_latency(signal, srate, np.frombuffer(calibration.flip_samples, dtype=np.int64))
+    summary = summarize(latencies)
+    print(f"Simulated: {sensor.latency_ms} ms +- {sensor.jitter_ms} ms at {srate} Hz")
+    print(f"Measured ({summary['n']} onsets, {summary['missed']} missed): {_format_summary(summary)}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure display latency from a photodiode channel.")
+    parser.add_argument('recordings', nargs='*', help="EEG store headers (.json) recorded with --calibrate")
+    parser.add_argument('--save', action='store_true', help="Apply the last recording's median to future sessions")
+    parser.add_argument('--synthetic', type=int, metavar='N', help="Check the measurement on N synthetic onsets")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        synthetic_check(args.synthetic)
+    for recording in args.recordings:
+        result = measure_recording(recording)
+        print(f"{recording}: {result['n']} onsets, {result['missed']} missed; {_format_summary(result)}")
+        if args.save and result['source'] == SyntheticPhotodiode.source:
+            print(f"Not saved: {recording} was recorded with the synthetic photodiode.")
+        elif args.save and 'median' in result:
+            source = f"{result['source']} photodiode, {os.path.basename(recording)}"
+            print(f"Saved display latency {result['median']:.2f} ms to {save_display_latency(result, source)}")
@@ -0,0 +1,84 @@
+"""
+Selection prior from the live game state.
+
+Not every cell is a possible selection: while placing ships, only cells
+where the next ship fits (at the current length and orientation) can be
+chosen, and in battle only cells that haven't been shot yet. In battle the
+open cells are also weighted by how likely they are to hide a ship, using
+the same placement heatmap as the computer opponent (opponent.py).
+
+SelectionPrior keeps a weight per cell (0 = impossible) and, for every
+stimulus, how many possible cells it flashes. The game updates it when the
+board or the next ship changes, never per frame, and only the counts of
+stimuli that flash a cell whose validity changed are touched. The game
+uses it to
+- skip stimuli that flash no possible cell (e.g. a row full of ships),
+- start dynamic stopping from the prior instead of a uniform posterior,
+- never select an impossible cell,
+and it counts the flashes saved compared with cycling through every stimulus.
+"""
+
+import numpy as np
+
+
+class SelectionPrior:
+    """
+    Prior over the rows * cols cells (flattened r * cols + c) for one
+    paradigm. `masks` is the paradigm's (n_stimuli x cells) mask matrix.
+    """
+
+    def __init__(self, masks):
+        self.masks = np.asarray(masks, dtype=bool)
+        self.n_stimuli, self.n_cells = self.masks.shape
+
+        self.weights = np.full(self.n_cells, 1 / self.n_cells)  # Sums to 1
+        self.valid = np.ones(self.n_cells, dtype=bool)
+        self.valid_per_stimulus = self.masks.sum(axis=1)  # Possible cells each stimulus flashes
+        self.active = self.valid_per_stimulus > 0  # Stimuli worth showing
+
+        # --- Stats ---
+        self.updates = 0
+        self.flashes_shown = 0
+        self.flashes_skipped = 0
+
+    def set_weights(self, weights):
+        """
+        New (unnormalised) weight for every cell, 0 for impossible cells.
+        If no cell is possible, every cell is (nothing is skipped).
+        """
+        weights = np.asarray(weights, dtype=np.float64).ravel()
+        if not (weights > 0).any():
+            weights = np.ones(self.n_cells)
+
+        valid = weights > 0
+        changed = valid != self.valid
+        if changed.any():
+            # +1 for every cell that became possible, -1 for every cell that no longer is
+            delta = np.where(valid[changed], 1, -1)
+            self.valid_per_stimulus += self.masks[:, changed] @ delta
+            self.active = self.valid_per_stimulus > 0
+            self.valid = valid
+
+        self.weights = weights / weights.sum()
+        self.updates += 1
+
+    def log_prior(self):
+        """Log weights (-inf for impossible cells), for dynamic stopping."""
+        with np.errstate(divide='ignore'):
+            return np.log(self.weights)
+
+    def count_flash(self, skipped):
+        """Counts one shown stimulus and the stimuli skipped before it."""
+        self.flashes_shown += 1
+        self.flashes_skipped += skipped
+
+    def print_report(self, n_selections=0):
+        """Flashes saved compared with showing every stimulus in turn."""
+        total = self.flashes_shown + self.flashes_skipped
+        if not total:
+            return
+        saved = f"{self.flashes_skipped} of {total} flashes skipped ({100 * self.flashes_skipped / total:.0f}%)"
+        if n_selections:
+            saved += (f", {self.flashes_skipped / n_selections:.1f} fewer flashes per selection "
+                      f"({total / n_selections:.1f} -> {self.flashes_shown / n_selections:.1f})")
+        print(f"Selection prior: {saved}; {self.updates} updates")
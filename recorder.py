@@ -0,0 +1,218 @@
+"""
+Session event recorder and replay.
+
+Every stimulus onset/offset, decoder selection, cursor move, ship placement,
+button click and shot is appended to a compact binary log: a short header followed by
+fixed-size records (time, frame, event type and four small integers).
+record() only appends a tuple to a deque; a background thread packs and
+writes them, so the frame loop never waits on disk.
+
+Replay drives a headless Game from a log, unthrottled, and checks that the
+stimuli it shows match the recorded ones:
+
+    python recorder.py sessions/session_20250101_120000.p3log [more logs...]
+"""
+
+import argparse
+import collections
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+import settings
+
+MAGIC = b'P3LOG'
+VERSION = 1
+
+# time.perf_counter_ns, frame number, event type, 4 event-specific values
+RECORD = struct.Struct('<qiBxHHHH')
+RECORD_DTYPE = np.dtype([
+    ('t_ns', '<i8'), ('frame', '<i4'), ('type', 'u1'), ('pad', 'u1'),
+    ('a', '<u2'), ('b', '<u2'), ('c', '<u2'), ('d', '<u2'),
+])
+
+# --- Event types and their values ---
+SESSION_START = 0  # rows, cols, paradigm (index into paradigm.PARADIGM_NAMES), selection prior on (1) / off (0)
+SEEDS = 1  # sequence seed (low 16 bits, high 16 bits), AI seed (low, high)
+STIM_ONSET = 2  # stimulus id
+STIM_OFFSET = 3  # stimulus id
+CURSOR_MOVE = 4  # row, col
+SHIP_PLACED = 5  # row, col, length, orientation (0 = horizontal, 1 = vertical)
+BUTTON_CLICK = 6  # row, col of the button's cell
+BATTLE_START = 7
+SHOT_FIRED = 8  # row, col, result (see SHOT_RESULTS)
+OPPONENT_SHOT = 9  # row, col, result
+SELECTION = 10  # row, col, flashes, confidence (x 1000) of a decoder selection
+SHIP_CHOICE = 11  # length, orientation of the next ship (changed with 1-5 and R)
+DISPLAY = 12  # refresh rate (Hz) the frames are counted at, vsync on (1) / off (0)
+
+EVENT_NAMES = {
+    SESSION_START: 'session_start', SEEDS: 'seeds', STIM_ONSET: 'stim_onset', STIM_OFFSET: 'stim_offset',
+    CURSOR_MOVE: 'cursor_move', SHIP_PLACED: 'ship_placed', BUTTON_CLICK: 'button_click',
+    BATTLE_START: 'battle_start', SHOT_FIRED: 'shot_fired', OPPONENT_SHOT: 'opponent_shot',
+    SELECTION: 'selection', SHIP_CHOICE: 'ship_choice', DISPLAY: 'display',
+}
+SHOT_RESULTS = {'miss': 0, 'hit': 1, 'sunk': 2}
+
+
+class SessionRecorder:
+    """Append-only binary event log written from a background thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = collections.deque()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self.count = 0
+
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC + bytes([VERSION]))
+
+        self._thread = threading.Thread(target=self._writer_loop, name="session-recorder", daemon=True)
+        self._thread.start()
+
+    def record(self, event_type, frame, a=0, b=0, c=0, d=0, t_ns=None):
+        """Queues one event. Never blocks."""
+        if t_ns is None:
+            t_ns = time.perf_counter_ns()
+        self._queue.append((t_ns, frame, event_type, a, b, c, d))
+        self.count += 1
+
+    def close(self):
+        """Writes everything still queued and closes the file."""
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+        self._file.close()
+
+    def _writer_loop(self):
+        """Packs queued events and appends them to the file in batches."""
+        queue = self._queue
+        pack = RECORD.pack
+        while True:
+            # Wake up regularly so events reach the disk within FLUSH_INTERVAL_S
+            self._wakeup.wait(settings.RECORDER_FLUSH_INTERVAL_S)
+            self._wakeup.clear()
+
+            chunk = []
+            while queue:
+                chunk.append(pack(*queue.popleft()))
+            if chunk:
+                self._file.write(b''.join(chunk))
+                self._file.flush()
+
+            if self._stopping and not queue:
+                break
+
+
+def read_log(path):
+    """Reads a session log into a NumPy structured array (RECORD_DTYPE)."""
+    with open(path, 'rb') as f:
+        header = f.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a session log.")
+        if header[-1] != VERSION:
+            raise ValueError(f"Unsupported session log version {header[-1]}.")
+        data = f.read()
+    # A crash can leave a partial last record; ignore it
+    usable = len(data) - len(data) % RECORD_DTYPE.itemsize
+    return np.frombuffer(data[:usable], dtype=RECORD_DTYPE)
+
+
+def split_seed(seed):
+    """32-bit seed -> (low 16 bits, high 16 bits) for a log record."""
+    return seed & 0xFFFF, (seed >> 16) & 0xFFFF
+
+
+def join_seed(low, high):
+    return int(low) | (int(high) << 16)
+
+
+def replay(path, render=False):
+    """
+    Re-runs a recorded session in a headless Game as fast as possible.
+    Returns (game, report) where report counts the events applied and any
+    stimuli that differ from the recording.
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    from game import Game
+    from paradigm import PARADIGM_NAMES
+
+    events = read_log(path)
+    start = events[events['type'] == SESSION_START]
+    seeds = events[events['type'] == SEEDS]
+    display = events[events['type'] == DISPLAY]
+    if not len(start) or not len(seeds):
+        raise ValueError(f"{path} has no session header events.")
+
+    settings.apply(
+        ROWS=int(start['a'][0]), COLS=int(start['b'][0]), PARADIGM=PARADIGM_NAMES[int(start['c'][0])],
+        SELECTION_PRIOR=bool(start['d'][0]),
+        SEQUENCE_SEED=join_seed(seeds['a'][0], seeds['b'][0]),
+        AI_SEED=join_seed(seeds['c'][0], seeds['d'][0]),
+        # Inputs come from the log only; nothing is written back out
+        DECODER_ENABLED=False, TRIGGER_PORT=None, MARKER_ADDRESS=None, NETWORK_ROLE=None, RECORD_SESSIONS=False,
+        FRAME_STATS_ENABLED=False, VSYNC=False,
+    )
+    if len(display):
+        settings.apply(REFRESH_RATE_HZ=int(display['a'][0]))  # Frame numbers are counted at this rate
+    game = Game()
+
+    recorded_onsets = events[events['type'] == STIM_ONSET]
+    expected_stim = dict(zip(recorded_onsets['frame'].tolist(), recorded_onsets['a'].tolist()))
+    # The opponent's shots are applied as logged: its choice depends on a wall-clock time budget
+    actions = events[np.isin(events['type'], (CURSOR_MOVE, SHIP_PLACED, BUTTON_CLICK, BATTLE_START, SHOT_FIRED,
+                                              OPPONENT_SHOT, SHIP_CHOICE))]
+
+    last_frame = int(events['frame'].max())
+    mismatched = 0
+    i = 0
+    for frame in range(last_frame + 1):
+        # Apply everything the participant did on this frame
+        while i < len(actions) and actions['frame'][i] == frame:
+            game._apply_logged_event(int(actions['type'][i]), *(int(actions[k][i]) for k in 'abcd'))
+            i += 1
+
+        game._update()
+        if render:
+            game._draw()
+            game._present()
+
+        if game.scheduler.is_onset_frame() and frame in expected_stim:
+            if game.sequence[game.stim_index] != expected_stim[frame]:
+                mismatched += 1
+        game._on_frame_flipped(time.perf_counter_ns())
+
+    report = {
+        'frames': last_frame + 1,
+        'events': len(events),
+        'actions_applied': i,
+        'stimuli': len(recorded_onsets),
+        'mismatched_stimuli': mismatched,
+        'ships': len(game.placed_ships),
+        'phase': game.phase,
+    }
+    return game, report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded sessions headless, as fast as possible.")
+    parser.add_argument('logs', nargs='+', help="Session log files (.p3log)")
+    parser.add_argument('--render', action='store_true', help="Also draw every frame (slower)")
+    args = parser.parse_args()
+
+    import assets
+    import pygame
+
+    for log_path in args.logs:
+        t0 = time.perf_counter()
+        replayed, result = replay(log_path, render=args.render)
+        elapsed = time.perf_counter() - t0
+        speedup = result['frames'] / settings.REFRESH_RATE_HZ / elapsed
+        print(f"{log_path}: {result} in {elapsed:.2f} s ({speedup:.0f}x real time)")
+        assets.clear()
+        pygame.quit()
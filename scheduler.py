@@ -0,0 +1,131 @@
+import time
+
+import settings
+
+
+class StimulusScheduler:
+    """
+    Frame-locked stimulus timeline.
+
+    The stimulus and inter-stimulus times are converted into whole display
+    frames once, before the run starts. The Game then asks the scheduler
+    what to show on the current frame and tells it after every flip, so
+    highlights are driven by the frame counter instead of by get_ticks()
+    deltas. The actual flip time of every onset/offset is recorded with
+    time.perf_counter_ns() for the jitter report.
+
+    Counting frames only tracks the screen if every flip waits for one
+    display refresh, i.e. with a vsynced flip (settings.VSYNC). Without
+    vsync a "frame" is one loop iteration, and a long iteration stretches
+    the stimulus it falls in.
+    """
+
+    def __init__(self, stim_time_ms=None, inter_stim_time_ms=None, refresh_rate_hz=None):
+        self.stim_time_ms = settings.STIM_TIME_MS if stim_time_ms is None else stim_time_ms
+        self.inter_stim_time_ms = settings.INTER_STIM_TIME_MS if inter_stim_time_ms is None else inter_stim_time_ms
+        self.refresh_rate_hz = settings.REFRESH_RATE_HZ if refresh_rate_hz is None else refresh_rate_hz
+
+        # --- Timeline (in frames) ---
+        self.frame_period_ns = 1_000_000_000 / self.refresh_rate_hz
+        self.on_frames = max(1, round(self.stim_time_ms * self.refresh_rate_hz / 1000))
+        self.off_frames = max(0, round(self.inter_stim_time_ms * self.refresh_rate_hz / 1000))
+        self.period_frames = self.on_frames + self.off_frames
+
+        # One entry per frame of a stimulus cycle: True while the stimulus is shown
+        self.timeline = [True] * self.on_frames + [False] * self.off_frames
+
+        self.frame = 0  # Number of frames flipped so far
+        self.onset_ns = []  # Actual flip time of each stimulus onset
+        self.offset_ns = []  # Actual flip time of each stimulus offset
+
+        actual_on_ms = self.on_frames * self.frame_period_ns / 1e6
+        actual_off_ms = self.off_frames * self.frame_period_ns / 1e6
+        if abs(actual_on_ms - self.stim_time_ms) > 0.5 or abs(actual_off_ms - self.inter_stim_time_ms) > 0.5:
+            print(f"Warning: stimulus timing {self.stim_time_ms}/{self.inter_stim_time_ms} ms is not a whole number "
+                  f"of frames at {self.refresh_rate_hz} Hz; using {actual_on_ms:.1f}/{actual_off_ms:.1f} ms")
+
+    @property
+    def stimulus_index(self):
+        """Index of the stimulus cycle the current frame belongs to."""
+        return self.frame // self.period_frames
+
+    def is_onset_frame(self):
+        """True if the current frame is the first frame of a stimulus."""
+        return self.frame % self.period_frames == 0
+
+    def is_offset_frame(self):
+        """True if the current frame is the first frame of an inter-stimulus gap."""
+        return self.off_frames > 0 and self.frame % self.period_frames == self.on_frames
+
+    def is_stimulus_on(self):
+        """True if a stimulus should be shown on the current frame."""
+        return self.timeline[self.frame % self.period_frames]
+
+    def frame_flipped(self, flip_time_ns=None):
+        """
+        Called right after every display flip. Records the flip time of
+        onset/offset frames and advances the frame counter.
+        """
+        if flip_time_ns is None:
+            flip_time_ns = time.perf_counter_ns()
+
+        if self.is_onset_frame():
+            self.onset_ns.append(flip_time_ns)
+        elif self.is_offset_frame():
+            self.offset_ns.append(flip_time_ns)
+
+        self.frame += 1
+
+    def timing_report(self):
+        """
+        Returns per-stimulus onset jitter and duration error (in ms).
+        Onset jitter is measured against the ideal frame-locked timeline
+        starting at the first onset; duration error against the shown
+        duration, on_frames at the refresh rate (STIM_TIME_MS rounded to
+        whole frames), so rounding doesn't count as error.
+        """
+        if not self.onset_ns:
+            return {'stimuli': 0, 'onset_jitter_ms': [], 'duration_error_ms': []}
+
+        first_onset = self.onset_ns[0]
+        period_ns = self.period_frames * self.frame_period_ns
+        on_ms = self.on_frames * self.frame_period_ns / 1e6
+        onset_jitter_ms = [
+            (onset - (first_onset + k * period_ns)) / 1e6
+            for k, onset in enumerate(self.onset_ns)
+        ]
+
+        if self.off_frames > 0:
+            duration_error_ms = [
+                (offset - onset) / 1e6 - on_ms
+                for onset, offset in zip(self.onset_ns, self.offset_ns)
+            ]
+        else:
+            # Back-to-back stimuli: each one ends at the next onset
+            duration_error_ms = [
+                (next_onset - onset) / 1e6 - period_ns / 1e6
+                for onset, next_onset in zip(self.onset_ns, self.onset_ns[1:])
+            ]
+
+        return {
+            'stimuli': len(self.onset_ns),
+            'onset_jitter_ms': onset_jitter_ms,
+            'duration_error_ms': duration_error_ms,
+        }
+
+    def print_report(self):
+        """Prints a summary of the timing report."""
+        report = self.timing_report()
+        if report['stimuli'] == 0:
+            print("Stimulus timing: no stimuli shown.")
+            return
+
+        print(f"Stimulus timing over {report['stimuli']} stimuli "
+              f"({self.on_frames}+{self.off_frames} frames at {self.refresh_rate_hz} Hz):")
+        for name in ('onset_jitter_ms', 'duration_error_ms'):
+            values = report[name]
+            if not values:
+                continue
+            mean = sum(values) / len(values)
+            worst = max(values, key=abs)
+            print(f"  {name}: mean {mean:+.2f}, worst {worst:+.2f}")
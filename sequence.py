@@ -0,0 +1,201 @@
+"""
+Seeded, vectorised stimulus-sequence generation.
+
+Stimuli are encoded as integers. With the row/column paradigm 0..rows-1 are
+rows and rows..rows+cols-1 are columns; other paradigms (see paradigm.py)
+number their stimuli themselves and pass their stimulus types. Each block
+shows every stimulus exactly once (so counts are balanced per block). For every block a pool of
+candidate permutations is drawn with NumPy and all pluggable constraints
+are checked on the whole pool at once; one valid candidate is kept.
+"""
+
+import numpy as np
+
+import settings
+
+
+class Constraint:
+    """
+    Base class for sequence constraints.
+    check() gets a (n_candidates, len(history) + block_len) array made of the
+    recent history followed by each candidate block, plus the type of every
+    stimulus id (0 = row-like, 1 = column-like, -1 = none), and returns a
+    boolean mask of the candidates that are allowed.
+    """
+
+    # How many previously generated stimuli check() needs to see
+    history_needed = 0
+
+    def check(self, sequences, n_history, stim_types):
+        raise NotImplementedError
+
+
+class NoRepeatWithin(Constraint):
+    """No row/column may flash again within `gap` stimuli (e.g. across block boundaries)."""
+
+    def __init__(self, gap):
+        self.gap = gap
+        self.history_needed = gap
+
+    def check(self, sequences, n_history, stim_types):
+        ok = np.ones(len(sequences), dtype=bool)
+        for distance in range(1, self.gap + 1):
+            repeats = sequences[:, distance:] == sequences[:, :-distance]
+            # Only pairs ending inside the candidate block matter
+            start = max(0, n_history - distance)
+            ok &= ~repeats[:, start:].any(axis=1)
+        return ok
+
+
+class MaxSameTypeRun(Constraint):
+    """
+    At most `max_run` rows (or columns) in a row.
+    Paradigms without row/column types are not constrained.
+    """
+
+    def __init__(self, max_run):
+        self.max_run = max_run
+        self.history_needed = max_run
+
+    def check(self, sequences, n_history, stim_types):
+        if (stim_types < 0).all():
+            return np.ones(len(sequences), dtype=bool)
+
+        # Number of rows in every window of max_run + 1 stimuli (via a running sum)
+        window = self.max_run + 1
+        row_counts = np.zeros((len(sequences), sequences.shape[1] + 1), dtype=np.int16)
+        np.cumsum(stim_types[sequences] == 0, axis=1, out=row_counts[:, 1:])
+        rows_in_window = row_counts[:, window:] - row_counts[:, :-window]
+        same_type = (rows_in_window == 0) | (rows_in_window == window)
+        start = max(0, n_history - self.max_run)
+        return ~same_type[:, start:].any(axis=1)
+
+
+def default_constraints():
+    """Constraints configured in settings."""
+    constraints = []
+    if settings.SEQUENCE_MIN_REPEAT_GAP > 0:
+        constraints.append(NoRepeatWithin(settings.SEQUENCE_MIN_REPEAT_GAP))
+    if settings.SEQUENCE_MAX_SAME_TYPE_RUN > 0:
+        constraints.append(MaxSameTypeRun(settings.SEQUENCE_MAX_SAME_TYPE_RUN))
+    return constraints
+
+
+class SequenceGenerator:
+    """
+    Generates whole blocks of stimuli from a seed.
+    The same seed, grid size, stimulus types and constraints always give the
+    same sequence. stim_types defaults to the row/column paradigm.
+    """
+
+    # Draw a fresh candidate pool every this many blocks
+    POOL_REFRESH_BLOCKS = 64
+
+    def __init__(self, rows, cols, seed=None, constraints=None, n_candidates=None, stim_types=None):
+        self.rows = rows
+        self.cols = cols
+        if stim_types is None:
+            stim_types = [0] * rows + [1] * cols
+        self.stim_types = np.asarray(stim_types, dtype=np.int8)
+        self.block_len = len(self.stim_types)
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy % (2 ** 32))
+        self.constraints = default_constraints() if constraints is None else list(constraints)
+        self.n_candidates = settings.SEQUENCE_CANDIDATES if n_candidates is None else n_candidates
+
+        self._rng = np.random.default_rng(self.seed)
+        self._history_len = max([c.history_needed for c in self.constraints], default=0)
+        self._base = np.tile(np.arange(self.block_len, dtype=np.int16), (self.n_candidates, 1))
+
+        self.sequence = np.empty(0, dtype=np.int16)  # Everything generated so far
+        # Candidate pool, kept between calls so generating in pieces gives the same sequence
+        self._pool, self._pool_valid = None, None
+
+    def generate(self, n_blocks, max_attempts=100):
+        """
+        Generates n_blocks more blocks, appends them to self.sequence and returns them.
+        generate(a) followed by generate(b) gives the same blocks as generate(a + b).
+        """
+        blocks = np.empty((n_blocks, self.block_len), dtype=np.int16)
+        history = self.sequence[len(self.sequence) - self._history_len:] if self._history_len else self.sequence[:0]
+        first_block = len(self.sequence) // self.block_len
+
+        for b in range(n_blocks):
+            for _ in range(max_attempts):
+                if self._pool is None or (first_block + b) % self.POOL_REFRESH_BLOCKS == 0:
+                    self._pool, self._pool_valid = self._draw_pool()
+                pool, pool_valid = self._pool, self._pool_valid
+
+                # Only windows that cross the block boundary still need checking
+                valid = pool_valid.copy()
+                if len(history):
+                    head = pool[:, :self._history_len]
+                    valid &= self._validate(head, history)
+
+                valid_idx = np.flatnonzero(valid)
+                if len(valid_idx):
+                    blocks[b] = pool[valid_idx[self._rng.integers(len(valid_idx))]]
+                    break
+                self._pool = None  # Nothing fits: draw a fresh pool
+            else:
+                raise RuntimeError("Could not generate a stimulus block that satisfies all constraints.")
+
+            if self._history_len:
+                history = np.concatenate((history, blocks[b]))[-self._history_len:]
+
+        new = blocks.ravel()
+        self.sequence = np.concatenate((self.sequence, new))
+        return new
+
+    @property
+    def history_len(self):
+        """How many previous stimuli the constraints look back on."""
+        return self._history_len
+
+    def allows_next(self, history, stim_id):
+        """
+        True if showing stim_id right after `history` (the stimuli actually
+        shown, most recent last) keeps every constraint. For callers that
+        skip stimuli at run time, which the generated blocks can't foresee.
+        """
+        if not self.constraints:
+            return True
+        recent = list(history)[len(history) - self._history_len:] if self._history_len else []
+        candidate = np.array([[stim_id]], dtype=np.int16)
+        return bool(self._validate(candidate, np.array(recent, dtype=np.int16))[0])
+
+    def _draw_pool(self):
+        """Draws a pool of candidate blocks and checks the within-block constraints once."""
+        pool = self._rng.permuted(self._base, axis=1)
+        return pool, self._validate(pool, self.sequence[:0])
+
+    def _validate(self, candidates, history):
+        """Checks every candidate against every constraint in one pass each."""
+        valid = np.ones(len(candidates), dtype=bool)
+        if not self.constraints:
+            return valid
+
+        if len(history):
+            sequences = np.hstack((np.broadcast_to(history, (len(candidates), len(history))), candidates))
+        else:
+            sequences = candidates
+
+        for constraint in self.constraints:
+            valid &= constraint.check(sequences, len(history), self.stim_types)
+        return valid
+
+    def save(self, path, shown=None):
+        """
+        Exports a sequence (and the seed and layout it was generated with) to
+        an .npz file. `shown` is the stimulus ids actually shown, in order;
+        by default everything generated so far.
+        """
+        sequence = self.sequence if shown is None else np.asarray(shown, dtype=np.int16)
+        np.savez(
+            path,
+            sequence=sequence,
+            n_shown=len(sequence),
+            seed=self.seed,
+            rows=self.rows,
+            cols=self.cols,
+            stim_types=self.stim_types,
+        )
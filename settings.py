@@ -1,44 +1,214 @@
 
+import math
+
 # Screen and Grid Dimensions
 ROWS = 6
 COLS = 6
-CELL_SIZE = 100  # Size of each cell in pixels
+MAX_CELL_SIZE = 100  # Largest size of a cell in pixels
+MAX_GRID_PIXELS = 600  # Grids larger than 6x6 shrink their cells to fit in this
 GRID_MARGIN = 50  # Space around the grid
 INFO_PANEL_HEIGHT = 50  # Space at the top for info
 
-# --- NEW: Cell ID Settings ---
-ROW_LABELS = "123456"
-COL_LABELS = "ABCDEF"
-
 # --- NEW: Button Panel Settings ---
+# Buttons shrink with the cells; these are the sizes at full cell size.
 BUTTON_PANEL_TOP_MARGIN = 20
-BUTTON_COLS = 9  # How many buttons per row
-BUTTON_ROWS = 4  # (9 * 4 = 36)
-BUTTON_WIDTH = 70
-BUTTON_HEIGHT = 40
+MAX_BUTTON_WIDTH = 70
+MAX_BUTTON_HEIGHT = 40
 BUTTON_MARGIN = 10
 
-# Calculate panel height based on button layout
-BUTTON_PANEL_HEIGHT = (BUTTON_ROWS * (BUTTON_HEIGHT + BUTTON_MARGIN)) + BUTTON_MARGIN
+# --- NEW: Font Sizes ---
+UI_FONT_SIZE = 36  # Info panel and grid labels
+MAX_BUTTON_FONT_SIZE = 30
+FONT_PATH = None  # .ttf file used for all text; None = pygame's built-in font (no system font scan)
+
+# Letters used for column labels (so up to 26 columns)
+COLUMN_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _update_layout():
+    """
+    (Re)calculates the layout values derived from the settings above:
+    cell size, cell ID labels, button layout and screen size.
+    """
+    global CELL_SIZE, ROW_LABELS, COL_LABELS
+    global BUTTON_WIDTH, BUTTON_HEIGHT, BUTTON_FONT_SIZE, BUTTON_COLS, BUTTON_ROWS
+    global BUTTON_PANEL_HEIGHT, SCREEN_WIDTH, SCREEN_HEIGHT
+
+    # Size of each cell in pixels
+    CELL_SIZE = min(MAX_CELL_SIZE, MAX_GRID_PIXELS // max(ROWS, COLS))
+
+    # --- NEW: Cell ID Settings ---
+    # Cell IDs are column letter + row number, e.g. "A1" ... "F6" (or "L12")
+    ROW_LABELS = [str(r + 1) for r in range(ROWS)]
+    COL_LABELS = COLUMN_LETTERS[:COLS]
+
+    # Buttons scale with the cells, one button per cell
+    scale = CELL_SIZE / MAX_CELL_SIZE
+    BUTTON_WIDTH = round(MAX_BUTTON_WIDTH * scale)
+    BUTTON_HEIGHT = round(MAX_BUTTON_HEIGHT * scale)
+    BUTTON_FONT_SIZE = round(MAX_BUTTON_FONT_SIZE * scale)
+
+    # Calculate screen width
+    SCREEN_WIDTH = COLS * CELL_SIZE + 2 * GRID_MARGIN
 
-# Calculate screen size
-SCREEN_WIDTH = COLS * CELL_SIZE + 2 * GRID_MARGIN
-# NEW: Add button panel height to total screen height
-SCREEN_HEIGHT = (
-    ROWS * CELL_SIZE + 2 * GRID_MARGIN + 
-    INFO_PANEL_HEIGHT + BUTTON_PANEL_TOP_MARGIN + 
-    BUTTON_PANEL_HEIGHT
-)
+    # As many buttons per row as fit across the screen (9 x 4 for the 6x6 grid)
+    BUTTON_COLS = (SCREEN_WIDTH + 2 * BUTTON_MARGIN) // (BUTTON_WIDTH + BUTTON_MARGIN)
+    BUTTON_ROWS = math.ceil(ROWS * COLS / BUTTON_COLS)
+
+    # Calculate panel height based on button layout
+    BUTTON_PANEL_HEIGHT = (BUTTON_ROWS * (BUTTON_HEIGHT + BUTTON_MARGIN)) + BUTTON_MARGIN
+
+    # NEW: Add button panel height to total screen height
+    SCREEN_HEIGHT = (
+        ROWS * CELL_SIZE + 2 * GRID_MARGIN +
+        INFO_PANEL_HEIGHT + BUTTON_PANEL_TOP_MARGIN +
+        BUTTON_PANEL_HEIGHT
+    )
+
+
+_update_layout()
 
 # Game Settings
 FPS = 60
 GAME_TITLE = "SSVEP Battleship - Placement Phase"
+DEFAULT_SHIP_LENGTH = 1  # Length of placed ships until changed with the 1-5 keys
+BATTLE_TITLE = "SSVEP Battleship - Battle Phase"
+
+# --- NEW: Battle Phase / Computer Opponent ---
+AI_MOVE_BUDGET_MS = 5  # The opponent always answers within this time
+AI_HIT_WEIGHT = 50.0  # How strongly placements through known hits are preferred
+AI_SEED = None  # None = random; also used to place the opponent's fleet
+
+# --- NEW: Input ---
+COMMAND_BATCH_LIMIT = 32  # Commands from other threads executed per frame at most (the rest wait a frame)
+
+# --- NEW: Network Match (see network.py) ---
+NETWORK_ROLE = None  # None = play the computer; 'host' or 'join' to play another station
+NETWORK_ADDRESS = '127.0.0.1'  # Host: interface to listen on; join: the host's address
+NETWORK_PORT = 5006
+NETWORK_CONNECT_TIMEOUT_S = 30  # How long 'join' keeps retrying while the host starts up
+NETWORK_PING_INTERVAL_S = 1.0  # Round-trip time is measured this often
+
+# --- NEW: Rendering Settings ---
+# When True, only the cells/buttons/cursor/info panel that changed are
+# redrawn and pushed to the display with display.update(rects).
+# When False, the whole screen is cleared, redrawn and flipped every frame.
+DIRTY_RECT_RENDERING = True
 
 # SSVEP Flicker Settings
 BASE_FLICKER_RATE_MS = 300
 FLICKER_RATE_INCREMENT = 8 
 STIM_TIME_MS = 300
 INTER_STIM_TIME_MS = 100  # Time between stimuli when no row/col is highlighted
+# Display refresh rate the stimulus timeline is counted in. Stimulus times are
+# rounded to whole frames at this rate (300 ms = 18 frames at 60 Hz).
+# Replaced by the display's own rate when pygame can report it.
+REFRESH_RATE_HZ = FPS
+# Frame counting assumes one loop iteration per display refresh, which only
+# holds with a vsynced flip. Without vsync the loop is paced by the clock.
+VSYNC = True
+
+# --- NEW: Stimulus Paradigm (see paradigm.py) ---
+# 'rowcol' flashes whole rows/columns, 'checkerboard' flashes the rows/columns
+# of two shuffled virtual matrices, 'random' flashes balanced random subsets
+PARADIGM = 'rowcol'
+PARADIGM_SUBSET_SIZE = None  # Cells per 'random' stimulus; None = max(ROWS, COLS)
+PARADIGM_FLASHES_PER_CELL = 2  # Stimuli per block that contain each cell ('random')
+
+# --- NEW: Selection Prior (see prior.py) ---
+# Flash only stimuli that contain a possible move (where the next ship fits,
+# or an unshot cell in battle) and let the decoder favour likely cells
+SELECTION_PRIOR = True
+
+# --- NEW: Stimulus Sequence Settings ---
+# Each block shows every stimulus of the paradigm once, in a seeded random order.
+SEQUENCE_SEED = None  # None = new random seed each run (the seed is saved with the session)
+SEQUENCE_BLOCKS = 8  # Blocks generated at startup, and kept generated ahead while running
+SEQUENCE_CANDIDATES = 4096  # Candidate blocks validated at once
+SEQUENCE_MIN_REPEAT_GAP = 2  # A row/col can't flash again within this many stimuli (0 = off)
+SEQUENCE_MAX_SAME_TYPE_RUN = 3  # Max rows (or cols) in a row (0 = off)
+
+# --- NEW: P300 Decoder Settings ---
+DECODER_ENABLED = False  # When True, decoded selections move the cursor and place ships
+EEG_SRATE = 250  # Samples per second
+EEG_CHANNELS = 8
+EPOCH_MS = 800  # Epoch length after each row/col onset
+DECODER_REPETITIONS = 10  # Flashes of every row and column before a selection is made
+DECODER_MODEL_PATH = None  # Classifier trained with train.py (.npz); None = a fixed P300 template
+
+# --- NEW: Classifier Training (see train.py) ---
+TRAIN_DECIMATIONS = (4, 8, 12)  # Candidate decimation factors (samples averaged into one feature)
+TRAIN_SPATIAL_FILTERS = (2, 4, 8)  # Candidate numbers of spatial filters
+TRAIN_FOLDS = 5  # Cross-validation folds
+
+# Dynamic stopping: commit a selection as soon as the evidence is sufficient
+# instead of after a fixed DECODER_REPETITIONS
+DYNAMIC_STOPPING = False
+STOPPING_THRESHOLD = 0.95  # Posterior probability of the best cell needed to commit
+STOPPING_MAX_FLASHES = 120  # Commit anyway after this many flashes
+# Classifier score distributions (defaults match the synthetic EEG + template weights;
+# a trained model brings its own)
+STOPPING_TARGET_MEAN = 2.0
+STOPPING_NONTARGET_MEAN = 0.0
+STOPPING_SCORE_SD = 0.5
+
+# Synthetic EEG (used instead of a real amplifier for offline testing)
+SYNTHETIC_TARGET_CELL = None  # e.g. "C4"; None = a new random target for every selection
+SYNTHETIC_P300_UV = 5.0  # Peak P300 amplitude
+SYNTHETIC_NOISE_UV = 10.0  # Standard deviation of the background noise
+SYNTHETIC_P300_LATENCY_MS = 300
+SYNTHETIC_SEED = None  # None = different noise every run
+
+# --- NEW: EEG Recording Store (see eeg_store.py) ---
+RECORD_EEG = True  # With the decoder on, save the EEG and stimulus events for offline analysis
+EEG_STORE_CHUNK_SAMPLES = 250  # Samples are written in chunks of this many (1 s at 250 Hz)
+
+# --- NEW: Display Latency Calibration (see photodiode.py) ---
+# Calibration mode draws a sync patch in the top-left corner that is white
+# while a stimulus is shown; a photodiode taped over it is recorded as one
+# extra channel after the EEG channels.
+PHOTODIODE_CALIBRATION = False
+PHOTODIODE_PATCH_SIZE = 40  # Pixels
+PHOTODIODE_MAX_LATENCY_MS = 100  # A flip with no photodiode edge within this time counts as missed
+DISPLAY_LATENCY_MS = None  # Added to stimulus event times; None = the last calibration (or 0 if none)
+LATENCY_CALIBRATION_FILE = 'display_latency.json'  # In SESSION_DIR, written by calibration runs
+SYNTHETIC_DISPLAY_LATENCY_MS = 20  # Simulated flip -> pixels delay seen by the synthetic EEG and photodiode
+SYNTHETIC_DISPLAY_JITTER_MS = 2  # Standard deviation of the simulated delay (photodiode only)
+
+# --- NEW: Frame Timing Instrumentation ---
+FRAME_STATS_ENABLED = True  # Low overhead; meant to stay on during sessions
+FRAME_STATS_CAPACITY = 60 * 60 * 30  # Frames kept (30 minutes at 60 Hz)
+FRAME_DROP_FACTOR = 1.5  # A frame is dropped if it took longer than this many refresh intervals
+LIVE_STATS_FRAMES = 30  # Live stats (F3 in game) are refreshed every this many frames
+FRAME_STATS_FORMAT = 'csv'  # 'csv' or 'npz' for the file saved at exit
+
+# --- NEW: Session Event Log ---
+RECORD_SESSIONS = True  # Log every stimulus and participant action (replay with recorder.py)
+RECORDER_FLUSH_INTERVAL_S = 0.5  # Queued events are written to disk at least this often
+
+# Where per-session files (e.g. the stimulus sequence) are written
+SESSION_DIR = 'sessions'
+
+# --- NEW: Trigger Box Settings (5-bit Arduino, see Trigger_code_arduino/) ---
+# Serial port of the trigger box, e.g. "COM3" or "/dev/ttyACM0".
+# None disables triggers; "fake" sends them to a pty-based fake device.
+TRIGGER_PORT = None
+TRIGGER_BAUD_RATE = 115200
+TRIGGER_STARTUP_DELAY_S = 2.0  # Arduino auto-resets when the port opens
+
+# Trigger codes (0-31). Rows and columns get one code each (grids up to 12x12).
+TRIGGER_ROW_BASE = 1  # Row r -> 1 + r
+TRIGGER_COL_BASE = 13  # Column c -> 13 + c
+TRIGGER_SHIP_PLACED = 25
+TRIGGER_BUTTON_CLICK = 26
+TRIGGER_SHOT_FIRED = 27
+
+# --- NEW: Marker Stream (see markers.py) ---
+# Publishes every session event to recording software on this machine.
+# "host:port" sends UDP datagrams, a path (e.g. "/tmp/p3markers.sock") uses a
+# Unix datagram socket. None disables the stream.
+MARKER_ADDRESS = None
+MARKER_MAX_BATCH = 60  # Markers per datagram (60 x 22 bytes fits in one Ethernet MTU)
 
 # Colors (R, G, B)
 COLOR_BLACK = (0, 0, 0)
@@ -49,6 +219,8 @@ COLOR_CELL_ON = (100, 100, 100) # Light gray (the 'flash')
 COLOR_SHIP_BG = (10, 80, 120)  # Darker blue for background of placed ship
 COLOR_CURSOR = (0, 255, 0)      # Bright green for the selector
 COLOR_CELL_DISABLED = (40, 0, 0) # NEW: Dark red for disabled cell
+COLOR_CELL_HIT = (170, 30, 30)  # NEW: Battle phase - ship hit
+COLOR_CELL_MISS = (15, 15, 70)  # NEW: Battle phase - shot missed
 
 # --- NEW: Button Colors ---
 COLOR_BUTTON = (50, 50, 150)
@@ -57,4 +229,18 @@ COLOR_BUTTON_TEXT = (255, 255, 255)
 COLOR_BUTTON_TEXT_DISABLED = (80, 80, 80)
 
 # Image Paths
-SHIP_IMAGE_PATH = 'ship.png'
\ No newline at end of file
+SHIP_IMAGE_PATH = 'ship.png'
+
+
+def apply(**overrides):
+    """
+    Overrides settings at runtime (e.g. grid size from the command line or
+    the benchmark) and recalculates the derived layout.
+    Must be called before the Game is created.
+    """
+    module_globals = globals()
+    for name, value in overrides.items():
+        if name not in module_globals or not name.isupper():
+            raise KeyError(f"Unknown setting: {name}")
+        module_globals[name] = value
+    _update_layout()
@@ -1,15 +1,24 @@
-
 class Ship:
     """
-    A simple class to represent a placed ship piece.
-    For now, it just stores the coordinates of a single 1x1 ship.
+    A ship on the board: a straight line of `length` cells starting at
+    (row, col) and running right ('horizontal') or down ('vertical').
     """
 
-    def __init__(self, row, col):
+    def __init__(self, row, col, length=1, orientation='horizontal'):
+        if orientation not in ('horizontal', 'vertical'):
+            raise ValueError("Orientation must be 'horizontal' or 'vertical'.")
+
         self.row = row
         self.col = col
-        self.coordinates = (row, col)
+        self.length = length
+        self.orientation = orientation
+
+        dr, dc = (0, 1) if orientation == 'horizontal' else (1, 0)
+        # Every (row, col) the ship covers, bow first
+        self.coordinates = tuple((row + i * dr, col + i * dc) for i in range(length))
 
     def __repr__(self):
         """A helper for printing and debugging."""
-        return f"[Ship at ({self.row}, {self.col})]"
\ No newline at end of file
+        if self.length == 1:
+            return f"[Ship at ({self.row}, {self.col})]"
+        return f"[Ship at ({self.row}, {self.col}), length {self.length}, {self.orientation}]"
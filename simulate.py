@@ -0,0 +1,191 @@
+"""
+Simulated-participant parameter sweeps.
+
+Runs the real Game logic (frame scheduler, stimulus sequence, highlighting,
+decoder and optional dynamic stopping) headless and without rendering,
+against SyntheticEEG playing a participant with a given SNR and P300
+latency. Every point of a parameter grid is split into chunks of
+selections that run in a process pool; results give accuracy, time per
+selection and ITR per point.
+
+    python simulate.py --stim-ms 100 200 --isi-ms 50 100 --repetitions 4 8 \\
+        --snr 0.3 0.5 --selections 200 --output sweep.csv
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import settings
+from stopping import information_transfer_rate
+
+
+def expected_score_distribution(overrides):
+    """
+    Target / non-target mean and SD of the decoder score for a synthetic
+    participant, so dynamic stopping is calibrated to the simulated SNR.
+    (Ignores overlap between responses to consecutive flashes.)
+    """
+    from decoder import P300Decoder, SyntheticEEG
+
+    settings.apply(**overrides)
+    decoder = P300Decoder(settings.ROWS, settings.COLS)
+    source = SyntheticEEG(settings.ROWS, settings.COLS, target=(0, 0))
+
+    template = np.zeros(decoder.epoch_len, dtype=np.float32)
+    n = min(len(template), len(source._template))
+    template[:n] = source._template[:n]
+    target_mean = float(np.sum(decoder.weights * template[:, None]))
+    score_sd = float(source.noise_uv * np.sqrt(np.sum(decoder.weights.astype(np.float64) ** 2)))
+    return target_mean, score_sd
+
+
+def _run_chunk(overrides, n_selections, seed, max_frames):
+    """
+    Worker: builds a headless Game with the given settings and runs frames
+    until n_selections have been made. Returns the raw per-selection stats.
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    import assets
+    from game import Game
+
+    settings.apply(**overrides)
+    settings.apply(
+        DECODER_ENABLED=True, SYNTHETIC_TARGET_CELL=None, SYNTHETIC_SEED=seed, SEQUENCE_SEED=seed,
+        TRIGGER_PORT=None, MARKER_ADDRESS=None, NETWORK_ROLE=None, RECORD_SESSIONS=False, RECORD_EEG=False,
+        FRAME_STATS_ENABLED=False, PHOTODIODE_CALIBRATION=False, VSYNC=False,
+        # The board carries over between selections; measure the decoder, not leftover board state
+        SELECTION_PRIOR=False,
+        # A calibrated display: event times match when the synthetic flashes reach the screen
+        DISPLAY_LATENCY_MS=settings.SYNTHETIC_DISPLAY_LATENCY_MS,
+    )
+
+    # The game prints every placement; keep worker output quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        game = Game()
+        stats = game.selection_stats
+        frame_period_ns = game.scheduler.frame_period_ns
+        frames = 0
+        while len(stats.durations_s) < n_selections and frames < max_frames:
+            game._update()
+            game._on_frame_flipped(int(frames * frame_period_ns))
+            frames += 1
+
+    result = {
+        'durations_s': list(stats.durations_s),
+        'flashes': list(stats.flashes),
+        'correct': list(stats.correct),
+    }
+    assets.clear()
+    pygame.quit()
+    return result
+
+
+def run_sweep(grid, selections=100, chunk_size=25, workers=None, seed=0, max_frames_per_selection=20000):
+    """
+    Runs every combination in `grid` (setting name -> list of values; 'SNR'
+    sets SYNTHETIC_P300_UV relative to SYNTHETIC_NOISE_UV).
+    Returns a list of result dicts, one per parameter point.
+    """
+    names = list(grid)
+    points = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+    # Turn each point into settings overrides
+    point_overrides = []
+    for point in points:
+        overrides = {name: value for name, value in point.items() if name != 'SNR'}
+        if 'SNR' in point:
+            noise = overrides.get('SYNTHETIC_NOISE_UV', settings.SYNTHETIC_NOISE_UV)
+            overrides['SYNTHETIC_P300_UV'] = point['SNR'] * noise
+        if overrides.get('DYNAMIC_STOPPING'):
+            target_mean, score_sd = expected_score_distribution(overrides)
+            overrides.setdefault('STOPPING_TARGET_MEAN', target_mean)
+            overrides.setdefault('STOPPING_NONTARGET_MEAN', 0.0)
+            overrides.setdefault('STOPPING_SCORE_SD', score_sd)
+        point_overrides.append(overrides)
+
+    # Split each point into chunks so the pool stays evenly loaded
+    tasks = []
+    for p, overrides in enumerate(point_overrides):
+        for start in range(0, selections, chunk_size):
+            n = min(chunk_size, selections - start)
+            tasks.append((p, overrides, n, seed + 1000 * p + start, n * max_frames_per_selection))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(p, pool.submit(_run_chunk, overrides, n, s, max_frames)) for p, overrides, n, s, max_frames in tasks]
+        chunks = [(p, future.result()) for p, future in futures]
+
+    n_choices = settings.ROWS * settings.COLS
+    results = []
+    for p, point in enumerate(points):
+        durations, flashes, correct = [], [], []
+        for chunk_point, chunk in chunks:
+            if chunk_point == p:
+                durations += chunk['durations_s']
+                flashes += chunk['flashes']
+                correct += chunk['correct']
+
+        n = len(durations)
+        accuracy = sum(correct) / n if n else 0.0
+        seconds_per_selection = sum(durations) / n if n else 0.0
+        results.append({
+            **point,
+            'selections': n,
+            'accuracy': accuracy,
+            'mean_flashes': sum(flashes) / n if n else 0.0,
+            'seconds_per_selection': seconds_per_selection,
+            'itr_bits_per_minute': information_transfer_rate(n_choices, accuracy, seconds_per_selection),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep stimulus timing against a simulated P300 participant.")
+    parser.add_argument('--paradigm', nargs='+', default=[settings.PARADIGM], help="Stimulus paradigms (see paradigm.py)")
+    parser.add_argument('--stim-ms', type=int, nargs='+', default=[settings.STIM_TIME_MS])
+    parser.add_argument('--isi-ms', type=int, nargs='+', default=[settings.INTER_STIM_TIME_MS])
+    parser.add_argument('--repetitions', type=int, nargs='+', default=[settings.DECODER_REPETITIONS],
+                        help="Flashes of every stimulus per selection")
+    parser.add_argument('--snr', type=float, nargs='+', default=[settings.SYNTHETIC_P300_UV / settings.SYNTHETIC_NOISE_UV],
+                        help="P300 amplitude / noise SD")
+    parser.add_argument('--latency-ms', type=int, nargs='+', default=[settings.SYNTHETIC_P300_LATENCY_MS])
+    parser.add_argument('--dynamic-stopping', action='store_true', help="Use dynamic stopping instead of fixed repetitions")
+    parser.add_argument('--selections', type=int, default=100, help="Simulated selections per parameter point")
+    parser.add_argument('--chunk-size', type=int, default=25, help="Selections per worker task")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write results to this CSV file")
+    args = parser.parse_args()
+
+    grid = {
+        'PARADIGM': args.paradigm,
+        'STIM_TIME_MS': args.stim_ms,
+        'INTER_STIM_TIME_MS': args.isi_ms,
+        'DECODER_REPETITIONS': args.repetitions,
+        'SNR': args.snr,
+        'SYNTHETIC_P300_LATENCY_MS': args.latency_ms,
+        'DYNAMIC_STOPPING': [args.dynamic_stopping],
+    }
+    results = run_sweep(grid, args.selections, args.chunk_size, args.workers, args.seed)
+
+    for row in results:
+        print(", ".join(f"{k}={v:.3g}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Wrote {len(results)} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Dynamic stopping for P300 selections.
+
+Instead of a fixed number of flashes per selection, a posterior over every
+cell is updated after each scored flash and the selection is committed as
+soon as the most likely cell is confident enough (or a flash limit is hit).
+Also tracks selections per minute and information transfer rate (ITR).
+"""
+
+import math
+
+import numpy as np
+
+import settings
+from paradigm import RowColumnParadigm
+
+
+class DynamicStopping:
+    """
+    Bayesian posterior over the rows x cols cells.
+
+    Classifier scores are modelled as Gaussian, with one mean for flashes
+    that contain the attended cell and another for flashes that don't
+    (same standard deviation). Each flash multiplies the likelihood of the
+    cells it contains by the target/non-target likelihood ratio. The prior
+    is uniform unless set_prior() is given one (see prior.py).
+    """
+
+    def __init__(self, rows, cols, threshold=None, max_flashes=None,
+                 target_mean=None, nontarget_mean=None, score_sd=None, masks=None):
+        self.rows = rows
+        self.cols = cols
+        self.threshold = settings.STOPPING_THRESHOLD if threshold is None else threshold
+        self.max_flashes = settings.STOPPING_MAX_FLASHES if max_flashes is None else max_flashes
+        self.target_mean = settings.STOPPING_TARGET_MEAN if target_mean is None else target_mean
+        self.nontarget_mean = settings.STOPPING_NONTARGET_MEAN if nontarget_mean is None else nontarget_mean
+        self.score_sd = settings.STOPPING_SCORE_SD if score_sd is None else score_sd
+
+        # Which cells (flattened r * cols + c) each stimulus id flashes
+        self.stim_masks = RowColumnParadigm(rows, cols).masks if masks is None else masks
+
+        self.log_likelihood = np.zeros(rows * cols)
+        self.log_prior = np.zeros(rows * cols)
+        self.flashes = 0
+
+    def update(self, stim_id, score):
+        """Adds the evidence from one scored flash."""
+        var2 = 2 * self.score_sd ** 2
+        log_ratio = ((score - self.nontarget_mean) ** 2 - (score - self.target_mean) ** 2) / var2
+        self.log_likelihood[self.stim_masks[stim_id]] += log_ratio
+        self.flashes += 1
+
+    def set_prior(self, log_prior):
+        """Log prior of every cell (-inf = impossible); applies to the evidence collected so far too."""
+        self.log_prior = log_prior
+
+    def posterior(self):
+        """Normalised posterior probability of every cell (flattened)."""
+        log_posterior = self.log_likelihood + self.log_prior
+        p = np.exp(log_posterior - log_posterior.max())
+        return p / p.sum()
+
+    def decide(self):
+        """
+        Returns ((row, col), confidence) once the best cell reaches the
+        threshold or the flash limit is hit, else None.
+        """
+        p = self.posterior()
+        best = int(np.argmax(p))
+        confidence = float(p[best])
+        if confidence < self.threshold and self.flashes < self.max_flashes:
+            return None
+
+        self.reset()
+        return divmod(best, self.cols), confidence
+
+    def reset(self):
+        """Back to the prior for the next selection."""
+        self.log_likelihood[:] = 0
+        self.flashes = 0
+
+
+def information_transfer_rate(n_choices, accuracy, seconds_per_selection):
+    """Wolpaw ITR in bits per minute."""
+    if seconds_per_selection <= 0 or n_choices < 2:
+        return 0.0
+    p = min(max(accuracy, 0.0), 1.0)
+    bits = math.log2(n_choices)
+    if 0 < p < 1:
+        bits += p * math.log2(p) + (1 - p) * math.log2((1 - p) / (n_choices - 1))
+    elif p == 0:
+        bits = 0.0
+    return max(bits, 0.0) * 60 / seconds_per_selection
+
+
+class SelectionStats:
+    """
+    Selection throughput: time and flashes per selection, selections per
+    minute and ITR. Accuracy uses ground truth when it is known (synthetic
+    EEG), otherwise the committed confidence as an estimate.
+    """
+
+    def __init__(self, n_choices):
+        self.n_choices = n_choices
+        self.durations_s = []
+        self.flashes = []
+        self.confidences = []
+        self.correct = []  # True/False, or None if the target is unknown
+
+    def add(self, duration_s, flashes, confidence, correct=None):
+        self.durations_s.append(duration_s)
+        self.flashes.append(flashes)
+        self.confidences.append(confidence)
+        self.correct.append(correct)
+
+    def summary(self):
+        n = len(self.durations_s)
+        if n == 0:
+            return {'selections': 0}
+
+        known = [c for c in self.correct if c is not None]
+        accuracy = sum(known) / len(known) if known else sum(self.confidences) / n
+        seconds_per_selection = sum(self.durations_s) / n
+        return {
+            'selections': n,
+            'accuracy': accuracy,
+            'accuracy_is_estimate': not known,
+            'mean_flashes': sum(self.flashes) / n,
+            'seconds_per_selection': seconds_per_selection,
+            'selections_per_minute': 60 / seconds_per_selection if seconds_per_selection else 0.0,
+            'itr_bits_per_minute': information_transfer_rate(self.n_choices, accuracy, seconds_per_selection),
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        if summary['selections'] == 0:
+            print("Selections: none made.")
+            return
+        estimate = " (estimated)" if summary['accuracy_is_estimate'] else ""
+        print(f"Selections: {summary['selections']}, accuracy {summary['accuracy']:.0%}{estimate}, "
+              f"{summary['mean_flashes']:.1f} flashes and {summary['seconds_per_selection']:.2f} s per selection, "
+              f"{summary['selections_per_minute']:.2f} selections/min, ITR {summary['itr_bits_per_minute']:.1f} bits/min")
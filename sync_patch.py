@@ -0,0 +1,32 @@
+import pygame
+import settings
+
+
+class SyncPatch(pygame.sprite.DirtySprite):
+    """
+    Small square in the top-left corner for a photodiode (calibration mode).
+    It is white while a stimulus is on screen and black otherwise, and is
+    updated in the same frame as the highlighted cells, so it changes in the
+    same flip.
+    """
+
+    def __init__(self):
+        super().__init__()
+        size = settings.PHOTODIODE_PATCH_SIZE
+        self._surfaces = {}
+        for is_on, color in ((False, settings.COLOR_BLACK), (True, settings.COLOR_WHITE)):
+            surface = pygame.Surface((size, size))
+            surface.fill(color)
+            self._surfaces[is_on] = surface
+
+        self.is_on = False
+        self.image = self._surfaces[False]
+        self.rect = self.image.get_rect(topleft=(0, 0))
+
+    def set_on(self, is_on):
+        """Turns the patch white (stimulus on) or black. Only redraws on a change."""
+        if is_on == self.is_on:
+            return
+        self.is_on = is_on
+        self.image = self._surfaces[is_on]
+        self.dirty = 1
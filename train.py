@@ -0,0 +1,273 @@
+"""
+P300 classifier training from recorded calibration sessions.
+
+Input is one or more EEG store recordings (eeg_store.py) in which the
+attended cell of every stimulus is known (the events' cell column). Each
+epoch's label (target / non-target) comes from the recording's paradigm
+masks, so any paradigm works.
+
+The pipeline is vectorised over all epochs at once:
+1. Decimation: the mean of every `decimation` consecutive samples.
+2. Spatial filtering: xDAWN-style filters, the channel combinations with the
+   most target ERP power relative to the background EEG.
+3. Shrinkage LDA: linear discriminant on the pooled covariance, shrunk
+   towards a scaled identity (Ledoit-Wolf, or a fixed amount).
+
+Every (decimation, filters, shrinkage) candidate is cross-validated with
+contiguous folds; candidate x fold jobs run in a process pool. The best
+candidate by mean AUC is refit on all epochs. Its score distributions (for
+dynamic stopping) come from the out-of-fold scores, since in-sample scores
+overstate the class separation. All three steps are linear,
+so the model folds into one (epoch samples x channels) weight matrix plus a
+bias, the form P300Decoder scores with, and is saved as a small .npz that
+the game loads in milliseconds (DECODER_MODEL_PATH):
+
+    python train.py sessions/eeg_*.json --output model.npz
+"""
+
+import argparse
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import settings
+from eeg_store import EEGStore
+from recorder import STIM_ONSET
+
+MODEL_FORMAT_VERSION = 1
+
+
+def load_epochs(paths, epoch_ms=None):
+    """
+    Labelled epochs of every recording, EEG channels only.
+    Returns (epochs (n, epoch_len, channels) float32, is_target, srate).
+    """
+    epoch_ms = settings.EPOCH_MS if epoch_ms is None else epoch_ms
+    all_epochs, all_labels, srate = [], [], None
+    for path in paths:
+        store = EEGStore(path)
+        if srate is not None and store.srate != srate:
+            raise ValueError(f"{path} is sampled at {store.srate} Hz, the other recordings at {srate} Hz.")
+        srate = store.srate
+        epoch_len = round(epoch_ms * srate / 1000)
+        channels = [c for c in range(store.n_channels) if c != store.header.get('photodiode_channel')]
+
+        onsets, _, is_target = store.stimulus_events()
+        cells = store.events['cell'][store.events['type'] == STIM_ONSET]
+        # Only epochs whose attended cell is known and that were recorded in full
+        keep = (cells >= 0) & (onsets + epoch_len <= len(store.samples))
+        all_epochs.append(store.windows(epoch_len)[onsets[keep]][:, :, channels])
+        all_labels.append(is_target[keep])
+
+    if not all_epochs:
+        raise ValueError("No recordings given.")
+    return np.concatenate(all_epochs), np.concatenate(all_labels), srate
+
+
+# --- Pipeline steps ---
+
+def decimate(epochs, factor):
+    """(n, samples, channels) -> (n, samples // factor, channels), averaging each bin."""
+    n, length, n_channels = epochs.shape
+    bins = length // factor
+    return epochs[:, :bins * factor].reshape(n, bins, factor, n_channels).mean(axis=2)
+
+
+def spatial_filters(epochs, is_target, n_filters):
+    """
+    xDAWN-style spatial filters (channels x n_filters): the generalised
+    eigenvectors of the target ERP covariance against the covariance of
+    all samples, strongest first.
+    """
+    n_channels = epochs.shape[2]
+    evoked = epochs[is_target].mean(axis=0)
+    signal_cov = evoked.T @ evoked
+    samples = epochs.reshape(-1, n_channels)
+    total_cov = samples.T @ samples / len(samples)
+
+    # Whiten with the total covariance, then diagonalise the signal covariance
+    values, vectors = np.linalg.eigh(total_cov)
+    whitener = vectors / np.sqrt(np.maximum(values, 1e-12 * values.max()))
+    _, components = np.linalg.eigh(whitener.T @ signal_cov @ whitener)
+    return whitener @ components[:, ::-1][:, :min(n_filters, n_channels)]
+
+
+def ledoit_wolf_shrinkage(centered):
+    """Ledoit-Wolf optimal shrinkage of the covariance of centred (n, features) data."""
+    n, n_features = centered.shape
+    cov = centered.T @ centered / n
+    mu = np.trace(cov) / n_features
+    delta = np.sum((cov - mu * np.eye(n_features)) ** 2)
+    squared = centered ** 2
+    beta = (np.sum(squared.T @ squared) / n - np.sum(cov ** 2)) / n
+    return float(min(beta, delta) / delta) if delta > 0 else 1.0
+
+
+def shrinkage_lda(features, is_target, shrinkage='auto'):
+    """
+    LDA weights and bias for (n, features). shrinkage is 'auto'
+    (Ledoit-Wolf) or a fixed amount between 0 and 1.
+    Returns (weights, bias, shrinkage used).
+    """
+    target_mean = features[is_target].mean(axis=0)
+    nontarget_mean = features[~is_target].mean(axis=0)
+    centered = features - np.where(is_target[:, None], target_mean, nontarget_mean)
+
+    if shrinkage == 'auto':
+        shrinkage = ledoit_wolf_shrinkage(centered)
+    n_features = features.shape[1]
+    cov = centered.T @ centered / len(centered)
+    cov = (1 - shrinkage) * cov + shrinkage * np.trace(cov) / n_features * np.eye(n_features)
+
+    weights = np.linalg.solve(cov, target_mean - nontarget_mean)
+    bias = -float(weights @ (target_mean + nontarget_mean)) / 2
+    return weights, bias, shrinkage
+
+
+def fit(epochs, is_target, decimation, n_filters, shrinkage='auto'):
+    """
+    Fits the whole pipeline and folds it into raw-epoch weights.
+    Returns (weights (epoch_len, channels) float32, bias, shrinkage used).
+    """
+    epochs = epochs.astype(np.float64)
+    reduced = decimate(epochs, decimation)
+    filters = spatial_filters(reduced, is_target, n_filters)
+    features = (reduced @ filters).reshape(len(epochs), -1)
+    lda_weights, bias, shrinkage = shrinkage_lda(features, is_target, shrinkage)
+
+    # score = lda . (decimate(epoch) @ filters) = sum(raw_weights * epoch)
+    per_bin = lda_weights.reshape(reduced.shape[1], -1) @ filters.T  # (bins, channels)
+    raw = np.zeros(epochs.shape[1:], dtype=np.float32)
+    raw[:len(per_bin) * decimation] = np.repeat(per_bin / decimation, decimation, axis=0)
+    return raw, bias, shrinkage
+
+
+def scores(weights, bias, epochs):
+    """Decoder scores of (n, epoch_len, channels) epochs."""
+    return np.tensordot(epochs, weights, axes=([1, 2], [0, 1])) + bias
+
+
+def auc(values, is_target):
+    """Area under the ROC curve (Mann-Whitney U from ranks)."""
+    n_target = int(is_target.sum())
+    n_nontarget = len(is_target) - n_target
+    if not n_target or not n_nontarget:
+        return float('nan')
+    ranks = np.empty(len(values))
+    ranks[np.argsort(values)] = np.arange(1, len(values) + 1)
+    return float((ranks[is_target].sum() - n_target * (n_target + 1) / 2) / (n_target * n_nontarget))
+
+
+# --- Cross-validation in a process pool ---
+
+_worker_data = None  # (epochs, is_target, fold of every epoch), loaded once per worker
+
+
+def _init_worker(paths, epoch_ms, n_folds):
+    global _worker_data
+    epochs, is_target, _ = load_epochs(paths, epoch_ms)
+    _worker_data = (epochs, is_target, fold_labels(len(epochs), n_folds))
+
+
+def fold_labels(n, n_folds):
+    """Contiguous folds, so overlapping neighbouring epochs rarely straddle train and test."""
+    return np.arange(n) * n_folds // n
+
+
+def _evaluate(candidate, fold):
+    """Scores of one fold's epochs from a candidate fitted on the other folds."""
+    epochs, is_target, folds = _worker_data
+    test = folds == fold
+    weights, bias, _ = fit(epochs[~test], is_target[~test], *candidate)
+    return scores(weights, bias, epochs[test])
+
+
+def train(paths, epoch_ms=None, decimations=None, n_filters=None, shrinkages=('auto',), n_folds=None, workers=None):
+    """
+    Cross-validates every candidate, refits the best on all epochs and
+    returns the model (a dict, see save_model).
+    """
+    decimations = settings.TRAIN_DECIMATIONS if decimations is None else decimations
+    n_filters = settings.TRAIN_SPATIAL_FILTERS if n_filters is None else n_filters
+    n_folds = settings.TRAIN_FOLDS if n_folds is None else n_folds
+    epoch_ms = settings.EPOCH_MS if epoch_ms is None else epoch_ms
+
+    t0 = time.perf_counter()
+    epochs, is_target, srate = load_epochs(paths, epoch_ms)
+    print(f"Loaded {len(epochs)} epochs ({int(is_target.sum())} target) x {epochs.shape[2]} channels "
+          f"from {len(paths)} recording(s) in {time.perf_counter() - t0:.2f} s")
+
+    candidates = list(itertools.product(decimations, n_filters, shrinkages))
+    t1 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(paths, epoch_ms, n_folds)) as pool:
+        futures = {(candidate, fold): pool.submit(_evaluate, candidate, fold)
+                   for candidate in candidates for fold in range(n_folds)}
+        fold_scores = {key: future.result() for key, future in futures.items()}
+    folds = fold_labels(len(epochs), n_folds)
+    mean_aucs = {candidate: float(np.nanmean([auc(fold_scores[candidate, fold], is_target[folds == fold])
+                                              for fold in range(n_folds)]))
+                 for candidate in candidates}
+    print(f"Cross-validated {len(candidates)} candidates x {n_folds} folds in {time.perf_counter() - t1:.2f} s")
+    for candidate in sorted(candidates, key=mean_aucs.get, reverse=True)[:5]:
+        print(f"  decimation {candidate[0]}, {candidate[1]} filters, shrinkage {candidate[2]}: "
+              f"AUC {mean_aucs[candidate]:.3f}")
+
+    best = max(candidates, key=mean_aucs.get)
+    weights, bias, shrinkage = fit(epochs, is_target, *best)
+    print(f"Trained in {time.perf_counter() - t0:.2f} s total")
+
+    # Score distributions for dynamic stopping, from scores of epochs the scoring model never saw
+    out_of_fold = np.empty(len(epochs))
+    for fold in range(n_folds):
+        out_of_fold[folds == fold] = fold_scores[best, fold]
+    target_scores, nontarget_scores = out_of_fold[is_target], out_of_fold[~is_target]
+    pooled_sd = np.sqrt((target_scores.var() * len(target_scores) + nontarget_scores.var() * len(nontarget_scores))
+                        / len(out_of_fold))
+    return {
+        'weights': weights,
+        'bias': bias,
+        'srate': srate,
+        'epoch_ms': epoch_ms,
+        'decimation': best[0],
+        'n_filters': best[1],
+        'shrinkage': shrinkage,
+        'cv_auc': mean_aucs[best],
+        'target_mean': float(target_scores.mean()),
+        'nontarget_mean': float(nontarget_scores.mean()),
+        'score_sd': float(pooled_sd),
+    }
+
+
+def save_model(model, path):
+    """Writes the model as an uncompressed .npz (loads with one read, no unpickling)."""
+    np.savez(path, version=MODEL_FORMAT_VERSION, **model)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the P300 classifier from calibration recordings.")
+    parser.add_argument('recordings', nargs='+', help="EEG store headers (.json) with known attended cells")
+    parser.add_argument('--output', default='model.npz')
+    parser.add_argument('--epoch-ms', type=int, default=settings.EPOCH_MS)
+    parser.add_argument('--decimation', type=int, nargs='+', default=settings.TRAIN_DECIMATIONS,
+                        help="Candidate decimation factors")
+    parser.add_argument('--filters', type=int, nargs='+', default=settings.TRAIN_SPATIAL_FILTERS,
+                        help="Candidate numbers of spatial filters")
+    parser.add_argument('--shrinkage', nargs='+', default=['auto'],
+                        help="Candidate shrinkage amounts (0-1) or 'auto' (Ledoit-Wolf)")
+    parser.add_argument('--folds', type=int, default=settings.TRAIN_FOLDS)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    shrinkages = [value if value == 'auto' else float(value) for value in args.shrinkage]
+    model = train(args.recordings, args.epoch_ms, args.decimation, args.filters, shrinkages, args.folds, args.workers)
+    save_model(model, args.output)
+    print(f"Saved model (decimation {model['decimation']}, {model['n_filters']} filters, "
+          f"shrinkage {model['shrinkage']:.3f}, cross-validated AUC {model['cv_auc']:.3f}) to {args.output}")
+    print(f"Use it with DECODER_MODEL_PATH = {args.output!r} in settings.py")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Non-blocking trigger output for the 5-bit Arduino trigger box
+(see Trigger_code_arduino/5bit_V1/5bit_V1.ino).
+
+The game only ever appends to a queue; a dedicated writer thread drains it
+and does the (blocking) serial write + flush, so the render loop never
+waits on serial I/O. Every trigger records when it was enqueued and when
+it was written, both with time.perf_counter_ns().
+
+Run this file directly to benchmark write latency and throughput against a
+pty-based fake serial device (no Arduino needed):
+
+    python trigger.py --count 10000
+"""
+
+import argparse
+import collections
+import os
+import threading
+import time
+
+import serial
+
+import settings
+
+# The Arduino only looks at the 5 least significant bits
+MAX_TRIGGER_CODE = 31
+
+# A trigger that has been written: (code, enqueue time, write time) in perf_counter_ns
+TriggerEvent = collections.namedtuple('TriggerEvent', ['code', 'enqueue_ns', 'write_ns'])
+
+
+def row_code(row):
+    """Trigger code for a row highlight onset."""
+    return settings.TRIGGER_ROW_BASE + row
+
+
+def col_code(col):
+    """Trigger code for a column highlight onset."""
+    return settings.TRIGGER_COL_BASE + col
+
+
+def stimulus_code(stim_id):
+    """Trigger code for the onset of a stimulus in a non-row/column paradigm."""
+    return settings.TRIGGER_ROW_BASE + stim_id
+
+
+class TriggerWriter:
+    """
+    Sends trigger codes to the trigger box from a background thread.
+    send() is safe to call from the game loop: it only appends to a deque
+    (atomic in CPython, no lock) and wakes the writer if it is idle.
+    The port is opened in the constructor, so a missing or busy port raises
+    serial.SerialException to the caller instead of ending the thread.
+    Codes sent before the Arduino is ready (see `ready`) are dropped and
+    counted rather than written late with wrong timing.
+    """
+
+    def __init__(self, port, baud_rate=None, startup_delay_s=None):
+        self.port = port
+        self.baud_rate = settings.TRIGGER_BAUD_RATE if baud_rate is None else baud_rate
+        self.startup_delay_s = settings.TRIGGER_STARTUP_DELAY_S if startup_delay_s is None else startup_delay_s
+
+        self._queue = collections.deque()  # (code, enqueue_ns)
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self.ready = threading.Event()  # Set once the port is open and the Arduino has reset
+
+        self.sent = []  # TriggerEvent for every code written, in order
+        self.dropped = 0  # Codes sent before the port was ready
+        self.fake_device = None  # FakeSerialDevice behind the port, closed with the writer
+
+        self._serial = serial.Serial(self.port, self.baud_rate, timeout=1)
+        self._thread = threading.Thread(target=self._writer_loop, name="trigger-writer", daemon=True)
+        self._thread.start()
+
+    def send(self, code):
+        """Queues a trigger code in [0, 31]. Never blocks."""
+        if not (0 <= code <= MAX_TRIGGER_CODE):
+            raise ValueError("Trigger code must be between 0 and 31 (inclusive).")
+        if not self.ready.is_set():
+            self.dropped += 1
+            return
+
+        self._queue.append((code, time.perf_counter_ns()))
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def pending(self):
+        """Number of triggers queued but not yet written."""
+        return len(self._queue)
+
+    def close(self, timeout=1.0):
+        """Writes whatever is still queued, then stops the writer thread."""
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+        if self.fake_device:
+            self.fake_device.close()
+        if self.dropped:
+            print(f"Dropped {self.dropped} trigger codes sent before {self.port} was ready.")
+
+    def _writer_loop(self):
+        """Waits for the Arduino, then writes queued codes as they arrive."""
+        ser = self._serial
+        # Arduino auto-resets when serial opens; give it a moment.
+        # Codes sent meanwhile are dropped (see send()).
+        time.sleep(self.startup_delay_s)
+        self.ready.set()
+        print(f"Opened trigger port {self.port} at {self.baud_rate} baud.")
+
+        queue = self._queue
+        try:
+            while True:
+                self._wakeup.wait()
+                self._wakeup.clear()
+
+                while queue:
+                    code, enqueue_ns = queue.popleft()
+                    ser.write(bytes([code]))
+                    ser.flush()  # push out immediately
+                    self.sent.append(TriggerEvent(code, enqueue_ns, time.perf_counter_ns()))
+
+                if self._stopping:
+                    break
+        finally:
+            ser.close()
+
+
+class FakeSerialDevice:
+    """
+    A pty pair that stands in for the Arduino. TriggerWriter opens
+    self.port like a real serial port; a reader thread on the other end
+    records every byte with its receive time (perf_counter_ns).
+    POSIX only (pty/tty need termios); on Windows use a real port.
+    """
+
+    def __init__(self):
+        # Imported here so the game still imports this module on Windows
+        import pty
+        import tty
+
+        self._master_fd, self._slave_fd = pty.openpty()
+        tty.setraw(self._slave_fd)
+        self.port = os.ttyname(self._slave_fd)
+
+        self.received = []  # (code, receive_ns)
+        self._thread = threading.Thread(target=self._reader_loop, name="fake-serial", daemon=True)
+        self._thread.start()
+
+    def _reader_loop(self):
+        while True:
+            try:
+                data = os.read(self._master_fd, 4096)
+            except OSError:
+                break  # Closed
+            if not data:
+                break
+            now = time.perf_counter_ns()
+            for byte in data:
+                self.received.append((byte & 0x1F, now))
+
+    def close(self):
+        os.close(self._slave_fd)
+        os.close(self._master_fd)
+
+
+def create_trigger_writer(port=None):
+    """
+    Creates the TriggerWriter configured in settings.
+    Returns None if triggers are disabled (TRIGGER_PORT is None).
+    TRIGGER_PORT = "fake" writes to a FakeSerialDevice instead of hardware.
+    """
+    port = settings.TRIGGER_PORT if port is None else port
+    if port is None:
+        return None
+    if port == "fake":
+        device = FakeSerialDevice()
+        writer = TriggerWriter(device.port, startup_delay_s=0)
+        writer.fake_device = device
+        return writer
+    return TriggerWriter(port)
+
+
+def _percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def benchmark(count=10000, interval_us=0):
+    """
+    Sends `count` triggers through a TriggerWriter into a FakeSerialDevice and
+    reports send() cost, write latency and throughput.
+    """
+    device = FakeSerialDevice()
+    writer = TriggerWriter(device.port, startup_delay_s=0)
+    writer.ready.wait()
+
+    send_cost_ns = []
+    start = time.perf_counter_ns()
+    for i in range(count):
+        t0 = time.perf_counter_ns()
+        writer.send(i % (MAX_TRIGGER_CODE + 1))
+        send_cost_ns.append(time.perf_counter_ns() - t0)
+        if interval_us:
+            time.sleep(interval_us / 1e6)
+
+    writer.close(timeout=30)
+    elapsed_s = (time.perf_counter_ns() - start) / 1e9
+
+    # Give the reader a moment to see the last bytes
+    deadline = time.monotonic() + 2
+    while len(device.received) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    device.close()
+
+    write_latency_us = sorted((e.write_ns - e.enqueue_ns) / 1000 for e in writer.sent)
+    send_cost_us = sorted(ns / 1000 for ns in send_cost_ns)
+
+    results = {
+        'count': count,
+        'written': len(writer.sent),
+        'received': len(device.received),
+        'throughput_per_s': len(writer.sent) / elapsed_s,
+    }
+    for name, values in (('send_cost_us', send_cost_us), ('write_latency_us', write_latency_us)):
+        if values:
+            for p in (50, 95, 99):
+                results[f'{name}_p{p}'] = _percentile(values, p)
+            results[f'{name}_max'] = values[-1]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark trigger output against a fake serial device.")
+    parser.add_argument('--count', type=int, default=10000, help="Number of triggers to send")
+    parser.add_argument('--interval-us', type=int, default=0, help="Pause between sends (0 = as fast as possible)")
+    args = parser.parse_args()
+
+    for key, value in benchmark(args.count, args.interval_us).items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")